@@ -0,0 +1,55 @@
+"""
+Command line importer for historical readings.
+
+Usage (from the app directory):
+    python -m cli.backfill readings.csv
+    python -m cli.backfill readings.ndjson --format ndjson --chunk-size 10000
+    cat readings.csv | python -m cli.backfill -
+"""
+import argparse
+import sys
+from core.database import SessionLocal
+from core.enums import ImportFormat
+from core.settings import BACKFILL_CHUNK_SIZE
+from services.backfill_service import BackfillService
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Import historical sensor readings from CSV or NDJSON")
+    parser.add_argument("path", help="File to import, or - to read from stdin")
+    parser.add_argument(
+        "--format",
+        choices=[import_format.value for import_format in ImportFormat],
+        default=None,
+        help="Input format, detected from the file extension when omitted"
+    )
+    parser.add_argument("--chunk-size", type=int, default=BACKFILL_CHUNK_SIZE, help="Records validated and written per chunk")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+
+    import_format = args.format or ("ndjson" if args.path.endswith((".ndjson", ".jsonl")) else "csv")
+
+    db = SessionLocal()
+    try:
+        backfill_service = BackfillService(db, chunk_size=args.chunk_size)
+
+        if args.path == "-":
+            accepted, rejected, errors = backfill_service.import_lines(sys.stdin, ImportFormat(import_format))
+        else:
+            with open(args.path, encoding="utf-8", newline="") as lines:
+                accepted, rejected, errors = backfill_service.import_lines(lines, ImportFormat(import_format))
+    finally:
+        db.close()
+
+    for error in errors:
+        print(f"record {error.index}: {error.detail}", file=sys.stderr)
+
+    print(f"accepted={accepted} rejected={rejected}")
+    return 0 if not rejected else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""
+Benchmark of the GET /data serialization, the ReadingResponse models against
+the direct JSON encoding of ReadingMapper.to_json.
+
+The model path is what the route did before: build a ReadingResponse per row
+with the mappers below, then validate and dump the list through the response
+model with exclude_none. Both paths must produce the same bytes, the benchmark
+fails otherwise.
+
+Usage (from the app directory):
+    python -m cli.benchmark_serialization
+    python -m cli.benchmark_serialization --rows 100000 --repeat 5
+"""
+import argparse
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Callable, List
+from pydantic import TypeAdapter
+from mappers.reading_mapper import RESPONSE_SENSORS, ReadingMapper
+from models.reading import Reading
+from schemas.reading_schema import GetReadingParams, ReadingResponse
+
+RESPONSE_ADAPTER = TypeAdapter(List[ReadingResponse])
+
+
+def from_entities_to_responses(entities: List[Reading], filters: GetReadingParams) -> List[ReadingResponse]:
+    return [ReadingMapper.from_entity_to_response(entity, filters) for entity in entities]
+
+
+def from_aggregate_tuples_to_responses(rows: List[tuple], filters: GetReadingParams) -> List[ReadingResponse]:
+    responses = []
+    for row in rows:
+        values = dict(zip(RESPONSE_SENSORS, row[1:]))
+        if filters.sensor_type:
+            values = {sensor: value if sensor == filters.sensor_type else None for sensor, value in values.items()}
+        responses.append(ReadingResponse(timestamp=row[0], **values))
+    return responses
+
+
+def from_statistics_to_responses(rows: List[dict], filters: GetReadingParams) -> List[ReadingResponse]:
+    responses = []
+    for row in rows:
+        stats = {}
+        for key, value in row.items():
+            if key != "timestamp":
+                sensor, stat = key.rsplit("_", 1)
+                stats.setdefault(sensor, {})[stat] = value
+        # The sensor fields carry the averages
+        averages = {sensor: values.get("avg") for sensor, values in stats.items()}
+        responses.append(ReadingResponse(timestamp=row["timestamp"], stats=stats, **averages))
+    return responses
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the model and the direct JSON serialization of readings")
+    parser.add_argument("--rows", type=int, default=50000, help="Rows of each result")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs of each path, the fastest one is reported")
+    return parser.parse_args(argv)
+
+
+def build_cases(rows: int) -> dict[str, tuple[list, GetReadingParams, Callable]]:
+    """Rows of each result shape with the filters and the model mapper that serves them"""
+    start = datetime(2025, 10, 1)
+    readings = [
+        Reading(server_ulid="01HGYX7TBDFRX8HRJC5RF7Z3GY", timestamp=start + timedelta(seconds=i),
+                temperature=20.0 + i % 7, humidity=50.0, voltage=None, current=1.5)
+        for i in range(rows)
+    ]
+    buckets = [(start + timedelta(minutes=i), 20.0 + i % 7, 50.0, None, 220.0) for i in range(rows)]
+    statistics = [
+        {"timestamp": start + timedelta(minutes=i), "temperature_avg": 20.5, "temperature_max": 25.0, "temperature_count": 60}
+        for i in range(rows)
+    ]
+    return {
+        "raw": (readings, GetReadingParams(), from_entities_to_responses),
+        "raw sensor_type": (readings, GetReadingParams(sensor_type="temperature"), from_entities_to_responses),
+        "aggregated": (buckets, GetReadingParams(aggregation="minute"), from_aggregate_tuples_to_responses),
+        "stats": (statistics, GetReadingParams(aggregation="minute", sensor_type="temperature", stats="avg,max,count"),
+                  from_statistics_to_responses),
+    }
+
+
+def model_path(rows: list, filters: GetReadingParams, mapper) -> bytes:
+    responses = RESPONSE_ADAPTER.validate_python(mapper(rows, filters), from_attributes=True)
+    return RESPONSE_ADAPTER.dump_json(responses, exclude_none=True)
+
+
+def fastest(function, repeat: int) -> tuple[float, bytes]:
+    best, result = float("inf"), b""
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def run(rows: int, repeat: int) -> dict[str, tuple[float, float]]:
+    """Seconds of the (model, direct) paths of each case"""
+    timings = {}
+    for name, (data, filters, mapper) in build_cases(rows).items():
+        model_time, model_body = fastest(lambda: model_path(data, filters, mapper), repeat)
+        direct_time, direct_body = fastest(lambda: ReadingMapper.to_json(data, filters), repeat)
+        if model_body != direct_body:
+            raise AssertionError(f"The {name} bodies differ")
+        timings[name] = (model_time, direct_time)
+    return timings
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+
+    for name, (model_time, direct_time) in run(args.rows, args.repeat).items():
+        print(f"{name:16} models {model_time * 1000:8.1f} ms   direct {direct_time * 1000:8.1f} ms   {model_time / direct_time:5.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,49 @@
+"""
+Command line rebuild of the reading rollups from the raw readings.
+
+The API fills the rollups of the readings written before the upgrade on its own
+at startup (services/rollup_backfill.py). Run it to repair a range after
+readings were changed directly in the database.
+
+Usage (from the app directory):
+    python -m cli.rollup
+    python -m cli.rollup --start 2025-04-01 --end 2025-04-30 --server 01HGYX7TBDFRX8HRJC5RF7Z3GY
+"""
+import argparse
+import sys
+from datetime import datetime
+from core.database import SessionLocal
+from repository.rollup_repository import ReadingRollupRepository
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild the minute, hour and day rollups of the readings")
+    parser.add_argument("--start", type=datetime.fromisoformat, default=None, help="First day to rebuild, defaults to the oldest reading")
+    parser.add_argument("--end", type=datetime.fromisoformat, default=None, help="Last day to rebuild, defaults to the newest reading")
+    parser.add_argument("--server", default=None, help="Only rebuild the rollups of this server ULID")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        rollup_repository = ReadingRollupRepository(db)
+
+        first, last = rollup_repository.find_time_range(args.server)
+        start, end = args.start or first, args.end or last
+        if start is None or end is None:
+            print("no readings to roll up")
+            return 0
+
+        days = rollup_repository.rebuild(start, end, args.server)
+    finally:
+        db.close()
+
+    print(f"rebuilt {days} days from {start.date()} to {end.date()}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,20 +1,75 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from core.settings import DATABASE_URL
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from core.pool_metrics import PoolMetrics, instrument_engine, instrumented_pool_class
+from core.settings import (
+    DATABASE_URL,
+    ASYNC_DATABASE_URL,
+    DB_POOL_SIZE,
+    DB_MAX_OVERFLOW,
+    DB_POOL_TIMEOUT,
+    DB_POOL_RECYCLE,
+    DB_POOL_PRE_PING,
+)
+from core.partitioning import ReadingPartitionManager
 from models.base_model import Base
 
 
-engine = create_engine(DATABASE_URL)
+POOL_OPTIONS = {
+    "pool_size": DB_POOL_SIZE,
+    "max_overflow": DB_MAX_OVERFLOW,
+    "pool_timeout": DB_POOL_TIMEOUT,
+    "pool_recycle": DB_POOL_RECYCLE,
+    "pool_pre_ping": DB_POOL_PRE_PING,
+}
+
+sync_pool_metrics = PoolMetrics("sync")
+async_pool_metrics = PoolMetrics("async")
+
+# Sync engine, used to create the tables and by blocking jobs (bulk imports, CLI)
+engine = create_engine(
+    DATABASE_URL,
+    poolclass=instrumented_pool_class(QueuePool, sync_pool_metrics),
+    **POOL_OPTIONS
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine, used by the routes so database round-trips don't block the event loop
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    poolclass=instrumented_pool_class(AsyncAdaptedQueuePool, async_pool_metrics),
+    **POOL_OPTIONS
+)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+instrument_engine(engine, sync_pool_metrics)
+instrument_engine(async_engine.sync_engine, async_pool_metrics)
+
+pool_metrics = [sync_pool_metrics, async_pool_metrics]
+
+reading_partitions = ReadingPartitionManager(engine)
+
 # Function to create all tables
 def create_tables():
-    Base.metadata.create_all(bind=engine)
+    if not reading_partitions.enabled:
+        Base.metadata.create_all(bind=engine)
+        return
 
-# Dependency to use in routes
+    # The partitioned reading table is created with raw DDL, after the server table it references
+    Base.metadata.create_all(bind=engine, tables=[table for table in Base.metadata.sorted_tables if table.name != "reading"])
+    reading_partitions.create_table()
+    reading_partitions.ensure_partitions()
+
+# Dependency to use in routes that run blocking jobs in a thread pool
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+# Dependency to use in routes
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -10,4 +10,47 @@ class SensorType(Enum):
     TEMPERATURE = 'temperature'
     HUMIDITY = 'humidity'
     CURRENT = 'current'
-    VOLTAGE = 'voltage'
\ No newline at end of file
+    VOLTAGE = 'voltage'
+
+
+class ServerStatus(Enum):
+    ONLINE = 'online'
+    OFFLINE = 'offline'
+
+
+class ImportFormat(Enum):
+    CSV = 'csv'
+    NDJSON = 'ndjson'
+
+
+class ExportFormat(Enum):
+    CSV = 'csv'
+    NDJSON = 'ndjson'
+    ARROW = 'arrow'
+    PARQUET = 'parquet'
+
+
+class StatisticType(Enum):
+    AVG = 'avg'
+    MIN = 'min'
+    MAX = 'max'
+    COUNT = 'count'
+    STDDEV = 'stddev'
+    P50 = 'p50'
+    P95 = 'p95'
+    P99 = 'p99'
+
+    @property
+    def percentile(self) -> float | None:
+        """Fraction given to percentile_cont, None for the other statistics"""
+        return int(self.value[1:]) / 100 if self.value.startswith('p') else None
+
+
+class FillMode(Enum):
+    NULL = 'null'
+    LINEAR = 'linear'
+
+
+class DownsampleMode(Enum):
+    AVG = 'avg'
+    LTTB = 'lttb'
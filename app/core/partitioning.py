@@ -0,0 +1,179 @@
+import asyncio
+import logging
+import re
+from datetime import date, datetime, timedelta
+from sqlalchemy import Connection, Engine, text
+from core.settings import READING_PARTITION_INTERVAL, READING_PARTITIONS_AHEAD, READING_PARTITION_CHECK_INTERVAL_S
+from models.reading import Reading
+
+logger = logging.getLogger(__name__)
+
+# Any constant works, it only has to be the same for every worker
+PARTITION_LOCK_KEY = 7_240_512
+
+CREATE_PARTITIONED_READING_SQL = """
+CREATE TABLE IF NOT EXISTS reading (
+    id SERIAL NOT NULL,
+    server_ulid VARCHAR(26) NOT NULL REFERENCES server (id),
+    "timestamp" TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    temperature FLOAT,
+    humidity FLOAT,
+    voltage FLOAT,
+    "current" FLOAT,
+    PRIMARY KEY (id, "timestamp"),
+    CONSTRAINT has_any_reading CHECK ({check})
+) PARTITION BY RANGE ("timestamp")
+"""
+
+CREATE_DEFAULT_PARTITION_SQL = "CREATE TABLE IF NOT EXISTS reading_default PARTITION OF reading DEFAULT"
+
+CREATE_PARTITION_SQL = (
+    "CREATE TABLE IF NOT EXISTS {name} PARTITION OF reading"
+    " FOR VALUES FROM ('{start}') TO ('{end}')"
+)
+
+IS_PARTITIONED_SQL = text("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass('reading')")
+
+PARTITION_EXISTS_SQL = text("SELECT to_regclass(:name) IS NOT NULL")
+
+PARTITION_BOUNDS_SQL = text("""
+    SELECT child.relname, pg_get_expr(child.relpartbound, child.oid)
+    FROM pg_inherits
+    JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+    WHERE pg_inherits.inhparent = to_regclass('reading')
+""")
+
+PARTITION_BOUND_PATTERN = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+DETACH_PARTITION_SQL = "ALTER TABLE reading DETACH PARTITION {name}"
+
+DROP_PARTITION_SQL = "DROP TABLE {name}"
+
+
+def partition_start(day: date, interval: str) -> date:
+    """First day of the partition holding the day, weeks start on Monday"""
+    if interval == "week":
+        return day - timedelta(days=day.weekday())
+    return day
+
+
+def partition_ranges(today: date, interval: str, ahead: int) -> list[tuple[str, date, date]]:
+    """Name and [start, end) of the current partition and of the next `ahead` ones"""
+    step = timedelta(days=7 if interval == "week" else 1)
+    start = partition_start(today, interval)
+    ranges = []
+    for _ in range(ahead + 1):
+        ranges.append((f"reading_p{start:%Y%m%d}", start, start + step))
+        start += step
+    return ranges
+
+
+def find_partitions(connection: Connection) -> list[tuple[str, datetime, datetime]]:
+    """Name and [start, end) of every range partition of reading, oldest first (the default partition is left out)"""
+    partitions = []
+    for name, bound in connection.execute(PARTITION_BOUNDS_SQL).all():
+        match = PARTITION_BOUND_PATTERN.search(bound or "")
+        if match:
+            partitions.append((name, datetime.fromisoformat(match.group(1)), datetime.fromisoformat(match.group(2))))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def drop_partition(connection: Connection, name: str):
+    """Detach then drop, so the partition goes without a row by row DELETE"""
+    connection.execute(text(DETACH_PARTITION_SQL.format(name=name)))
+    connection.execute(text(DROP_PARTITION_SQL.format(name=name)))
+
+
+class ReadingPartitionManager:
+    """Keeps the reading table range partitioned on timestamp in PostgreSQL.
+
+    The partitioned table is only created for new databases; an existing plain
+    reading table is left untouched (see sql/reading_partitioning.sql to migrate it).
+    Partitions are created ahead of time and a default partition keeps readings
+    outside of them (old backfills, clocks far in the future) from being rejected.
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        interval: str = READING_PARTITION_INTERVAL,
+        ahead: int = READING_PARTITIONS_AHEAD,
+        check_interval_s: int = READING_PARTITION_CHECK_INTERVAL_S,
+    ):
+        self.engine = engine
+        self.interval = interval
+        self.ahead = ahead
+        self.check_interval_s = check_interval_s
+        self._task: asyncio.Task | None = None
+
+    @property
+    def enabled(self) -> bool:
+        # SQLite (tests) keeps the plain table
+        return self.interval != "none" and self.engine.dialect.name == "postgresql"
+
+    def create_table(self):
+        """Create the partitioned reading table, its default partition and its indexes"""
+        check = next(
+            constraint.sqltext for constraint in Reading.__table__.constraints
+            if constraint.name == "has_any_reading"
+        )
+        with self.engine.begin() as connection:
+            if connection.execute(IS_PARTITIONED_SQL).scalar() is False:
+                logger.warning("reading is a plain table, migrate it to enable partitioning")
+                return
+
+            connection.execute(text(CREATE_PARTITIONED_READING_SQL.format(check=check)))
+            connection.execute(text(CREATE_DEFAULT_PARTITION_SQL))
+
+            # Indexes created on the parent are created on every partition
+            for index in Reading.__table__.indexes:
+                index.create(connection, checkfirst=True)
+
+    def is_partitioned(self) -> bool:
+        if self.engine.dialect.name != "postgresql":
+            return False
+        with self.engine.connect() as connection:
+            return bool(connection.execute(IS_PARTITIONED_SQL).scalar())
+
+    def ensure_partitions(self, today: date | None = None) -> list[str]:
+        """Create the missing partitions from today up to `ahead` intervals ahead"""
+        if not self.enabled or not self.is_partitioned():
+            return []
+
+        created = []
+        for name, start, end in partition_ranges(today or datetime.now().date(), self.interval, self.ahead):
+            try:
+                with self.engine.begin() as connection:
+                    # Serialize workers checking at the same time
+                    connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": PARTITION_LOCK_KEY})
+                    if connection.execute(PARTITION_EXISTS_SQL, {"name": name}).scalar():
+                        continue
+                    connection.execute(text(CREATE_PARTITION_SQL.format(name=name, start=start, end=end)))
+                    created.append(name)
+            except Exception:
+                # Usually rows of this range already sit in the default partition
+                logger.exception("Could not create reading partition %s", name)
+
+        if created:
+            logger.info("Created reading partitions: %s", ", ".join(created))
+        return created
+
+    async def start(self):
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.check_interval_s)
+            # DDL runs on the sync engine, off the event loop
+            await asyncio.to_thread(self.ensure_partitions)
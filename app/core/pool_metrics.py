@@ -0,0 +1,94 @@
+import time
+from dataclasses import dataclass, field
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import Pool
+
+
+@dataclass
+class PoolMetrics:
+    """Connection pool counters collected through pool events"""
+    name: str
+    checkouts: int = 0
+    checkins: int = 0
+    connects: int = 0
+    overflow_connects: int = 0  # Connections opened above pool_size
+    timeouts: int = 0  # Checkouts that gave up after pool_timeout
+    invalidations: int = 0
+    max_in_use: int = 0
+    last_wait_ms: float = 0.0
+    max_wait_ms: float = 0.0
+    total_wait_ms: float = 0.0
+    waits: int = 0
+    pool: Pool | None = field(default=None, repr=False)
+
+    @property
+    def in_use(self) -> int:
+        return self.checkouts - self.checkins
+
+    @property
+    def avg_wait_ms(self) -> float:
+        return self.total_wait_ms / self.waits if self.waits else 0.0
+
+    def record_wait(self, wait_ms: float):
+        self.waits += 1
+        self.last_wait_ms = wait_ms
+        self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+        self.total_wait_ms += wait_ms
+
+
+class InstrumentedPoolMixin:
+    """Times how long each checkout waits for a connection.
+
+    Pool events only fire once a connection was obtained, so the wait and the
+    timeouts are measured around the pool's own checkout.
+    """
+
+    metrics: PoolMetrics
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics.pool = self
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            self.metrics.timeouts += 1
+            raise
+        finally:
+            self.metrics.record_wait((time.perf_counter() - started) * 1000)
+
+
+def instrumented_pool_class(pool_class: type[Pool], metrics: PoolMetrics) -> type[Pool]:
+    """Create a subclass of `pool_class` reporting to `metrics`.
+
+    The metrics live on the class so they survive the pool being recreated by
+    `engine.dispose()`.
+    """
+    return type(f"Instrumented{pool_class.__name__}", (InstrumentedPoolMixin, pool_class), {"metrics": metrics})
+
+
+def instrument_engine(engine: Engine, metrics: PoolMetrics):
+    """Register the pool event listeners that feed `metrics`"""
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        metrics.connects += 1
+        if engine.pool.overflow() > 0:
+            metrics.overflow_connects += 1
+
+    @event.listens_for(engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        metrics.checkouts += 1
+        metrics.max_in_use = max(metrics.max_in_use, metrics.in_use)
+
+    @event.listens_for(engine, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        metrics.checkins += 1
+
+    @event.listens_for(engine, "invalidate")
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        metrics.invalidations += 1
@@ -0,0 +1,194 @@
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Any, Sequence
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from core.settings import (
+    QUERY_CACHE_BACKEND,
+    QUERY_CACHE_MAX_ENTRIES,
+    QUERY_CACHE_TTL_S,
+    QUERY_CACHE_GRACE_S,
+)
+from schemas.reading_schema import GetReadingParams
+from utils.interval_utils import bin_start
+
+logger = logging.getLogger(__name__)
+
+
+def _json_default(value: Any):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Can't cache {type(value).__name__}")
+
+
+def encode_rows(rows: list[dict]) -> str:
+    return json.dumps(rows, default=_json_default, separators=(",", ":"))
+
+
+def decode_rows(value: str) -> list[dict]:
+    rows = json.loads(value)
+    for row in rows:
+        row["timestamp"] = datetime.fromisoformat(row["timestamp"])
+    return rows
+
+
+class LocalCacheBackend:
+    """Results kept in this process, the least recently used ones are dropped first"""
+
+    def __init__(self, max_entries: int = QUERY_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[float, list[dict]]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get(self, key: str) -> list[dict] | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, rows = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return rows
+
+    async def set(self, key: str, rows: list[dict], ttl_s: float):
+        self._entries[key] = (time.monotonic() + ttl_s, rows)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+
+class PostgresCacheBackend:
+    """Results shared by every worker through an UNLOGGED PostgreSQL table"""
+
+    CREATE_SQL = text(
+        "CREATE UNLOGGED TABLE IF NOT EXISTS query_cache ("
+        " key VARCHAR(64) PRIMARY KEY,"
+        " value TEXT NOT NULL,"
+        " expires_at DOUBLE PRECISION NOT NULL)"
+    )
+
+    GET_SQL = text(
+        "SELECT value FROM query_cache"
+        " WHERE key = :key AND expires_at > CAST(extract(epoch FROM clock_timestamp()) AS DOUBLE PRECISION)"
+    )
+
+    SET_SQL = text("""
+        INSERT INTO query_cache (key, value, expires_at)
+        VALUES (:key, :value, CAST(extract(epoch FROM clock_timestamp()) AS DOUBLE PRECISION) + CAST(:ttl AS DOUBLE PRECISION))
+        ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value, expires_at = EXCLUDED.expires_at
+    """)
+
+    EVICT_SQL = text(
+        "DELETE FROM query_cache"
+        " WHERE expires_at < CAST(extract(epoch FROM clock_timestamp()) AS DOUBLE PRECISION)"
+    )
+
+    def __init__(self, engine: AsyncEngine, eviction_interval: float = 60.0):
+        self.engine = engine
+        self.eviction_interval = eviction_interval
+        self._table_ready = False
+        self._last_eviction = time.monotonic()
+
+    async def _ensure_table(self, connection):
+        if not self._table_ready:
+            await connection.execute(self.CREATE_SQL)
+            self._table_ready = True
+
+    async def get(self, key: str) -> list[dict] | None:
+        async with self.engine.begin() as connection:
+            await self._ensure_table(connection)
+            value = (await connection.execute(self.GET_SQL, {"key": key})).scalar()
+        return decode_rows(value) if value is not None else None
+
+    async def set(self, key: str, rows: list[dict], ttl_s: float):
+        async with self.engine.begin() as connection:
+            await self._ensure_table(connection)
+            await connection.execute(self.SET_SQL, {"key": key, "value": encode_rows(rows), "ttl": ttl_s})
+
+            if time.monotonic() - self._last_eviction > self.eviction_interval:
+                self._last_eviction = time.monotonic()
+                await connection.execute(self.EVICT_SQL)
+
+    def clear(self):
+        pass
+
+
+class QueryCache:
+    """Caches the aggregated rows of closed buckets.
+
+    A bucket is closed once it ends before now - grace_s; the buckets after
+    that are always computed fresh. Keys include the cache generations of
+    the servers involved, which ingest bumps when a reading lands in a closed
+    bucket, so stale entries are never read again and just age out.
+    """
+
+    def __init__(self, backend=None, ttl_s: int = QUERY_CACHE_TTL_S, grace_s: int = QUERY_CACHE_GRACE_S):
+        self.backend = backend
+        self.ttl_s = ttl_s
+        self.grace_s = grace_s
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    def closed_until(self, width: timedelta, now: datetime | None = None) -> datetime:
+        """Start of the first bucket that may still change"""
+        return bin_start((now or datetime.now()) - timedelta(seconds=self.grace_s), width)
+
+    @staticmethod
+    def key(filters: GetReadingParams, sensors: Sequence[str], by_server: bool, generations: dict[str, int]) -> str:
+        """Hash of the normalized filters, pagination and gap fill don't change the rows"""
+        payload = {
+            "servers": sorted(filters.server_ids),
+            "sensors": list(sensors),
+            "aggregation": filters.aggregation,
+            "start_time": filters.start_time.isoformat() if filters.start_time else None,
+            "end_time": filters.end_time.isoformat() if filters.end_time else None,
+            "stats": list(filters.statistics),
+            "by_server": by_server,
+            "generations": sorted(generations.items()),
+        }
+        return hashlib.sha256(json.dumps(payload, separators=(",", ":")).encode()).hexdigest()
+
+    async def get(self, key: str) -> list[dict] | None:
+        try:
+            return await self.backend.get(key)
+        except Exception:
+            # An unavailable cache only costs the query
+            logger.exception("Query cache get failed")
+            return None
+
+    async def set(self, key: str, rows: list[dict]):
+        try:
+            await self.backend.set(key, rows, self.ttl_s)
+        except Exception:
+            logger.exception("Query cache set failed")
+
+    def clear(self):
+        if self.backend is not None:
+            self.backend.clear()
+
+
+def build_query_cache() -> QueryCache:
+    if QUERY_CACHE_BACKEND == "postgres":
+        from core.database import async_engine
+        return QueryCache(PostgresCacheBackend(async_engine))
+    if QUERY_CACHE_BACKEND == "local":
+        return QueryCache(LocalCacheBackend())
+    return QueryCache()
+
+
+aggregation_cache = build_query_cache()
@@ -0,0 +1,195 @@
+import logging
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from core.settings import (
+    RATE_LIMIT_BACKEND,
+    RATE_LIMIT_DEVICE_HZ,
+    RATE_LIMIT_DEVICE_BURST,
+    RATE_LIMIT_CLIENT_HZ,
+    RATE_LIMIT_CLIENT_BURST,
+    RATE_LIMIT_OVERRIDES,
+    RATE_LIMIT_MAX_KEYS,
+)
+
+logger = logging.getLogger(__name__)
+
+DEVICE_KEY_PREFIX = "device:"
+CLIENT_KEY_PREFIX = "ip:"
+
+
+class RateLimit(NamedTuple):
+    """Sustained rate and the number of requests allowed back to back"""
+    rate_hz: float
+    burst: int
+
+    @property
+    def emission_interval(self) -> float:
+        return 1 / self.rate_hz
+
+    @property
+    def capacity(self) -> float:
+        return self.burst * self.emission_interval
+
+
+class RateLimitResult(NamedTuple):
+    allowed: bool
+    retry_after: float = 0.0  # Seconds until the next request would be allowed
+
+
+class LocalRateLimitBackend:
+    """GCRA cells kept in this process.
+
+    Each key only stores its theoretical arrival time (TAT). A key whose TAT is
+    in the past behaves exactly like an unknown key, so it is evicted; the
+    number of keys is also capped, dropping the least recently used ones.
+    """
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._cells: OrderedDict[str, float] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._cells)
+
+    async def hit(self, key: str, limit: RateLimit) -> RateLimitResult:
+        now = time.monotonic()
+        new_tat = max(self._cells.get(key, now), now) + limit.emission_interval
+
+        if new_tat - now > limit.capacity:
+            return RateLimitResult(False, new_tat - now - limit.capacity)
+
+        self._cells[key] = new_tat
+        self._cells.move_to_end(key)
+        self._evict(now)
+        return RateLimitResult(True)
+
+    def _evict(self, now: float):
+        while self._cells:
+            key, tat = next(iter(self._cells.items()))
+            if tat > now and len(self._cells) <= self.max_keys:
+                break
+            del self._cells[key]
+
+
+class PostgresRateLimitBackend:
+    """GCRA cells shared by every worker through an UNLOGGED PostgreSQL table.
+
+    The check and the update of a cell are a single upsert, so concurrent
+    workers can't both spend the same slot. The database clock is used so
+    workers on different hosts agree on the time.
+    """
+
+    CREATE_SQL = text(
+        "CREATE UNLOGGED TABLE IF NOT EXISTS rate_limit_cell ("
+        " key VARCHAR(255) PRIMARY KEY,"
+        " tat DOUBLE PRECISION NOT NULL)"
+    )
+
+    # asyncpg needs explicit types for the parameters used in arithmetic
+    HIT_SQL = text("""
+        INSERT INTO rate_limit_cell AS cell (key, tat)
+        VALUES (:key, CAST(extract(epoch FROM clock_timestamp()) AS DOUBLE PRECISION) + CAST(:interval AS DOUBLE PRECISION))
+        ON CONFLICT (key) DO UPDATE
+        SET tat = GREATEST(cell.tat, EXCLUDED.tat - CAST(:interval AS DOUBLE PRECISION)) + CAST(:interval AS DOUBLE PRECISION)
+        WHERE GREATEST(cell.tat - EXCLUDED.tat + CAST(:interval AS DOUBLE PRECISION), 0) + CAST(:interval AS DOUBLE PRECISION) <= CAST(:capacity AS DOUBLE PRECISION)
+        RETURNING cell.tat
+    """)
+
+    RETRY_AFTER_SQL = text(
+        "SELECT tat + CAST(:interval AS DOUBLE PRECISION) - CAST(:capacity AS DOUBLE PRECISION)"
+        " - CAST(extract(epoch FROM clock_timestamp()) AS DOUBLE PRECISION)"
+        " FROM rate_limit_cell WHERE key = :key"
+    )
+
+    EVICT_SQL = text(
+        "DELETE FROM rate_limit_cell"
+        " WHERE tat < CAST(extract(epoch FROM clock_timestamp()) AS DOUBLE PRECISION)"
+    )
+
+    def __init__(self, engine: AsyncEngine, eviction_interval: float = 60.0):
+        self.engine = engine
+        self.eviction_interval = eviction_interval
+        self._table_ready = False
+        self._last_eviction = time.monotonic()
+
+    async def hit(self, key: str, limit: RateLimit) -> RateLimitResult:
+        params = {"key": key, "interval": limit.emission_interval, "capacity": limit.capacity}
+
+        async with self.engine.begin() as connection:
+            if not self._table_ready:
+                await connection.execute(self.CREATE_SQL)
+                self._table_ready = True
+
+            if (await connection.execute(self.HIT_SQL, params)).first() is not None:
+                result = RateLimitResult(True)
+            else:
+                retry_after = (await connection.execute(self.RETRY_AFTER_SQL, params)).scalar()
+                result = RateLimitResult(False, max(retry_after or 0.0, 0.0))
+
+            if time.monotonic() - self._last_eviction > self.eviction_interval:
+                self._last_eviction = time.monotonic()
+                await connection.execute(self.EVICT_SQL)
+
+        return result
+
+
+def parse_overrides(value: str) -> dict[str, RateLimit]:
+    """Parse "key=rate[/burst]" pairs separated by commas"""
+    overrides = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        key, _, limit = item.rpartition("=")
+        if not key:
+            raise ValueError(f"Invalid rate limit override: {item}")
+        rate, _, burst = limit.partition("/")
+        overrides[key.strip()] = RateLimit(float(rate), int(burst) if burst else max(int(float(rate)), 1))
+    return overrides
+
+
+class RateLimiter:
+    """Chooses the limit of each key and checks it against the backend"""
+
+    def __init__(
+        self,
+        backend,
+        device_limit: RateLimit,
+        client_limit: RateLimit,
+        overrides: dict[str, RateLimit] | None = None,
+    ):
+        self.backend = backend
+        self.device_limit = device_limit
+        self.client_limit = client_limit
+        self.overrides = overrides or {}
+
+    def limit_for(self, key: str) -> RateLimit:
+        if key in self.overrides:
+            return self.overrides[key]
+        if key.startswith(DEVICE_KEY_PREFIX):
+            return self.device_limit
+        return self.client_limit
+
+    async def hit(self, key: str) -> tuple[RateLimit, RateLimitResult]:
+        limit = self.limit_for(key)
+        try:
+            return limit, await self.backend.hit(key, limit)
+        except Exception:
+            # An unavailable backend must not take the API down with it
+            logger.exception("Rate limit backend failed, allowing the request")
+            return limit, RateLimitResult(True)
+
+
+def build_rate_limiter() -> RateLimiter:
+    if RATE_LIMIT_BACKEND == "postgres":
+        from core.database import async_engine
+        backend = PostgresRateLimitBackend(async_engine)
+    else:
+        backend = LocalRateLimitBackend()
+
+    return RateLimiter(
+        backend,
+        device_limit=RateLimit(RATE_LIMIT_DEVICE_HZ, RATE_LIMIT_DEVICE_BURST),
+        client_limit=RateLimit(RATE_LIMIT_CLIENT_HZ, RATE_LIMIT_CLIENT_BURST),
+        overrides=parse_overrides(RATE_LIMIT_OVERRIDES),
+    )
@@ -0,0 +1,59 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from core.enums import AggregationType
+from core.settings import RETENTION_RAW_DAYS, RETENTION_MINUTE_DAYS, RETENTION_HOUR_DAYS
+from utils.pagination_utils import RAW_RESOLUTION
+from utils.rollup_utils import truncate
+
+# From the finest to the coarsest, the day rollups are kept forever
+RESOLUTIONS = (RAW_RESOLUTION, AggregationType.MINUTE.value, AggregationType.HOUR.value, AggregationType.DAY.value)
+
+
+@dataclass(frozen=True)
+class RetentionPolicy:
+    """How many days each resolution of the readings is kept, 0 keeps it forever"""
+    raw_days: int = 0
+    minute_days: int = 0
+    hour_days: int = 0
+
+    @property
+    def enabled(self) -> bool:
+        return any((self.raw_days, self.minute_days, self.hour_days))
+
+    def cutoff(self, resolution: str, now: datetime | None = None) -> datetime | None:
+        """Start of the oldest day still kept at this resolution, None when nothing expires"""
+        days = {
+            RAW_RESOLUTION: self.raw_days,
+            AggregationType.MINUTE.value: self.minute_days,
+            AggregationType.HOUR.value: self.hour_days,
+        }.get(resolution, 0)
+        if not days:
+            return None
+        return truncate((now or datetime.now()) - timedelta(days=days), AggregationType.DAY)
+
+    def tiers(self, finest: str, start: datetime | None = None, end: datetime | None = None,
+              now: datetime | None = None) -> list[tuple[str, datetime | None, datetime | None]]:
+        """Resolution serving each part of the [start, end] range, oldest part first.
+
+        Each tier is (resolution, lower, upper) covering [lower, upper), None
+        meaning unbounded. The finest resolution still kept is used for each
+        part, never one finer than `finest`.
+        """
+        tiers = []
+        upper = None
+        for resolution in RESOLUTIONS[RESOLUTIONS.index(finest):]:
+            lower = self.cutoff(resolution, now)
+            if upper is None or lower is None or lower < upper:
+                tiers.append((resolution, lower, upper))
+            if lower is None:
+                break
+            upper = lower if upper is None else min(upper, lower)
+
+        return [
+            (resolution, lower, upper) for resolution, lower, upper in reversed(tiers)
+            if not (end is not None and lower is not None and lower > end)
+            and not (start is not None and upper is not None and upper <= start)
+        ]
+
+
+retention_policy = RetentionPolicy(RETENTION_RAW_DAYS, RETENTION_MINUTE_DAYS, RETENTION_HOUR_DAYS)
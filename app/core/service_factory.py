@@ -1,4 +1,4 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from services.reading_service import ReadingService
 from services.server_service import ServerService
 from services.user_service import UserService
@@ -15,7 +15,7 @@ class ServiceFactory:
             cls._instance._services = {}
         return cls._instance
     
-    def get_user_service(self, db: Session) -> UserService:
+    def get_user_service(self, db: AsyncSession) -> UserService:
         """Get or create a UserService instance for the given db session"""
         service_key = f"user_service_{id(db)}"
         if service_key not in self._services:
@@ -23,14 +23,14 @@ class ServiceFactory:
         return self._services[service_key]
     
     # You can add more service getters here as your application grows
-    def get_reading_service(self, db: Session) -> ReadingService:
+    def get_reading_service(self, db: AsyncSession) -> ReadingService:
         """Get or create a ReadingService instance for the given db session"""
         service_key = f"reading_service_{id(db)}"
         if service_key not in self._services:
             self._services[service_key] = ReadingService(db)
         return self._services[service_key]
     
-    def get_server_service(self, db: Session) -> ServerService:
+    def get_server_service(self, db: AsyncSession) -> ServerService:
         """Get or create a ServerService instance for the given db session"""
         service_key = f"server_service_{id(db)}"
         if service_key not in self._services:
@@ -21,6 +21,10 @@ SECRET_KEY = get_env_variable("SECRET_KEY", "your-secret-key-for-development-onl
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = int(get_env_variable("ACCESS_TOKEN_EXPIRE_MINUTES", "60"))
 
+# Token exigido no header X-Internal-Token pelas rotas /internal (métricas operacionais),
+# vazio desativa as rotas
+INTERNAL_API_TOKEN = get_env_variable("INTERNAL_API_TOKEN", "")
+
 # Configurações do banco de dados
 
 DB_USER = get_env_variable("DB_USER")
@@ -29,4 +33,130 @@ DB_HOST = get_env_variable("DB_HOST")
 DB_NAME = get_env_variable("DB_NAME")
 
 DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:5432/{DB_NAME}"
+# Usada pelas rotas, com o driver assíncrono asyncpg
+ASYNC_DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:5432/{DB_NAME}"
+
+# Pool de conexões, aplicado a cada engine de cada worker.
+# Conexões máximas no Postgres ~= workers * 2 engines * (DB_POOL_SIZE + DB_MAX_OVERFLOW)
+DB_POOL_SIZE = int(get_env_variable("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(get_env_variable("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(get_env_variable("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(get_env_variable("DB_POOL_RECYCLE", "1800"))  # -1 desativa
+DB_POOL_PRE_PING = get_env_variable("DB_POOL_PRE_PING", "false").lower() == "true"
+
+# Configurações de ingestão
+
+MAX_BATCH_SIZE = int(get_env_variable("MAX_BATCH_SIZE", "1000"))
+
+# "direct" grava cada leitura no banco durante a requisição,
+# "buffered" enfileira as leituras e grava em lotes em segundo plano
+INGEST_MODE = get_env_variable("INGEST_MODE", "direct")
+if INGEST_MODE not in ("direct", "buffered"):
+    raise ValueError(f"Invalid INGEST_MODE: {INGEST_MODE}")
+
+INGEST_BUFFER_MAX_SIZE = int(get_env_variable("INGEST_BUFFER_MAX_SIZE", "10000"))
+INGEST_BUFFER_BATCH_SIZE = int(get_env_variable("INGEST_BUFFER_BATCH_SIZE", "500"))
+INGEST_BUFFER_FLUSH_INTERVAL_MS = int(get_env_variable("INGEST_BUFFER_FLUSH_INTERVAL_MS", "200"))
+INGEST_BUFFER_PUT_TIMEOUT_MS = int(get_env_variable("INGEST_BUFFER_PUT_TIMEOUT_MS", "100"))
+INGEST_BUFFER_DRAIN_TIMEOUT_S = int(get_env_variable("INGEST_BUFFER_DRAIN_TIMEOUT_S", "30"))
+# Por quanto tempo (segundos) um servidor existente dispensa nova consulta antes de enfileirar suas leituras,
+# limita o tempo em que leituras de um servidor removido por outro worker ainda são aceitas
+INGEST_BUFFER_KNOWN_SERVER_TTL_S = float(get_env_variable("INGEST_BUFFER_KNOWN_SERVER_TTL_S", "60"))
+
+# Importação de dados históricos
+BACKFILL_CHUNK_SIZE = int(get_env_variable("BACKFILL_CHUNK_SIZE", "5000"))
+BACKFILL_MAX_REPORTED_ERRORS = int(get_env_variable("BACKFILL_MAX_REPORTED_ERRORS", "100"))
+
+# Rate limit (GCRA). "local" guarda o estado em cada worker,
+# "postgres" compartilha o estado entre todos os workers
+RATE_LIMIT_BACKEND = get_env_variable("RATE_LIMIT_BACKEND", "local")
+if RATE_LIMIT_BACKEND not in ("local", "postgres"):
+    raise ValueError(f"Invalid RATE_LIMIT_BACKEND: {RATE_LIMIT_BACKEND}")
+
+# Limites para servidores (cabeçalho X-Device-ID) e para os demais clientes (por IP)
+RATE_LIMIT_DEVICE_HZ = float(get_env_variable("RATE_LIMIT_DEVICE_HZ", "12"))
+RATE_LIMIT_DEVICE_BURST = int(get_env_variable("RATE_LIMIT_DEVICE_BURST", "12"))
+RATE_LIMIT_CLIENT_HZ = float(get_env_variable("RATE_LIMIT_CLIENT_HZ", "12"))
+RATE_LIMIT_CLIENT_BURST = int(get_env_variable("RATE_LIMIT_CLIENT_BURST", "12"))
+# Limites por chave, ex: "device:01HGYX7TBDFRX8HRJC5RF7Z3GY=50/50,ip:10.0.0.5=100"
+RATE_LIMIT_OVERRIDES = get_env_variable("RATE_LIMIT_OVERRIDES", "")
+RATE_LIMIT_MAX_KEYS = int(get_env_variable("RATE_LIMIT_MAX_KEYS", "100000"))
+
+# Paginação do GET /data (keyset em timestamp, id)
+READINGS_PAGE_SIZE = int(get_env_variable("READINGS_PAGE_SIZE", "500"))
+READINGS_MAX_PAGE_SIZE = int(get_env_variable("READINGS_MAX_PAGE_SIZE", "5000"))
+
+# Máximo de buckets de uma agregação com start_time e end_time (ex: 6h em intervalos de 5s)
+AGGREGATION_MAX_BUCKETS = int(get_env_variable("AGGREGATION_MAX_BUCKETS", "10000"))
+# Máximo de servidores em uma consulta (server_ulids)
+READINGS_MAX_SERVERS = int(get_env_variable("READINGS_MAX_SERVERS", "1000"))
+# Máximo de pontos por série pedidos com max_points
+READINGS_MAX_POINTS = int(get_env_variable("READINGS_MAX_POINTS", "10000"))
+# Máximo de leituras brutas carregadas para o downsampling LTTB, e quantas são lidas por vez
+DOWNSAMPLE_MAX_ROWS = int(get_env_variable("DOWNSAMPLE_MAX_ROWS", "2000000"))
+DOWNSAMPLE_CHUNK_SIZE = int(get_env_variable("DOWNSAMPLE_CHUNK_SIZE", "10000"))
+
+# Cache das agregações. "local" guarda os resultados em cada worker, "postgres"
+# compartilha entre os workers, "none" desativa. Só os buckets fechados (anteriores
+# a agora - QUERY_CACHE_GRACE_S) são guardados, o bucket aberto é sempre recalculado
+QUERY_CACHE_BACKEND = get_env_variable("QUERY_CACHE_BACKEND", "local")
+if QUERY_CACHE_BACKEND not in ("none", "local", "postgres"):
+    raise ValueError(f"Invalid QUERY_CACHE_BACKEND: {QUERY_CACHE_BACKEND}")
+QUERY_CACHE_MAX_ENTRIES = int(get_env_variable("QUERY_CACHE_MAX_ENTRIES", "1024"))
+QUERY_CACHE_TTL_S = int(get_env_variable("QUERY_CACHE_TTL_S", "86400"))
+QUERY_CACHE_GRACE_S = int(get_env_variable("QUERY_CACHE_GRACE_S", "60"))
+
+# Tempo (segundos) que clientes e proxies podem reutilizar uma consulta de um intervalo
+# já fechado (Cache-Control), os demais resultados são sempre revalidados pelo ETag
+HTTP_CACHE_MAX_AGE_S = int(get_env_variable("HTTP_CACHE_MAX_AGE_S", "300"))
+
+# Um servidor está online se enviou leituras nos últimos SERVER_ONLINE_WINDOW_S segundos
+SERVER_ONLINE_WINDOW_S = 10
+
+# Paginação de GET /health/summary
+HEALTH_PAGE_SIZE = int(get_env_variable("HEALTH_PAGE_SIZE", "500"))
+HEALTH_MAX_PAGE_SIZE = int(get_env_variable("HEALTH_MAX_PAGE_SIZE", "5000"))
+
+# Stream de transições online/offline (GET /health/stream): intervalo (segundos) da avaliação
+# feita uma vez por worker, intervalo da releitura do banco (leituras recebidas por outros
+# workers), eventos pendentes por assinante e intervalo dos keepalives
+HEALTH_MONITOR_INTERVAL_S = float(get_env_variable("HEALTH_MONITOR_INTERVAL_S", "1"))
+HEALTH_MONITOR_REFRESH_S = float(get_env_variable("HEALTH_MONITOR_REFRESH_S", "5"))
+HEALTH_STREAM_QUEUE_SIZE = int(get_env_variable("HEALTH_STREAM_QUEUE_SIZE", "1000"))
+HEALTH_STREAM_KEEPALIVE_S = float(get_env_variable("HEALTH_STREAM_KEEPALIVE_S", "15"))
+
+# Stream de leituras novas (GET /data/stream). "local" entrega somente aos assinantes do próprio
+# worker, "postgres" distribui entre os workers com LISTEN/NOTIFY (necessário com mais de um worker)
+READING_STREAM_CHANNEL = get_env_variable("READING_STREAM_CHANNEL", "local")
+if READING_STREAM_CHANNEL not in ("local", "postgres"):
+    raise ValueError(f"Invalid READING_STREAM_CHANNEL: {READING_STREAM_CHANNEL}")
+
+READING_STREAM_QUEUE_SIZE = int(get_env_variable("READING_STREAM_QUEUE_SIZE", "1000"))  # Leituras pendentes por assinante
+READING_STREAM_NOTIFY_QUEUE_SIZE = int(get_env_variable("READING_STREAM_NOTIFY_QUEUE_SIZE", "10000"))  # Leituras aguardando o NOTIFY
+READING_STREAM_KEEPALIVE_S = float(get_env_variable("READING_STREAM_KEEPALIVE_S", "15"))
+# Intervalo (segundos) em que um worker com assinantes avisa os outros pelo canal postgres,
+# sem nenhum worker com assinantes as leituras não são enviadas com NOTIFY
+READING_STREAM_PRESENCE_S = float(get_env_variable("READING_STREAM_PRESENCE_S", "10"))
+
+# Intervalo mínimo (segundos) entre atualizações do last_seen_at de um servidor por worker,
+# deve ficar bem abaixo dos 10 segundos que definem um servidor online
+LAST_SEEN_THROTTLE_S = float(get_env_variable("LAST_SEEN_THROTTLE_S", "1"))
+
+# Exportação de leituras (linhas buscadas e codificadas por vez)
+EXPORT_CHUNK_SIZE = int(get_env_variable("EXPORT_CHUNK_SIZE", "2000"))
+
+# Particionamento da tabela reading por intervalo de timestamp (somente PostgreSQL).
+# "none" mantém a tabela simples, "day" ou "week" criam partições diárias ou semanais
+READING_PARTITION_INTERVAL = get_env_variable("READING_PARTITION_INTERVAL", "none")
+if READING_PARTITION_INTERVAL not in ("none", "day", "week"):
+    raise ValueError(f"Invalid READING_PARTITION_INTERVAL: {READING_PARTITION_INTERVAL}")
+
+READING_PARTITIONS_AHEAD = int(get_env_variable("READING_PARTITIONS_AHEAD", "7"))  # Partições futuras criadas antecipadamente
+READING_PARTITION_CHECK_INTERVAL_S = int(get_env_variable("READING_PARTITION_CHECK_INTERVAL_S", "3600"))
 
+# Retenção (em dias, 0 mantém para sempre). As leituras brutas expiradas são
+# removidas depois de consolidadas nos rollups; os rollups por dia nunca expiram
+RETENTION_RAW_DAYS = int(get_env_variable("RETENTION_RAW_DAYS", "0"))
+RETENTION_MINUTE_DAYS = int(get_env_variable("RETENTION_MINUTE_DAYS", "0"))
+RETENTION_HOUR_DAYS = int(get_env_variable("RETENTION_HOUR_DAYS", "0"))
+RETENTION_CHECK_INTERVAL_S = int(get_env_variable("RETENTION_CHECK_INTERVAL_S", "3600"))
@@ -1,27 +1,51 @@
-from fastapi import Depends
+import secrets
+from fastapi import Depends, Header
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from services.reading_service import ReadingService
-from core.database import get_db
-from exceptions.custom_exceptions import UnauthorizedException
+from core.database import get_db, get_async_db
+from core.settings import INTERNAL_API_TOKEN
+from exceptions.custom_exceptions import ForbiddenException, UnauthorizedException
 from schemas.user_schema import UserResponse
 from mappers.user_mapper import UserMapper
 from services.auth_service import get_current_user
 from services.user_service import UserService
 from core.service_factory import service_factory
 from services.server_service import ServerService
+from services.ingest_buffer import IngestBuffer, ingest_buffer
+from services.health_monitor import HealthMonitor, health_monitor
+from services.reading_broker import ReadingBroker, reading_broker
+from services.backfill_service import BackfillService
+from services.export_service import ExportService
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
-def get_user_service(db: Session = Depends(get_db)) -> UserService:
+def get_user_service(db: AsyncSession = Depends(get_async_db)) -> UserService:
     return service_factory.get_user_service(db)
 
-def get_reading_service(db: Session = Depends(get_db)) -> ReadingService:
+def get_reading_service(db: AsyncSession = Depends(get_async_db)) -> ReadingService:
     return service_factory.get_reading_service(db)
 
-def get_server_service(db: Session = Depends(get_db)) -> ServerService:
+def get_server_service(db: AsyncSession = Depends(get_async_db)) -> ServerService:
     return service_factory.get_server_service(db)
 
+def get_backfill_service(db: Session = Depends(get_db)) -> BackfillService:
+    return BackfillService(db)
+
+def get_export_service(db: AsyncSession = Depends(get_async_db, scope="request")) -> ExportService:
+    # Request scoped, the session is closed after the streamed response was sent
+    return ExportService(db)
+
+def get_ingest_buffer() -> IngestBuffer:
+    return ingest_buffer
+
+def get_health_monitor() -> HealthMonitor:
+    return health_monitor
+
+def get_reading_broker() -> ReadingBroker:
+    return reading_broker
+
 async def get_current_user_dependency(
     token: str = Depends(oauth2_scheme), 
     user_service: UserService = Depends(get_user_service)
@@ -30,7 +54,7 @@ async def get_current_user_dependency(
     Dependency that provides the current authenticated user.
     Uses the user_service dependency to get user information.
     """
-    current_user = get_current_user(token, user_service)
+    current_user = await get_current_user(token, user_service)
     
     if current_user is None:
         raise UnauthorizedException("Invalid authentication credentials")
@@ -38,3 +62,14 @@ async def get_current_user_dependency(
     return UserMapper.from_entity_to_response(current_user)
 
 
+def require_internal_token(x_internal_token: str | None = Header(default=None)) -> None:
+    """
+    Dependency that restricts a route to the operators holding INTERNAL_API_TOKEN.
+    The routes are closed while the token isn't configured.
+    """
+    if not INTERNAL_API_TOKEN:
+        raise ForbiddenException("Internal routes are disabled, set INTERNAL_API_TOKEN")
+    if x_internal_token is None or not secrets.compare_digest(x_internal_token, INTERNAL_API_TOKEN):
+        raise ForbiddenException("Invalid internal token")
+
+
@@ -9,7 +9,18 @@ class UnauthorizedException(Exception):
         self.message = message
         super().__init__(self.message)
 
+class ForbiddenException(Exception):
+    def __init__(self, message):
+        self.message = message
+        super().__init__(self.message)
+
 class NotFoundException(Exception):
     def __init__(self, message):
         self.message = message
-        super().__init__(self.message)
\ No newline at end of file
+        super().__init__(self.message)
+
+class ServiceUnavailableException(Exception):
+    def __init__(self, message, retry_after: int = 1):
+        self.message = message
+        self.retry_after = retry_after
+        super().__init__(self.message)
@@ -6,7 +6,7 @@ from fastapi.responses import JSONResponse
 from pydantic import BaseModel, ValidationError
 from sqlalchemy.exc import DataError, NoReferencedTableError, IntegrityError
 from psycopg2.errors import UniqueViolation, ForeignKeyViolation
-from exceptions.custom_exceptions import ConflictException, NotFoundException, UnauthorizedException
+from exceptions.custom_exceptions import ConflictException, ForbiddenException, NotFoundException, UnauthorizedException, ServiceUnavailableException
 from jose.exceptions import JWTClaimsError, ExpiredSignatureError, JWTError
 import json
 
@@ -16,7 +16,9 @@ from schemas.error_schema import (
     NotFoundError,
     ConflictError,
     UnauthorizedError,
-    HTTPValidationError
+    ForbiddenError,
+    HTTPValidationError,
+    ServiceUnavailableError
 )
 
 
@@ -74,6 +76,18 @@ async def unauthorized_exception_handler(request: Request, exc: UnauthorizedExce
     ).to_response({"WWW-Authenticate": "Bearer"})
 
 
+async def forbidden_exception_handler(request: Request, exc: ForbiddenException) -> JSONResponse:
+    return ForbiddenError.create(
+        detail=f"Forbidden: {str(exc)}",
+    ).to_response()
+
+
+async def service_unavailable_handler(request: Request, exc: ServiceUnavailableException) -> JSONResponse:
+    return ServiceUnavailableError.create(
+        detail=f"Service unavailable: {str(exc)}",
+    ).to_response({"Retry-After": str(exc.retry_after)})
+
+
 async def invalid_token_handler(request: Request, exc: Union[JWTClaimsError, ExpiredSignatureError, JWTError]) -> JSONResponse:
     return UnauthorizedError.create(
         detail=f"Token error: {str(exc)}",
@@ -126,6 +140,8 @@ def register_exception_handlers(app: FastAPI):
     app.add_exception_handler(IntegrityError, database_error_handler)
     app.add_exception_handler(ConflictException, conflict_exception_handler)
     app.add_exception_handler(UnauthorizedException, unauthorized_exception_handler)
+    app.add_exception_handler(ForbiddenException, forbidden_exception_handler)
+    app.add_exception_handler(ServiceUnavailableException, service_unavailable_handler)
     app.add_exception_handler(JWTClaimsError, invalid_token_handler)
     app.add_exception_handler(ExpiredSignatureError, invalid_token_handler)
     app.add_exception_handler(JWTError, invalid_token_handler)
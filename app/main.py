@@ -1,9 +1,36 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from routes import auth_routes, server_routes, reading_routes
+from routes import auth_routes, server_routes, reading_routes, internal_routes
 import uvicorn
 from exceptions.handler import register_exception_handlers
 from middlewares import register_middlewares
-from core.database import create_tables
+from core.database import create_tables, async_engine, reading_partitions
+from services.ingest_buffer import ingest_buffer
+from services.retention_service import retention_job
+from services.rollup_backfill import rollup_backfill_job
+from services.health_monitor import health_monitor
+from services.reading_broker import reading_broker
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if ingest_buffer.enabled:
+        await ingest_buffer.start()
+    await reading_partitions.start()
+    await rollup_backfill_job.start()
+    await retention_job.start()
+    await health_monitor.start()
+    await reading_broker.start()
+    yield
+    await reading_broker.stop()
+    await health_monitor.stop()
+    await retention_job.stop()
+    await rollup_backfill_job.stop()
+    await reading_partitions.stop()
+    # Write everything still queued before the worker exits
+    await ingest_buffer.stop()
+    await async_engine.dispose()
+
 # Create FastAPI app with improved OpenAPI documentation
 app = FastAPI(
     title="IoT Server Monitoring API",
@@ -43,7 +70,8 @@ Each server can have at most one of each sensor type:
     contact={
         "name": "Miguel Batista",
         "email": "miguelsbatista0610@gmail.com",
-    }
+    },
+    lifespan=lifespan
 
 )
 
@@ -55,6 +83,7 @@ register_middlewares(app)
 app.include_router(auth_routes.router)
 app.include_router(server_routes.router)
 app.include_router(reading_routes.router)
+app.include_router(internal_routes.router)
 
 
 if __name__ == "__main__":
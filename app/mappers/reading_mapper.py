@@ -1,21 +1,14 @@
-from typing import List
+from functools import partial
+from typing import Any, List, Sequence
+import orjson
 from models.reading import Reading
-from schemas.reading_schema import ReadingResponse, PostReading, GetReadingParams
-
-class ReadingMapper:
+from schemas.reading_schema import ReadingResponse, PostReading, GetReadingParams, BatchItemError, BatchReadingResponse
 
+# Sensor fields in the order ReadingResponse declares them, which is the order of the aggregated tuples
+RESPONSE_SENSORS = ("temperature", "humidity", "current", "voltage")
 
-    @staticmethod
-    def from_aggregate_tuple_to_response(entity: tuple, filters:GetReadingParams) -> ReadingResponse:
 
-        response = {
-            "timestamp":entity[0],
-            "temperature":entity[1] if filters.sensor_type=="temperature" or not filters.sensor_type else None,
-            "humidity":entity[2] if filters.sensor_type=="humidity" or not filters.sensor_type else None,
-            "current":entity[3] if filters.sensor_type=="current" or not filters.sensor_type else None,
-            "voltage":entity[4] if filters.sensor_type=="voltage"or not filters.sensor_type  else None
-        }
-        return ReadingResponse(**response)
+class ReadingMapper:
 
 
     @staticmethod
@@ -43,6 +36,17 @@ class ReadingMapper:
         except AttributeError as e:
             raise AttributeError(f"Error in mapping entity to response: {str(e)}. Entity: {entity}")
         
+    @staticmethod
+    def from_post_to_response(data: PostReading) -> ReadingResponse:
+        return ReadingResponse(
+            server_ulid=data.server_ulid,
+            temperature=data.temperature,
+            humidity=data.humidity,
+            current=data.current,
+            voltage=data.voltage,
+            timestamp=data.timestamp
+        )
+
     @staticmethod
     def from_post_to_entity(data: PostReading) -> Reading:
         return Reading(
@@ -54,12 +58,91 @@ class ReadingMapper:
             timestamp=data.timestamp
         )
 
-    
-    def from_entities_to_responses(entities: List[Reading], filters=None) -> List[ReadingResponse]:
-        return [ReadingMapper.from_entity_to_response(entity, filters) for entity in entities]
-    
+    @staticmethod
     def from_posts_to_entities(data: List[PostReading]) -> List[Reading]:
         return [ReadingMapper.from_post_to_entity(post) for post in data]
-    
-    def from_aggregate_tuples_to_responses(entities: List[Reading], filters=None) -> List[ReadingResponse]:
-        return [ReadingMapper.from_aggregate_tuple_to_response(entity, filters) for entity in entities]
\ No newline at end of file
+
+    @staticmethod
+    def to_batch_response(saved: List[Reading], errors: List[BatchItemError]) -> BatchReadingResponse:
+        return BatchReadingResponse(
+            accepted=len(saved),
+            rejected=len(errors),
+            errors=errors
+        )
+
+    @staticmethod
+    def from_import_result_to_response(accepted: int, rejected: int, errors: List[BatchItemError]) -> BatchReadingResponse:
+        return BatchReadingResponse(
+            accepted=accepted,
+            rejected=rejected,
+            errors=errors
+        )
+
+    @staticmethod
+    def to_json(rows: Sequence[Any], filters: GetReadingParams) -> bytes:
+        """JSON of the rows as List[ReadingResponse] with exclude_none, without building the models.
+
+        Produces the same document as the from_*_to_responses mappers serialized
+        by the response model, so routes can return it as the body directly.
+        """
+        return orjson.dumps(ReadingMapper.to_items(rows, filters))
+
+    @staticmethod
+    def to_items(rows: Sequence[Any], filters: GetReadingParams) -> List[dict]:
+        """The rows as the plain dicts ReadingResponse would dump, sensor_type masked and None values left out"""
+        sensors = (filters.sensor_type,) if filters.sensor_type else RESPONSE_SENSORS
+        if filters.statistics:
+            items = [ReadingMapper._statistics_item(row) for row in rows]
+        elif filters.lttb:
+            items = [ReadingMapper._item(row, RESPONSE_SENSORS, row.get) for row in rows]
+        elif filters.aggregation:
+            positions = tuple((sensor, RESPONSE_SENSORS.index(sensor) + 1) for sensor in sensors)
+            items = [ReadingMapper._aggregate_tuple_item(row, positions) for row in rows]
+        else:
+            items = [ReadingMapper._item(row, sensors, partial(getattr, row)) for row in rows]
+        return items
+
+    @staticmethod
+    def from_entity_to_item(entity: Reading) -> dict:
+        """The entity as the plain dict ReadingResponse would dump"""
+        return ReadingMapper._item(entity, RESPONSE_SENSORS, partial(getattr, entity))
+
+    @staticmethod
+    def _item(row: Any, sensors: Sequence[str], get) -> dict:
+        item = {}
+        server_ulid = get("server_ulid")
+        if server_ulid is not None:
+            item["server_ulid"] = server_ulid
+        for sensor in sensors:
+            value = get(sensor)
+            if value is not None:
+                item[sensor] = float(value)
+        if get("timestamp") is not None:
+            item["timestamp"] = get("timestamp")
+        return item
+
+    @staticmethod
+    def _aggregate_tuple_item(row: Sequence[Any], positions: Sequence[tuple[str, int]]) -> dict:
+        item = {}
+        for sensor, position in positions:
+            if row[position] is not None:
+                item[sensor] = float(row[position])
+        if row[0] is not None:
+            item["timestamp"] = row[0]
+        return item
+
+    @staticmethod
+    def _statistics_item(row: dict) -> dict:
+        stats = {}
+        for key, value in row.items():
+            if key != "timestamp":
+                sensor, stat = key.rsplit("_", 1)
+                if value is not None:
+                    value = value if isinstance(value, int) else float(value)
+                stats.setdefault(sensor, {})[stat] = value
+
+        item = {sensor: float(values["avg"]) for sensor, values in stats.items() if values.get("avg") is not None}
+        if row["timestamp"] is not None:
+            item["timestamp"] = row["timestamp"]
+        item["stats"] = stats
+        return item
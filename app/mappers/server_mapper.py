@@ -1,6 +1,9 @@
 from models.reading import Reading
 from models.server import Server
-from schemas.server_schema import ServerResponse, PostServer, ServerStatusResponse
+from datetime import timedelta
+from core.enums import ServerStatus
+from core.settings import SERVER_ONLINE_WINDOW_S
+from schemas.server_schema import ServerResponse, PostServer, ServerStatusResponse, ServerHealthResponse, FleetHealthResponse
 
 class ServerMapper:
 
@@ -32,10 +35,24 @@ class ServerMapper:
         return [ServerMapper.from_aggregate_health_data_to_status_response(server) for server in data]
     
     @staticmethod
-    def create_offline_status_response(server_entity: Server) -> ServerStatusResponse:
+    def from_fleet_health_row_to_response(data: tuple) -> ServerHealthResponse:
+        server_ulid, status, server_name, last_seen_at, online_since = data
+        if status == ServerStatus.ONLINE.value:
+            changed_at = online_since
+        else:
+            changed_at = last_seen_at + timedelta(seconds=SERVER_ONLINE_WINDOW_S) if last_seen_at else None
+        return ServerHealthResponse(
+            server_ulid=server_ulid,
+            server_name=server_name,
+            status=status,
+            last_seen_at=last_seen_at,
+            changed_at=changed_at
+        )
 
-        return ServerStatusResponse(
-            server_ulid=server_entity.id,
-            server_name=server_entity.server_name,
-            status="offline"
+    @staticmethod
+    def from_fleet_health_to_response(online: int, total: int, rows: list[tuple]) -> FleetHealthResponse:
+        return FleetHealthResponse(
+            online=online,
+            offline=total - online,
+            servers=[ServerMapper.from_fleet_health_row_to_response(row) for row in rows]
         )
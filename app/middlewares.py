@@ -1,75 +1,152 @@
-from starlette.middleware.base import BaseHTTPMiddleware
 from fastapi import Request, status, FastAPI
+from fastapi.routing import APIRoute
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 from schemas.error_schema import ErrorResponse
+from core.rate_limiter import (
+    CLIENT_KEY_PREFIX,
+    DEVICE_KEY_PREFIX,
+    RateLimiter,
+    build_rate_limiter,
+)
 import json
-import time
-from collections import defaultdict, deque
+import math
+from typing import Any, Callable
 import os
 
-class JSONErrorMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        if request.method in ["POST", "PUT", "PATCH"]:
-            content_type = request.headers.get("content-type", "")
-            if "application/json" in content_type:
-                try:
-                    await request.json()
-                except json.JSONDecodeError as e:
-                    error = ErrorResponse.create(
-                        detail=f"Invalid JSON: {str(e)}",
-                        type="json_decode_error",
-                        status_code=status.HTTP_400_BAD_REQUEST
-                    )
-                    return error.to_response()
-                
-        return await call_next(request)
-
-class RateLimitMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app, max_rate_hz=10.0, window_size=1.0):
-        super().__init__(app)
-        self.max_rate_hz = max_rate_hz
-        self.window_size = window_size 
-        self.request_history = defaultdict(lambda: deque())
+JSON_BODY_STATE_KEY = "json_body"
+RAW_BODY_STATE_KEY = "raw_body"
+
+
+def _get_header(scope: Scope, name: bytes) -> str | None:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+class JSONErrorMiddleware:
+    """Rejects requests with malformed JSON bodies.
+
+    The body is read and parsed once here; the raw bytes and the parsed value
+    are stored in the request state so `ParsedJSONRoute` endpoints reuse them
+    instead of parsing the body again.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] not in ("POST", "PUT", "PATCH"):
+            return await self.app(scope, receive, send)
+
+        content_type = _get_header(scope, b"content-type") or ""
+        if "application/json" not in content_type:
+            return await self.app(scope, receive, send)
+
+        body = await self._read_body(receive)
+        state = scope.setdefault("state", {})
+        state[RAW_BODY_STATE_KEY] = body
+
+        try:
+            state[JSON_BODY_STATE_KEY] = json.loads(body)
+        except json.JSONDecodeError as e:
+            error = ErrorResponse.create(
+                detail=f"Invalid JSON: {str(e)}",
+                type="json_decode_error",
+                status_code=status.HTTP_400_BAD_REQUEST
+            )
+            return await error.to_response()(scope, receive, send)
+
+        await self.app(scope, self._replay_body(body, receive), send)
+
+    @staticmethod
+    async def _read_body(receive: Receive) -> bytes:
+        chunks = []
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] != "http.request":
+                break
+            chunks.append(message.get("body", b""))
+            more_body = message.get("more_body", False)
+        return b"".join(chunks)
+
+    @staticmethod
+    def _replay_body(body: bytes, receive: Receive) -> Receive:
+        """Give the already consumed body back to apps that read the stream themselves"""
+        sent = False
+
+        async def replay() -> Message:
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        return replay
+
+
+class ParsedJSONRequest(Request):
+    """Request that reuses the body parsed by JSONErrorMiddleware"""
+
+    async def body(self) -> bytes:
+        if not hasattr(self, "_body") and RAW_BODY_STATE_KEY in self.scope.get("state", {}):
+            self._body = self.scope["state"][RAW_BODY_STATE_KEY]
+        return await super().body()
+
+    async def json(self) -> Any:
+        if not hasattr(self, "_json") and JSON_BODY_STATE_KEY in self.scope.get("state", {}):
+            self._json = self.scope["state"][JSON_BODY_STATE_KEY]
+        return await super().json()
+
+
+class ParsedJSONRoute(APIRoute):
+    """Route class whose endpoints receive a ParsedJSONRequest"""
+
+    def get_route_handler(self) -> Callable:
+        route_handler = super().get_route_handler()
+
+        async def parsed_json_route_handler(request: Request):
+            return await route_handler(ParsedJSONRequest(request.scope, request.receive))
+
+        return parsed_json_route_handler
+
+
+class RateLimitMiddleware:
+    """Applies the GCRA limits of `RateLimiter` to each device or client address"""
+
+    def __init__(self, app: ASGIApp, limiter: RateLimiter | None = None):
+        self.app = app
+        self.limiter = limiter or build_rate_limiter()
         self.disabled = os.getenv("DISABLE_RATE_LIMIT", "false").lower() == "true"
-        
-    def _get_client_id(self, request):
-        device_id = request.headers.get("X-Device-ID")
+
+    def _get_client_id(self, scope: Scope):
+        device_id = _get_header(scope, b"x-device-id")
         if device_id:
-            return device_id
+            return DEVICE_KEY_PREFIX + device_id
 
-        forwarded = request.headers.get("X-Forwarded-For")
+        forwarded = _get_header(scope, b"x-forwarded-for")
         if forwarded:
-            return forwarded.split(",")[0].strip()
-        return request.client.host if request.client else "unknown"
-    
-    def _is_rate_limited(self, client_id):
-        now = time.time()
-        client_history = self.request_history[client_id]
-        
-        # Remove requests outside of the current window
-        while client_history and client_history[0] < now - self.window_size:
-            client_history.popleft()# Remove the oldest request
-        
-        client_history.append(now)
-        
-        current_rate = len(client_history) / self.window_size
-        
-        return current_rate > self.max_rate_hz
-    
-    async def dispatch(self, request: Request, call_next):
-        if self.disabled:
-            return await call_next(request)
-        client_id = self._get_client_id(request)
-        
-        if self._is_rate_limited(client_id):
+            return CLIENT_KEY_PREFIX + forwarded.split(",")[0].strip()
+        return CLIENT_KEY_PREFIX + (scope["client"][0] if scope.get("client") else "unknown")
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if self.disabled or scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        limit, result = await self.limiter.hit(self._get_client_id(scope))
+
+        if not result.allowed:
             error = ErrorResponse.create(
-                detail=f"Rate limit exceeded. Maximum allowed rate is {self.max_rate_hz}Hz.",
+                detail=f"Rate limit exceeded. Maximum allowed rate is {limit.rate_hz:g}Hz.",
                 type="rate_limit_exceeded",
                 status_code=status.HTTP_429_TOO_MANY_REQUESTS
             )
-            return error.to_response()
-        
-        return await call_next(request)
+            retry_after = max(math.ceil(result.retry_after), 1)
+            return await error.to_response({"Retry-After": str(retry_after)})(scope, receive, send)
+
+        return await self.app(scope, receive, send)
 
 def register_middlewares(app: FastAPI):
     app.add_middleware(JSONErrorMiddleware)
-    app.add_middleware(RateLimitMiddleware, max_rate_hz=12, window_size=1.2)# plus 20% to avoid burst rates
\ No newline at end of file
+    app.add_middleware(RateLimitMiddleware)
@@ -2,6 +2,8 @@ from models.base_model import Base
 from models.user import User
 from models.server import Server
 from models.reading import Reading
+from models.reading_rollup import ReadingRollupMinute, ReadingRollupHour, ReadingRollupDay
+from models.cache_generation import CacheGeneration
 
 # List all models here to ensure they're imported before Base.metadata is used
-__all__ = ['User', 'Server', 'Reading']
+__all__ = ['User', 'Server', 'Reading', 'ReadingRollupMinute', 'ReadingRollupHour', 'ReadingRollupDay', 'CacheGeneration']
@@ -0,0 +1,15 @@
+from sqlalchemy import Column, DateTime, Integer, String
+from models.base_model import Base
+
+
+class CacheGeneration(Base):
+    """Counter bumped whenever readings of a server change in buckets the query cache may hold.
+
+    The '*' row is bumped along with every server and by changes to all the
+    servers at once; cached aggregations are keyed by the counters they depend on.
+    """
+    __tablename__ = 'cache_generation'
+
+    server_ulid = Column(String(26), primary_key=True)  # A server ULID or '*'
+    generation = Column(Integer, nullable=False, default=0)
+    bumped_at = Column(DateTime)  # Time of the last bump, Last-Modified of historical results
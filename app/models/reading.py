@@ -1,4 +1,4 @@
-from sqlalchemy import CheckConstraint, Column, Integer, String, DateTime, Float, ForeignKey
+from sqlalchemy import CheckConstraint, Column, Index, Integer, String, DateTime, Float, ForeignKey
 from models.base_model import Base
 from sqlalchemy.orm import relationship
 
@@ -24,6 +24,9 @@ class Reading(Base):
             """,
             name='has_any_reading'
         ),
+        # Keyset pagination of GET /data walks these in (timestamp, id) order
+        Index('ix_reading_server_ulid_timestamp_id', 'server_ulid', 'timestamp', 'id'),
+        Index('ix_reading_timestamp_id', 'timestamp', 'id'),
     )
 
     def __str__(self):
@@ -0,0 +1,45 @@
+from sqlalchemy import Column, Integer, String, DateTime, Float
+from models.base_model import Base
+
+
+class ReadingRollupMixin:
+    """Sum, count, min and max of each sensor for one server and one time bucket.
+
+    Averages over any set of buckets are sum(sum) / sum(count), so aggregation
+    queries read one row per bucket instead of every raw reading.
+    """
+
+    server_ulid = Column(String(26), primary_key=True)
+    bucket = Column(DateTime, primary_key=True, index=True)  # Start of the bucket
+
+    temperature_sum = Column(Float, nullable=False, default=0)
+    temperature_count = Column(Integer, nullable=False, default=0)
+    temperature_min = Column(Float)
+    temperature_max = Column(Float)
+
+    humidity_sum = Column(Float, nullable=False, default=0)
+    humidity_count = Column(Integer, nullable=False, default=0)
+    humidity_min = Column(Float)
+    humidity_max = Column(Float)
+
+    voltage_sum = Column(Float, nullable=False, default=0)
+    voltage_count = Column(Integer, nullable=False, default=0)
+    voltage_min = Column(Float)
+    voltage_max = Column(Float)
+
+    current_sum = Column(Float, nullable=False, default=0)
+    current_count = Column(Integer, nullable=False, default=0)
+    current_min = Column(Float)
+    current_max = Column(Float)
+
+
+class ReadingRollupMinute(ReadingRollupMixin, Base):
+    __tablename__ = 'reading_rollup_minute'
+
+
+class ReadingRollupHour(ReadingRollupMixin, Base):
+    __tablename__ = 'reading_rollup_hour'
+
+
+class ReadingRollupDay(ReadingRollupMixin, Base):
+    __tablename__ = 'reading_rollup_day'
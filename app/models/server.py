@@ -1,5 +1,5 @@
 from models.base_model import Base
-from sqlalchemy import Column, Integer, String, ForeignKey
+from sqlalchemy import Column, DateTime, Index, Integer, String, ForeignKey
 from sqlalchemy.orm import relationship
 
 class Server(Base):
@@ -8,4 +8,13 @@ class Server(Base):
     id = Column(String(26), primary_key=True)  # ULID
     server_name = Column(String(255), nullable=False, unique=True)
     created_by = Column(Integer(), ForeignKey('user.id'), nullable=False)
+    last_seen_at = Column(DateTime)  # Newest reading timestamp, maintained by ingest
+    online_since = Column(DateTime)  # First reading after the last time the server went offline
+
+    __table_args__ = (
+        # The fleet health pages walk the servers of a user in id order
+        Index('ix_server_created_by_id', 'created_by', 'id'),
+        # The health monitor reads the servers seen within the online window every tick
+        Index('ix_server_last_seen_at', 'last_seen_at'),
+    )
     
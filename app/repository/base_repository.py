@@ -1,10 +1,16 @@
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import Generic, Type, TypeVar
+from typing import Generic, List, Type, TypeVar
 from sqlalchemy.exc import NoReferencedTableError
 from sqlalchemy.exc import IntegrityError
 
 T = TypeVar("T")
 
+def is_sqlite_session(session: Session | AsyncSession) -> bool:
+    """Check if the session is bound to a SQLite database (used by the test suite)"""
+    return 'sqlite' in str(session.bind.dialect).lower()
+
 class BaseRepository(Generic[T]):
 
     def __init__(self, model: Type[T], db: Session):
@@ -29,7 +35,7 @@ class BaseRepository(Generic[T]):
     def save(self, obj: T):
         if obj is None:
             raise ValueError("Object can't be None")
-        
+
         try:
             existing_obj = self.find_by_id(obj.id)
             if existing_obj:
@@ -38,10 +44,80 @@ class BaseRepository(Generic[T]):
                         setattr(existing_obj, key, value)
                 self.db.commit()
                 return existing_obj
-            
+
             self.db.add(obj)
             self.db.commit()
             return obj
         except (NoReferencedTableError, IntegrityError) as e:
             self.db.rollback()
             raise e
+
+    def save_all(self, objs: List[T]) -> List[T]:
+        """Persist several new objects in a single flush and commit."""
+        if not objs:
+            return []
+
+        try:
+            self.db.add_all(objs)
+            self.db.commit()
+            return objs
+        except (NoReferencedTableError, IntegrityError) as e:
+            self.db.rollback()
+            raise e
+
+
+class AsyncBaseRepository(Generic[T]):
+
+    def __init__(self, model: Type[T], db: AsyncSession):
+        """Initialize the repository with a model and an async database session."""
+        self.model = model
+        self.db = db
+
+    async def find_all(self):
+        result = await self.db.execute(select(self.model))
+        return result.scalars().all()
+
+    async def find_by_id(self, id: int):
+        result = await self.db.execute(select(self.model).where(self.model.id == id).limit(1))
+        return result.scalars().first()
+
+    async def delete(self, id: int):
+        obj = await self.find_by_id(id)
+        if obj:
+            await self.db.delete(obj)
+            await self.db.commit()
+            return True
+        return False
+
+    async def save(self, obj: T):
+        if obj is None:
+            raise ValueError("Object can't be None")
+
+        try:
+            # New rows without an id don't need the lookup round-trip
+            existing_obj = await self.find_by_id(obj.id) if obj.id is not None else None
+            if existing_obj:
+                for column in self.model.__table__.columns.keys():
+                    setattr(existing_obj, column, getattr(obj, column))
+                await self.db.commit()
+                return existing_obj
+
+            self.db.add(obj)
+            await self.db.commit()
+            return obj
+        except (NoReferencedTableError, IntegrityError) as e:
+            await self.db.rollback()
+            raise e
+
+    async def save_all(self, objs: List[T]) -> List[T]:
+        """Persist several new objects in a single flush and commit."""
+        if not objs:
+            return []
+
+        try:
+            self.db.add_all(objs)
+            await self.db.commit()
+            return objs
+        except (NoReferencedTableError, IntegrityError) as e:
+            await self.db.rollback()
+            raise e
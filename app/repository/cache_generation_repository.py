@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta
+from typing import Any, Iterable, Mapping, Sequence
+from sqlalchemy import Executable, func, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from core.settings import QUERY_CACHE_GRACE_S
+from models.cache_generation import CacheGeneration
+
+ALL_SERVERS = "*"
+
+
+def late_servers(readings: Iterable[Mapping[str, Any]], now: datetime | None = None) -> set[str]:
+    """Servers of the readings that land in buckets the query cache may already hold"""
+    closed_until = (now or datetime.now()) - timedelta(seconds=QUERY_CACHE_GRACE_S)
+    return {reading["server_ulid"] for reading in readings if reading["timestamp"] < closed_until}
+
+
+def build_bump_statement(server_ulids: Iterable[str] | None, is_sqlite: bool) -> Executable:
+    """Statement bumping the generation of the servers, or of '*' (every server) when None"""
+    # Sorted, so concurrent transactions lock the rows in the same order
+    keys = sorted(set(server_ulids)) if server_ulids is not None else [ALL_SERVERS]
+    insert = sqlite_insert if is_sqlite else postgresql_insert
+    table = CacheGeneration.__table__
+    now = datetime.now()
+    statement = insert(table).values([{"server_ulid": key, "generation": 1, "bumped_at": now} for key in keys])
+    return statement.on_conflict_do_update(
+        index_elements=[table.c.server_ulid],
+        set_={"generation": table.c.generation + 1, "bumped_at": statement.excluded.bumped_at}
+    )
+
+
+class AsyncCacheGenerationRepository:
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def find_generations(self, server_ulids: Sequence[str] = ()) -> dict[str, int]:
+        """Generations the results over these servers depend on: theirs and '*', or the
+        sum of all of them for every server (any bump changes it)"""
+        if not server_ulids:
+            result = await self.db.execute(select(func.coalesce(func.sum(CacheGeneration.generation), 0)))
+            return {ALL_SERVERS: result.scalar()}
+
+        result = await self.db.execute(
+            select(CacheGeneration.server_ulid, CacheGeneration.generation)
+            .where(CacheGeneration.server_ulid.in_([*server_ulids, ALL_SERVERS]))
+        )
+        return dict(result.all())
+
+    async def find_last_bump(self, server_ulids: Sequence[str] = ()) -> datetime | None:
+        """Last time readings of these servers (every server when empty) changed in closed buckets"""
+        query = select(func.max(CacheGeneration.bumped_at))
+        if server_ulids:
+            query = query.where(CacheGeneration.server_ulid.in_([*server_ulids, ALL_SERVERS]))
+        return (await self.db.execute(query)).scalar()
@@ -1,38 +1,177 @@
-from typing import List
-from sqlalchemy import func
-from core.enums import AggregationType
+import csv
+import io
+from datetime import timedelta
+from typing import AsyncIterator, List, Sequence
+from sqlalchemy import DateTime, Float, Integer, Interval, Row, cast, literal, delete, func, insert, select, tuple_, type_coerce, Select
+from sqlalchemy.ext.asyncio import AsyncSession
+from core.enums import AggregationType, StatisticType
+from core.settings import BACKFILL_CHUNK_SIZE
 from schemas.reading_schema import GetReadingParams
-from repository.base_repository import BaseRepository
+from repository.base_repository import AsyncBaseRepository, BaseRepository, is_sqlite_session
+from repository.rollup_repository import ROLLUP_TABLES, ReadingRollupRepository
 from models.reading import Reading
 from sqlalchemy.orm import Session
+from core import retention
+from utils.interval_utils import EPOCH, bin_ceil, bin_start, bucket_width, is_named, rollup_for
+from utils.pagination_utils import RAW_RESOLUTION
+from utils.stats_utils import parse_values, percentile_cont, stddev_samp
 
-class ReadingRepository(BaseRepository[Reading]):
+COPY_COLUMNS = ("server_ulid", "timestamp", "temperature", "humidity", "voltage", "current")
 
-    def __init__(self, session: Session):
-        super().__init__(Reading, session)
-        self.is_sqlite = 'sqlite' in str(session.bind.dialect).lower()
+# Order of the averages in aggregated rows, ReadingMapper reads them by position
+AGGREGATED_SENSORS = ("temperature", "humidity", "current", "voltage")
+
+COPY_SQL = 'COPY reading (server_ulid, "timestamp", temperature, humidity, voltage, "current") FROM STDIN WITH (FORMAT csv)'
+
+
+# Statistics the rollups can answer, the others are computed from the raw readings
+ROLLUP_STATISTICS = {StatisticType.AVG, StatisticType.MIN, StatisticType.MAX, StatisticType.COUNT}
+
+SIMPLE_STATISTICS = {
+    StatisticType.AVG: func.avg,
+    StatisticType.MIN: func.min,
+    StatisticType.MAX: func.max,
+    StatisticType.COUNT: func.count,
+}
+
+
+def _latest(*values):
+    values = [value for value in values if value is not None]
+    return max(values) if values else None
+
+def _earliest(*values):
+    values = [value for value in values if value is not None]
+    return min(values) if values else None
+
+
+class ReadingQueries:
+    """Statements shared by the sync and async reading repositories"""
+
+    is_sqlite: bool
+
+    def _select_by_server_ulid(self, server_ulid: str) -> Select:
+        return select(Reading).where(Reading.server_ulid == server_ulid)
+
+    @staticmethod
+    def _sensors(criteria: GetReadingParams) -> tuple[str, ...]:
+        """The sensors the criteria asks for, in the AGGREGATED_SENSORS order"""
+        return (criteria.sensor_type,) if criteria.sensor_type else AGGREGATED_SENSORS
+
+    def _filter_readings(self, query: Select, criteria: GetReadingParams) -> Select:
+        """Restrict the query to the readings of the criteria, with a value for the requested sensor"""
+        table = Reading.__table__
+
+        if criteria.server_ids:
+            query = query.where(table.c.server_ulid.in_(criteria.server_ids))
 
-    def find_by_server_ulid(self, server_ulid: str):
-        return self.db.query(Reading).filter(Reading.server_ulid == server_ulid).all()
-    
-    def find_by_criteria(self, criteria: GetReadingParams) -> List[Reading]:
-        query = self.db.query(Reading)
-        
-        if criteria.server_ulid:
-            query = query.filter(Reading.server_ulid == criteria.server_ulid)
-        
         if criteria.start_time:
-            query = query.filter(Reading.timestamp >= criteria.start_time)
-            
+            query = query.where(table.c.timestamp >= criteria.start_time)
+
+        if criteria.end_time:
+            query = query.where(table.c.timestamp <= criteria.end_time)
+
+        if criteria.sensor_type:
+            query = query.where(table.c[criteria.sensor_type].is_not(None))
+
+        return query
+
+    def _filter_rollup(self, query: Select, table, criteria: GetReadingParams) -> Select:
+        """Restrict the rollup query to the servers of the criteria and buckets with the requested sensor"""
+        if criteria.server_ids:
+            query = query.where(table.c.server_ulid.in_(criteria.server_ids))
+
+        if criteria.sensor_type:
+            query = query.where(table.c[f"{criteria.sensor_type}_count"] > 0)
+
+        return query
+
+    def _select_by_criteria(self, criteria: GetReadingParams) -> Select:
+        """Rows of the id, server, timestamp and requested sensors of the readings, without ORM entities"""
+        table = Reading.__table__
+        columns = (table.c.id, table.c.server_ulid, table.c.timestamp, *(table.c[sensor] for sensor in self._sensors(criteria)))
+        return self._filter_readings(select(*columns), criteria)
+
+    def _select_newest_id(self, criteria: GetReadingParams, since) -> Select:
+        """Newest reading id matching the criteria from `since` on"""
+        query = select(func.max(Reading.id)).where(Reading.timestamp >= since)
+        return self._filter_readings(query, criteria)
+
+    def _select_page(self, criteria: GetReadingParams, limit: int, lower=None, upper=None, after=None) -> Select:
+        """Keyset page ordered by (timestamp, id) within [lower, upper).
+
+        `after` is the (timestamp, id) of the last reading of the previous page,
+        with a None id to start right after a timestamp.
+        """
+        query = self._select_by_criteria(criteria)
+
+        if lower:
+            query = query.where(Reading.timestamp >= lower)
+
+        if upper:
+            query = query.where(Reading.timestamp < upper)
+
+        if after:
+            last_timestamp, last_id = after
+            if last_id is None:
+                query = query.where(Reading.timestamp > last_timestamp)
+            else:
+                query = query.where(tuple_(Reading.timestamp, Reading.id) > tuple_(last_timestamp, last_id))
+
+        return query.order_by(Reading.timestamp, Reading.id).limit(limit)
+
+    def _select_rollup_page(self, criteria: GetReadingParams, resolution: str, limit: int, lower=None, upper=None, after=None) -> Select:
+        """Keyset page of per server bucket averages ordered by (bucket, server_ulid), used for
+        ranges whose raw readings expired. `after` is the (bucket, server_ulid) of the previous page"""
+        table = ROLLUP_TABLES[AggregationType(resolution)]
+
+        query = self._filter_rollup(select(
+            table.c.server_ulid,
+            table.c.bucket.label('timestamp'),
+            *(
+                (table.c[f"{sensor}_sum"] / func.nullif(table.c[f"{sensor}_count"], 0)).label(sensor)
+                for sensor in self._sensors(criteria)
+            )
+        ), table, criteria)
+
+        start, end = _latest(criteria.start_time, lower), upper
+        if start:
+            query = query.where(table.c.bucket >= start)
+
+        if end:
+            query = query.where(table.c.bucket < end)
+
         if criteria.end_time:
-            query = query.filter(Reading.timestamp <= criteria.end_time)
-        
-        # Execute query and return domain entities
-        return query.all()
-    
-    
+            query = query.where(table.c.bucket <= criteria.end_time)
+
+        if after:
+            last_bucket, last_server = after
+            if last_server is None:
+                query = query.where(table.c.bucket > last_bucket)
+            else:
+                query = query.where(tuple_(table.c.bucket, table.c.server_ulid) > tuple_(last_bucket, last_server))
+
+        return query.order_by(table.c.bucket, table.c.server_ulid).limit(limit)
+
+    def _select_columns(self, criteria: GetReadingParams, columns: Sequence[str]) -> Select:
+        """Plain columns of the filtered readings in (timestamp, id) order, without ORM entities"""
+        query = select(*(Reading.__table__.c[column] for column in columns))
+        return self._filter_readings(query, criteria).order_by(Reading.timestamp, Reading.id)
+
+    def _build_bin_expr(self, width: timedelta, timestamp_column):
+        """Start of the epoch aligned bucket of the given width"""
+        if self.is_sqlite:
+            # Integer epoch arithmetic, the result has the same format as the truncations below
+            seconds = int(width.total_seconds())
+            epoch = cast(func.strftime('%s', timestamp_column), Integer)
+            return func.datetime(epoch // seconds * seconds, 'unixepoch')
+        return func.date_bin(literal(width, Interval), timestamp_column, literal(EPOCH, DateTime))
+
     def _build_date_trunc_expr(self, aggregation_str, timestamp_column):
         """Create database-specific date truncation expression"""
+        if not is_named(aggregation_str):
+            # Arbitrary intervals such as 15s or 6h
+            return self._build_bin_expr(bucket_width(aggregation_str), timestamp_column)
+
         if self.is_sqlite:
             # SQLite implementation - use string operations and substr for testing
             if aggregation_str == 'day':
@@ -52,36 +191,294 @@ class ReadingRepository(BaseRepository[Reading]):
             # PostgreSQL implementation - use date_trunc
             return func.date_trunc(aggregation_str, timestamp_column)
 
-    def find_aggregated_readings(self, filters: GetReadingParams):
-        query = self.db.query(Reading)
+    def _statistic_columns(self, sensors: Sequence[str], stats: Sequence[str]) -> list:
+        """Columns labeled <sensor>_<stat> computing the statistics over the raw readings.
 
+        SQLite has no percentile_cont nor stddev_samp, so it gets the values of
+        each bucket in a <sensor>_values column instead (see _finish_statistics).
+        """
+        columns = []
+        for sensor in sensors:
+            value = Reading.__table__.c[sensor]
+            needs_values = False
+            for statistic in map(StatisticType, stats):
+                if statistic in SIMPLE_STATISTICS:
+                    columns.append(SIMPLE_STATISTICS[statistic](value).label(f"{sensor}_{statistic.value}"))
+                elif self.is_sqlite:
+                    needs_values = True
+                elif statistic is StatisticType.STDDEV:
+                    columns.append(func.stddev_samp(value).label(f"{sensor}_{statistic.value}"))
+                else:
+                    # percentile_cont is overloaded, asyncpg needs the type of the fraction
+                    columns.append(func.percentile_cont(cast(statistic.percentile, Float)).within_group(value).label(f"{sensor}_{statistic.value}"))
+            if needs_values:
+                columns.append(func.group_concat(value).label(f"{sensor}_values"))
+        return columns
+
+    def _rollup_statistic_columns(self, table, sensors: Sequence[str], stats: Sequence[str]) -> list:
+        """Columns labeled <sensor>_<stat> merging the rollup rows of a bucket"""
+        columns = []
+        for sensor in sensors:
+            for statistic in map(StatisticType, stats):
+                count = func.sum(table.c[f"{sensor}_count"])
+                expression = {
+                    StatisticType.AVG: func.sum(table.c[f"{sensor}_sum"]) / func.nullif(count, 0),
+                    StatisticType.MIN: func.min(table.c[f"{sensor}_min"]),
+                    StatisticType.MAX: func.max(table.c[f"{sensor}_max"]),
+                    StatisticType.COUNT: count,
+                }[statistic]
+                columns.append(expression.label(f"{sensor}_{statistic.value}"))
+        return columns
+
+    def _finish_statistics(self, rows: Sequence[Row], sensors: Sequence[str], stats: Sequence[str]) -> List[dict]:
+        """Rows as dicts of timestamp and <sensor>_<stat>, computing on SQLite what it has no aggregate for"""
+        results = []
+        for row in rows:
+            result = dict(row._mapping)
+            for sensor in sensors:
+                if f"{sensor}_values" not in result:
+                    continue
+                values = parse_values(result.pop(f"{sensor}_values"))
+                for statistic in map(StatisticType, stats):
+                    if statistic is StatisticType.STDDEV:
+                        result[f"{sensor}_{statistic.value}"] = stddev_samp(values)
+                    elif statistic.percentile is not None:
+                        result[f"{sensor}_{statistic.value}"] = percentile_cont(values, statistic.percentile)
+            results.append(result)
+        return results
+
+    def _select_aggregated(self, filters: GetReadingParams, sensors: Sequence[str] = AGGREGATED_SENSORS, stats: Sequence[str] = (),
+                           by_server: bool = False) -> Select:
         aggregation_str = filters.aggregation.value if isinstance(filters.aggregation, AggregationType) else str(filters.aggregation)
-        
+
         # Create the appropriate timestamp truncation expression based on DB type
         trunc_expr = self._build_date_trunc_expr(aggregation_str, Reading.timestamp)
-        
+
         # Define aggregation columns
-        aggregation_columns = [
-            func.avg(Reading.temperature).label('temperature'),
-            func.avg(Reading.humidity).label('humidity'),
-            func.avg(Reading.current).label('current'),
-            func.avg(Reading.voltage).label('voltage'),
-        ]
-        
-        # Add the truncated timestamp column
-        query = query.with_entities(
-            trunc_expr.label('timestamp'),
+        if stats:
+            aggregation_columns = self._statistic_columns(sensors, stats)
+        else:
+            aggregation_columns = [
+                func.avg(Reading.__table__.c[sensor]).label(sensor) for sensor in sensors
+            ]
+
+        # Add the truncated timestamp column, read back as a datetime on every database
+        query = select(
+            type_coerce(trunc_expr, DateTime).label('timestamp'),
             *aggregation_columns
-        ).group_by(trunc_expr)
+        ).group_by(trunc_expr).order_by(trunc_expr)
+
+        if by_server:
+            # Last, so the aggregated columns keep their positions
+            query = query.add_columns(Reading.server_ulid).group_by(Reading.server_ulid).order_by(Reading.server_ulid)
+
+        return self._filter_readings(query, filters)
+
+
+    def _select_rollup_aggregated(self, filters: GetReadingParams, sensors: Sequence[str], start=None, end=None,
+                                  resolution: str = None, stats: Sequence[str] = (), by_server: bool = False) -> Select:
+        """Averages, or the stats, of whole buckets in [start, end) read from the rollup table of
+        the resolution (the aggregation of the filters by default)"""
+        table = ROLLUP_TABLES[AggregationType(resolution) if resolution else rollup_for(filters.aggregation)]
+
+        if stats:
+            aggregation_columns = self._rollup_statistic_columns(table, sensors, stats)
+        else:
+            aggregation_columns = [
+                (func.sum(table.c[f"{sensor}_sum"]) / func.nullif(func.sum(table.c[f"{sensor}_count"]), 0)).label(sensor)
+                for sensor in sensors
+            ]
+
+        # Intervals merge several rollup buckets into each of theirs
+        bucket = table.c.bucket
+        if not is_named(filters.aggregation):
+            bucket = self._build_bin_expr(bucket_width(filters.aggregation), table.c.bucket)
+
+        query = select(
+            type_coerce(bucket, DateTime).label('timestamp'),
+            *aggregation_columns
+        ).group_by(bucket).order_by(bucket)
+
+        if by_server:
+            query = query.add_columns(table.c.server_ulid).group_by(table.c.server_ulid).order_by(table.c.server_ulid)
+
+        query = self._filter_rollup(query, table, filters)
+
+        if start:
+            query = query.where(table.c.bucket >= start)
+
+        if end:
+            query = query.where(table.c.bucket < end)
+
+        return query
+
+    def _aggregated_selects(self, filters: GetReadingParams, sensors: Sequence[str] = AGGREGATED_SENSORS,
+                            stats: Sequence[str] = (), by_server: bool = False) -> List[Select]:
+        """Statements whose results, in order, are the aggregated rows sorted by bucket.
+
+        Buckets fully inside the time range come from the rollups, or from a
+        coarser rollup where the retention policy already dropped them. A bucket
+        only partially covered by start_time or end_time is aggregated from the
+        raw readings of the covered part. Intervals are read from the coarsest
+        rollup that fits in their buckets. Intervals no rollup fits in (15s) and
+        stats the rollups can't answer (stddev, percentiles) are computed in a
+        single pass over the raw readings. With by_server, the rows are grouped
+        by (bucket, server_ulid) and end with the server_ulid.
+        """
+        rollup = rollup_for(filters.aggregation)
+        if rollup is None or any(StatisticType(stat) not in ROLLUP_STATISTICS for stat in stats):
+            return [self._select_aggregated(filters, sensors, stats, by_server)]
+
+        width = bucket_width(filters.aggregation)
+        start, end = filters.start_time, filters.end_time
+        rollup_start = bin_ceil(start, width) if start else None
+        # end_time is inclusive, so a bucket is whole when it ends right after it
+        rollup_end = bin_start(end + timedelta(microseconds=1), width) if end else None
+
+        if rollup_start and rollup_end and rollup_start >= rollup_end:
+            return [self._select_aggregated(filters, sensors, stats, by_server)]
+
+        queries = []
+        if start and start < rollup_start:
+            head = filters.model_copy(update={"end_time": rollup_start - timedelta(microseconds=1)})
+            queries.append(self._select_aggregated(head, sensors, stats, by_server))
+
+        for resolution, lower, upper in retention.retention_policy.tiers(rollup.value, rollup_start, rollup_end):
+            queries.append(self._select_rollup_aggregated(
+                filters, sensors, _latest(rollup_start, lower), _earliest(rollup_end, upper), resolution, stats, by_server
+            ))
+
+        if end and rollup_end <= end:
+            tail = filters.model_copy(update={"start_time": rollup_end})
+            queries.append(self._select_aggregated(tail, sensors, stats, by_server))
+
+        return queries
+
+
+class ReadingRepository(ReadingQueries, BaseRepository[Reading]):
+
+    def __init__(self, session: Session):
+        super().__init__(Reading, session)
+        self.is_sqlite = is_sqlite_session(session)
+
+    def find_by_server_ulid(self, server_ulid: str):
+        return self.db.execute(self._select_by_server_ulid(server_ulid)).scalars().all()
+
+    def copy_rows(self, rows: List[dict]) -> int:
+        """Bulk load plain reading rows without building ORM entities.
+
+        PostgreSQL receives the rows through COPY FROM STDIN, while SQLite
+        falls back to chunked executemany inserts.
+        """
+        if not rows:
+            return 0
+
+        try:
+            if self.is_sqlite:
+                for start in range(0, len(rows), BACKFILL_CHUNK_SIZE):
+                    self.db.execute(insert(Reading.__table__), rows[start:start + BACKFILL_CHUNK_SIZE])
+            else:
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                # None is written as an unquoted empty field, which COPY reads as NULL
+                writer.writerows([row[column] for column in COPY_COLUMNS] for row in rows)
+                buffer.seek(0)
+
+                cursor = self.db.connection().connection.cursor()
+                cursor.copy_expert(COPY_SQL, buffer)
+
+            # Core inserts and COPY skip the ORM flush that maintains the rollups
+            ReadingRollupRepository(self.db).add(rows)
+
+            self.db.commit()
+            return len(rows)
+        except Exception as e:
+            self.db.rollback()
+            raise e
+
+    def find_by_criteria(self, criteria: GetReadingParams) -> List[Row]:
+        return self.db.execute(self._select_by_criteria(criteria)).all()
+
+    def find_newest_id(self, criteria: GetReadingParams, since) -> int | None:
+        return self.db.execute(self._select_newest_id(criteria, since)).scalar()
+
+    def find_oldest_timestamp(self):
+        return self.db.execute(select(func.min(Reading.timestamp))).scalar()
+
+    def delete_range(self, start, end) -> int:
+        """Delete the readings in [start, end), the caller commits"""
+        query = delete(Reading).where(Reading.timestamp >= start, Reading.timestamp < end)
+        return self.db.execute(query).rowcount
+
+    def find_page(self, criteria: GetReadingParams, limit: int, resolution: str = RAW_RESOLUTION, lower=None, upper=None, after=None) -> List:
+        """Rows of the page with the server, timestamp and requested sensors (and the id of raw readings)"""
+        if resolution != RAW_RESOLUTION:
+            return self.db.execute(self._select_rollup_page(criteria, resolution, limit, lower, upper, after)).all()
+        return self.db.execute(self._select_page(criteria, limit, lower, upper, after)).all()
+
+    def find_aggregated_readings(self, filters: GetReadingParams, by_server: bool = False):
+        """(timestamp, *averages) rows of the requested sensors"""
+        queries = self._aggregated_selects(filters, self._sensors(filters), by_server=by_server)
+        return [row for query in queries for row in self.db.execute(query).all()]
+
+    def find_aggregated_statistics(self, filters: GetReadingParams, sensors: Sequence[str], by_server: bool = False) -> List[dict]:
+        """The stats of the filters for each bucket, as dicts of timestamp and <sensor>_<stat>"""
+        queries = self._aggregated_selects(filters, sensors, filters.statistics, by_server)
+        rows = [row for query in queries for row in self.db.execute(query).all()]
+        return self._finish_statistics(rows, sensors, filters.statistics)
+
+
+class AsyncReadingRepository(ReadingQueries, AsyncBaseRepository[Reading]):
+
+    def __init__(self, session: AsyncSession):
+        super().__init__(Reading, session)
+        self.is_sqlite = is_sqlite_session(session)
+
+    async def find_by_server_ulid(self, server_ulid: str):
+        result = await self.db.execute(self._select_by_server_ulid(server_ulid))
+        return result.scalars().all()
+
+    async def find_by_criteria(self, criteria: GetReadingParams) -> List[Row]:
+        result = await self.db.execute(self._select_by_criteria(criteria))
+        return result.all()
+
+    async def find_page(self, criteria: GetReadingParams, limit: int, resolution: str = RAW_RESOLUTION, lower=None, upper=None, after=None) -> List:
+        """Rows of the page with the server, timestamp and requested sensors (and the id of raw readings)"""
+        if resolution != RAW_RESOLUTION:
+            result = await self.db.execute(self._select_rollup_page(criteria, resolution, limit, lower, upper, after))
+            return result.all()
+        result = await self.db.execute(self._select_page(criteria, limit, lower, upper, after))
+        return result.all()
+
+    async def find_newest_id(self, criteria: GetReadingParams, since) -> int | None:
+        return (await self.db.execute(self._select_newest_id(criteria, since))).scalar()
 
+    async def find_aggregated_readings(self, filters: GetReadingParams, by_server: bool = False):
+        """(timestamp, *averages) rows of the requested sensors"""
+        rows = []
+        for query in self._aggregated_selects(filters, self._sensors(filters), by_server=by_server):
+            rows.extend((await self.db.execute(query)).all())
+        return rows
 
-        if filters.server_ulid:
-            query = query.filter(Reading.server_ulid == filters.server_ulid)
+    async def find_aggregated_statistics(self, filters: GetReadingParams, sensors: Sequence[str], by_server: bool = False) -> List[dict]:
+        """The stats of the filters for each bucket, as dicts of timestamp and <sensor>_<stat>"""
+        rows = []
+        for query in self._aggregated_selects(filters, sensors, filters.statistics, by_server):
+            rows.extend((await self.db.execute(query)).all())
+        return self._finish_statistics(rows, sensors, filters.statistics)
 
-        if filters.start_time:
-            query = query.filter(Reading.timestamp >= filters.start_time)
+    async def stream_columns(self, criteria: GetReadingParams, columns: Sequence[str], chunk_size: int) -> AsyncIterator[Sequence[Row]]:
+        """Yield the rows in chunks read from a server-side cursor"""
+        async for partition in self._stream(self._select_columns(criteria, columns), chunk_size):
+            yield partition
 
-        if filters.end_time:
-            query = query.filter(Reading.timestamp <= filters.end_time)
+    async def stream_aggregated(self, filters: GetReadingParams, sensors: Sequence[str], chunk_size: int) -> AsyncIterator[Sequence[Row]]:
+        """Yield the (timestamp, *sensors) aggregated rows in chunks read from a server-side cursor"""
+        for query in self._aggregated_selects(filters, sensors):
+            async for partition in self._stream(query, chunk_size):
+                yield partition
 
-        return query.all()
+    async def _stream(self, query: Select, chunk_size: int) -> AsyncIterator[Sequence[Row]]:
+        result = await self.db.stream(query.execution_options(yield_per=chunk_size))
+        async for partition in result.partitions():
+            yield partition
@@ -0,0 +1,248 @@
+from datetime import datetime, timedelta
+from typing import Any, Iterable, List, Mapping
+from sqlalchemy import Executable, Table, delete, event, func, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from core.enums import AggregationType
+from models.reading import Reading
+from models.reading_rollup import ReadingRollupMinute, ReadingRollupHour, ReadingRollupDay
+from repository.base_repository import is_sqlite_session
+from repository.cache_generation_repository import build_bump_statement, late_servers
+from repository.server_repository import build_last_seen_statement
+from utils.rollup_utils import ROLLUP_SENSORS, ceil, rollup_rows, truncate
+
+ROLLUP_TABLES: dict[AggregationType, Table] = {
+    AggregationType.MINUTE: ReadingRollupMinute.__table__,
+    AggregationType.HOUR: ReadingRollupHour.__table__,
+    AggregationType.DAY: ReadingRollupDay.__table__,
+}
+
+# Same text SQLAlchemy stores for SQLite DateTime columns, so the buckets match
+SQLITE_BUCKET_FORMATS = {
+    AggregationType.MINUTE: "%Y-%m-%d %H:%M:00.000000",
+    AggregationType.HOUR: "%Y-%m-%d %H:00:00.000000",
+    AggregationType.DAY: "%Y-%m-%d 00:00:00.000000",
+}
+
+# Keeps each multi-row upsert well below the bind parameter limits
+UPSERT_CHUNK_SIZE = 1000
+
+REBUILD_WINDOW = timedelta(days=1)
+
+
+def _bucket_expr(aggregation: AggregationType, is_sqlite: bool):
+    if is_sqlite:
+        return func.strftime(SQLITE_BUCKET_FORMATS[aggregation], Reading.timestamp)
+    return func.date_trunc(aggregation.value, Reading.timestamp)
+
+
+def build_upsert_statements(readings: Iterable[Mapping[str, Any]], is_sqlite: bool, session: Session) -> List[Executable]:
+    """Statements adding the readings to the rollups of every granularity, invalidating
+    the cached aggregations of the servers whose readings arrived late and moving
+    the last_seen_at of the servers forward, for the session that executes them"""
+    readings = list(readings)
+    insert = sqlite_insert if is_sqlite else postgresql_insert
+    least, greatest = (func.min, func.max) if is_sqlite else (func.least, func.greatest)
+    statements = []
+
+    for aggregation, table in ROLLUP_TABLES.items():
+        rows = rollup_rows(readings, aggregation)
+
+        for start in range(0, len(rows), UPSERT_CHUNK_SIZE):
+            statement = insert(table).values(rows[start:start + UPSERT_CHUNK_SIZE])
+            excluded = statement.excluded
+            changes = {}
+            for sensor in ROLLUP_SENSORS:
+                current_min, new_min = table.c[f"{sensor}_min"], excluded[f"{sensor}_min"]
+                current_max, new_max = table.c[f"{sensor}_max"], excluded[f"{sensor}_max"]
+                changes[f"{sensor}_sum"] = table.c[f"{sensor}_sum"] + excluded[f"{sensor}_sum"]
+                changes[f"{sensor}_count"] = table.c[f"{sensor}_count"] + excluded[f"{sensor}_count"]
+                # Either side may be NULL when the sensor had no values yet
+                changes[f"{sensor}_min"] = least(func.coalesce(current_min, new_min), func.coalesce(new_min, current_min))
+                changes[f"{sensor}_max"] = greatest(func.coalesce(current_max, new_max), func.coalesce(new_max, current_max))
+
+            statements.append(statement.on_conflict_do_update(
+                index_elements=[table.c.server_ulid, table.c.bucket],
+                set_=changes
+            ))
+
+    servers = late_servers(readings)
+    if servers:
+        statements.append(build_bump_statement(servers, is_sqlite))
+
+    last_seen = build_last_seen_statement(readings, session)
+    if last_seen is not None:
+        statements.append(last_seen)
+
+    return statements
+
+
+def build_rebuild_statements(start: datetime, end: datetime, is_sqlite: bool, server_ulid: str = None) -> List[Executable]:
+    """Statements recomputing the rollups of [start, end) from the raw readings.
+
+    start and end must be day aligned, so whole buckets of every granularity
+    are replaced.
+    """
+    statements = []
+
+    for aggregation, table in ROLLUP_TABLES.items():
+        bucket = _bucket_expr(aggregation, is_sqlite)
+
+        clear = delete(table).where(table.c.bucket >= start, table.c.bucket < end)
+        columns = [Reading.server_ulid, bucket]
+        for sensor in ROLLUP_SENSORS:
+            value = Reading.__table__.c[sensor]
+            columns += [func.coalesce(func.sum(value), 0), func.count(value), func.min(value), func.max(value)]
+
+        source = (
+            select(*columns)
+            .where(Reading.timestamp >= start, Reading.timestamp < end)
+            .group_by(Reading.server_ulid, bucket)
+        )
+
+        if server_ulid:
+            clear = clear.where(table.c.server_ulid == server_ulid)
+            source = source.where(Reading.server_ulid == server_ulid)
+
+        names = ["server_ulid", "bucket"] + [
+            f"{sensor}_{stat}" for sensor in ROLLUP_SENSORS for stat in ("sum", "count", "min", "max")
+        ]
+        statements += [clear, table.insert().from_select(names, source)]
+
+    statements.append(build_bump_statement([server_ulid] if server_ulid else None, is_sqlite))
+    return statements
+
+
+def rebuild_windows(start: datetime, end: datetime) -> List[tuple[datetime, datetime]]:
+    """Day aligned windows covering [start, end]"""
+    window_start = truncate(start, AggregationType.DAY)
+    end = ceil(end + timedelta(microseconds=1), AggregationType.DAY)
+    windows = []
+    while window_start < end:
+        windows.append((window_start, window_start + REBUILD_WINDOW))
+        window_start += REBUILD_WINDOW
+    return windows
+
+
+def _reading_values(reading: Reading) -> dict:
+    return {column: getattr(reading, column) for column in ("server_ulid", "timestamp", *ROLLUP_SENSORS)}
+
+
+@event.listens_for(Session, "after_flush")
+def _rollup_new_readings(session: Session, flush_context):
+    """Add the readings inserted by the ORM to the rollups in the same transaction.
+
+    Rollups are additive, so late and out of order readings land in the right
+    bucket no matter when they arrive.
+    """
+    readings = [_reading_values(obj) for obj in session.new if isinstance(obj, Reading)]
+    if not readings:
+        return
+
+    connection = session.connection()
+    for statement in build_upsert_statements(readings, connection.dialect.name == "sqlite", session):
+        connection.execute(statement)
+
+
+class ReadingRollupRepository:
+    """Maintains the rollups for writes that bypass the ORM and rebuilds them from the raw readings"""
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.is_sqlite = is_sqlite_session(db)
+
+    def add(self, readings: List[Mapping[str, Any]]):
+        """Add plain reading rows to the rollups, the caller commits"""
+        for statement in build_upsert_statements(readings, self.is_sqlite, self.db):
+            self.db.execute(statement)
+
+    def find_time_range(self, server_ulid: str = None) -> tuple[datetime | None, datetime | None]:
+        query = select(func.min(Reading.timestamp), func.max(Reading.timestamp))
+        if server_ulid:
+            query = query.where(Reading.server_ulid == server_ulid)
+        return tuple(self.db.execute(query).one())
+
+    def find_backfill_range(self) -> tuple[datetime, datetime] | None:
+        """Time range of the readings older than the day rollups, None when they cover every reading.
+
+        Day rollups never expire, so readings older than the oldest one were
+        written before the rollups existed. The range ends at the oldest day
+        rollup, which may only hold the readings written since then.
+        """
+        oldest_reading, newest_reading = self.find_time_range()
+        if oldest_reading is None:
+            return None
+
+        table = ROLLUP_TABLES[AggregationType.DAY]
+        oldest_bucket = self.db.execute(select(func.min(table.c.bucket))).scalar()
+        if oldest_bucket is None:
+            return oldest_reading, newest_reading
+        if oldest_bucket <= truncate(oldest_reading, AggregationType.DAY):
+            return None
+        return oldest_reading, oldest_bucket
+
+    def backfill(self) -> int:
+        """Rebuild the days of the readings the rollups don't cover, returns how many.
+
+        Days are rebuilt newest first, one per transaction, so an interrupted
+        backfill is resumed from the day it stopped at.
+        """
+        backfill_range = self.find_backfill_range()
+        if backfill_range is None:
+            return 0
+
+        windows = rebuild_windows(*backfill_range)
+        try:
+            for window_start, window_end in reversed(windows):
+                self.rebuild_window(window_start, window_end)
+                self.db.commit()
+        except Exception as e:
+            self.db.rollback()
+            raise e
+        return len(windows)
+
+    def rebuild_window(self, start: datetime, end: datetime, server_ulid: str = None):
+        """Recompute the rollups of the day aligned [start, end), the caller commits"""
+        for statement in build_rebuild_statements(start, end, self.is_sqlite, server_ulid):
+            self.db.execute(statement)
+
+    def rebuild(self, start: datetime, end: datetime, server_ulid: str = None) -> int:
+        """Recompute the rollups of the days between start and end, one day per transaction"""
+        windows = rebuild_windows(start, end)
+        try:
+            for window_start, window_end in windows:
+                self.rebuild_window(window_start, window_end, server_ulid)
+                self.db.commit()
+        except Exception as e:
+            self.db.rollback()
+            raise e
+        return len(windows)
+
+    def delete_before(self, aggregation: AggregationType, cutoff: datetime) -> int:
+        """Drop the buckets older than the cutoff, the caller commits"""
+        table = ROLLUP_TABLES[aggregation]
+        deleted = self.db.execute(delete(table).where(table.c.bucket < cutoff)).rowcount
+        self.db.execute(build_bump_statement(None, self.is_sqlite))
+        return deleted
+
+
+class AsyncReadingRollupRepository:
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        self.is_sqlite = is_sqlite_session(db)
+
+    async def rebuild(self, start: datetime, end: datetime, server_ulid: str = None) -> int:
+        """Recompute the rollups of the days between start and end, one day per transaction"""
+        windows = rebuild_windows(start, end)
+        try:
+            for window_start, window_end in windows:
+                for statement in build_rebuild_statements(window_start, window_end, self.is_sqlite, server_ulid):
+                    await self.db.execute(statement)
+                await self.db.commit()
+        except Exception as e:
+            await self.db.rollback()
+            raise e
+        return len(windows)
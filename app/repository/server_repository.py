@@ -1,61 +1,315 @@
-from typing import List, Tuple
-from sqlalchemy import text, case, func, select, join
-from repository.base_repository import BaseRepository
+from typing import Any, Callable, Iterable, List, Mapping, Tuple
+from sqlalchemy import DateTime, Executable, and_, case, event, func, literal, or_, select, update, Select
+from sqlalchemy.ext.asyncio import AsyncSession
+from core.enums import ServerStatus
+from core.settings import LAST_SEEN_THROTTLE_S, SERVER_ONLINE_WINDOW_S
+from repository.base_repository import AsyncBaseRepository, BaseRepository
 from models.server import Server
-from models.reading import Reading
 import ulid
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
 
-class ServerRepository(BaseRepository[Server]):
-    def __init__(self, db):
+ONLINE_WINDOW = timedelta(seconds=SERVER_ONLINE_WINDOW_S)
+
+
+LAST_SEEN_PENDING_KEY = "last_seen_pending"
+
+
+class LastSeenThrottle:
+    """Newest last_seen_at each server got from this process.
+
+    A server is only written again once its readings are `interval_s` newer,
+    so a device posting many times a second costs one update per interval.
+    The times a session writes only count once it commits, a rolled back
+    write doesn't throttle the next ones. Observers are called with the times
+    of each commit, so the process can follow the servers without reading
+    them back.
+    """
+
+    def __init__(self, interval_s: float = LAST_SEEN_THROTTLE_S):
+        self.interval = timedelta(seconds=interval_s)
+        self.observers: list[Callable[[dict[str, datetime]], None]] = []
+        self._written: dict[str, datetime] = {}
+
+    def due(self, readings: Iterable[Mapping[str, Any]]) -> dict[str, datetime]:
+        """Newest timestamp of each server of the readings whose last_seen_at must be written"""
+        newest: dict[str, datetime] = {}
+        for reading in readings:
+            server_ulid, timestamp = reading["server_ulid"], reading["timestamp"]
+            if server_ulid not in newest or timestamp > newest[server_ulid]:
+                newest[server_ulid] = timestamp
+
+        due = {}
+        for server_ulid, timestamp in newest.items():
+            written = self._written.get(server_ulid)
+            if written is None or timestamp >= written + self.interval:
+                due[server_ulid] = timestamp
+        return due
+
+    def track(self, session: Session, due: Mapping[str, datetime]):
+        """Keep the times the session is writing until it commits or rolls back"""
+        pending = session.info.setdefault(LAST_SEEN_PENDING_KEY, {})
+        for server_ulid, timestamp in due.items():
+            if server_ulid not in pending or timestamp > pending[server_ulid]:
+                pending[server_ulid] = timestamp
+
+    def commit(self, session: Session):
+        committed = session.info.pop(LAST_SEEN_PENDING_KEY, {})
+        for server_ulid, timestamp in committed.items():
+            written = self._written.get(server_ulid)
+            if written is None or timestamp > written:
+                self._written[server_ulid] = timestamp
+        if committed:
+            for observer in list(self.observers):
+                observer(committed)
+
+    def discard(self, session: Session):
+        session.info.pop(LAST_SEEN_PENDING_KEY, None)
+
+    def clear(self):
+        self._written.clear()
+
+
+last_seen_throttle = LastSeenThrottle()
+
+
+@event.listens_for(Session, "after_commit")
+def _record_last_seen(session: Session):
+    last_seen_throttle.commit(session)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_last_seen(session: Session):
+    last_seen_throttle.discard(session)
+
+
+def build_last_seen_statement(readings: Iterable[Mapping[str, Any]], session: Session) -> Executable | None:
+    """Statement moving the last_seen_at of the servers of the readings forward, None when throttled.
+
+    The update never moves it backwards, so late readings and other workers
+    writing older values are harmless. A server whose previous reading is older
+    than the online window just came back online, so its online_since is reset.
+    """
+    due = last_seen_throttle.due(readings)
+    if not due:
+        return None
+    last_seen_throttle.track(session, due)
+
+    table = Server.__table__
+    newest = case({server_ulid: literal(timestamp, DateTime) for server_ulid, timestamp in due.items()}, value=table.c.id)
+    offline_before = case(
+        {server_ulid: literal(timestamp - ONLINE_WINDOW, DateTime) for server_ulid, timestamp in due.items()}, value=table.c.id
+    )
+    came_online = or_(table.c.last_seen_at.is_(None), table.c.last_seen_at < offline_before)
+    return (
+        update(table)
+        .where(table.c.id.in_(sorted(due)), or_(table.c.last_seen_at.is_(None), table.c.last_seen_at < newest))
+        .values(last_seen_at=newest, online_since=case((came_online, newest), else_=table.c.online_since))
+    )
+
+
+class ServerQueries:
+    """Statements shared by the sync and async server repositories"""
+
+    def _select_by_ulid(self, ulid: str) -> Select:
+        return select(Server).where(Server.id == ulid)
+
+    def _select_by_name(self, server_name: str) -> Select:
+        return select(Server).where(Server.server_name == server_name)
+
+    def _select_existing_ids(self, ids: List[str]) -> Select:
+        return select(Server.id).where(Server.id.in_(set(ids)))
+
+    def _select_ids_by_owner(self, user_id: int) -> Select:
+        return select(Server.id).where(Server.created_by == user_id).order_by(Server.id)
+
+    @staticmethod
+    def _is_online(now: datetime | None = None):
+        """Whether the server sent readings within the online window"""
+        return Server.last_seen_at >= (now or datetime.now()) - ONLINE_WINDOW
+
+    def _select_fleet_counts(self, user_id: int) -> Select:
+        """Number of online servers and of servers of the user"""
+        online = func.coalesce(func.sum(case((self._is_online(), 1), else_=0)), 0)
+        return select(online.label('online'), func.count(Server.id).label('total')).where(Server.created_by == user_id)
+
+    def _select_fleet_page(self, user_id: int, limit: int, status: str = None, changed_since: datetime = None,
+                           after: str = None) -> Select:
+        """Keyset page of the servers of the user in id order, with their status and last_seen_at.
+
+        An online server changed status at its online_since, an offline one when
+        the online window of its last reading ended.
+        """
+        now = datetime.now()
+        is_online = self._is_online(now)
+        is_offline = or_(Server.last_seen_at.is_(None), Server.last_seen_at < now - ONLINE_WINDOW)
+
+        query = select(
+            Server.id,
+            case((is_online, ServerStatus.ONLINE.value), else_=ServerStatus.OFFLINE.value).label('status'),
+            Server.server_name,
+            Server.last_seen_at,
+            Server.online_since,
+        ).where(Server.created_by == user_id)
+
+        if status == ServerStatus.ONLINE.value:
+            query = query.where(is_online)
+        elif status == ServerStatus.OFFLINE.value:
+            query = query.where(is_offline)
+
+        if changed_since:
+            query = query.where(or_(
+                and_(is_online, Server.online_since >= changed_since),
+                and_(is_offline, Server.last_seen_at >= changed_since - ONLINE_WINDOW),
+            ))
+
+        if after:
+            query = query.where(Server.id > after)
+
+        return query.order_by(Server.id).limit(limit)
+
+    def _select_seen_since(self, since: datetime) -> Select:
+        """Servers with readings newer than `since`, with their owner"""
+        return select(
+            Server.id, Server.created_by, Server.server_name, Server.last_seen_at, Server.online_since
+        ).where(Server.last_seen_at >= since)
+
+    def _select_owners(self, ids: List[str]) -> Select:
+        return select(Server.id, Server.created_by, Server.server_name).where(Server.id.in_(set(ids)))
+
+    def _select_server_health(self, server_ulid: str = None, user_id: str = None) -> Select:
+        # Calculate the threshold time for "online" status
+        threshold_time = datetime.now() - ONLINE_WINDOW
+
+        # last_seen_at is maintained by ingest, so this reads one row per server
+        # no matter how many readings they have
+        servers = select(
+            Server.id,
+            case(
+                (Server.last_seen_at >= threshold_time, 'online'),
+                else_='offline'
+            ).label('status'),
+            Server.server_name
+        )
+
+        # Apply server_ulid filter if provided
+        if server_ulid:
+            servers = servers.where(Server.id == server_ulid)
+
+        if user_id:
+            servers = servers.where(Server.created_by == user_id)
+
+        return servers.order_by(Server.last_seen_at.asc())
+
+
+class ServerRepository(ServerQueries, BaseRepository[Server]):
+    def __init__(self, db: Session):
         super().__init__(Server, db)
 
     def find_by_ulid(self, ulid: str):
-        return self.db.query(Server).filter(Server.id == ulid).first()
-    
+        return self.db.execute(self._select_by_ulid(ulid)).scalars().first()
+
     def save(self, obj):
         if not obj.id:
             obj.id = str(ulid.new())
         return super().save(obj)
-    
+
     def get_server_health(self, server_ulid: str = None, user_id: str = None):
-        # Calculate the threshold time for "online" status (10 seconds ago)
-        threshold_time = datetime.now() - timedelta(seconds=10)
-        
-        # Build query using SQLAlchemy expressions
-        query = (
-            self.db.query(
-                Server.id,
-                case(
-                    (func.max(Reading.timestamp) >= threshold_time, 'online'),
-                    else_='offline'
-                ).label('status'),
-                Server.server_name
-            )
-            .outerjoin(Reading, Server.id == Reading.server_ulid)
-            .group_by(Server.id, Server.server_name)
-            .order_by(func.max(Reading.timestamp).asc())
-        )
-        
-        # Apply server_ulid filter if provided
-        if server_ulid:
-            query = query.filter(Reading.server_ulid == server_ulid)
-            
-        if user_id:
-            query = query.filter(Server.created_by == user_id)
-            
-        return query.all()
-    
+        return self.db.execute(self._select_server_health(server_ulid, user_id)).all()
 
-        
     def get_server_health_all(self, user_id: str = None) -> List[Tuple]:
         """Get health data for all servers, optionally filtered by user"""
         return self.get_server_health(user_id=user_id)
-    
+
     def get_server_health_by_id(self, server_id: str) -> List[Tuple]:
         """Get health data for a specific server"""
         return self.get_server_health(server_ulid=server_id)
-    
+
     def find_by_name(self, server_name: str):
-        return self.db.query(Server).filter(Server.server_name == server_name).first()
+        return self.db.execute(self._select_by_name(server_name)).scalars().first()
+
+    def find_existing_ids(self, ids: List[str]) -> set[str]:
+        """Return the subset of the given ids that belong to registered servers"""
+        if not ids:
+            return set()
+        return set(self.db.execute(self._select_existing_ids(ids)).scalars().all())
+
+    def find_ids_by_owner(self, user_id: int) -> List[str]:
+        """Ids of the servers registered by the user"""
+        return self.db.execute(self._select_ids_by_owner(user_id)).scalars().all()
+
+    def count_fleet_health(self, user_id: int) -> Tuple[int, int]:
+        """(online, total) servers of the user"""
+        return tuple(self.db.execute(self._select_fleet_counts(user_id)).one())
+
+    def find_fleet_health_page(self, user_id: int, limit: int, status: str = None, changed_since: datetime = None,
+                               after: str = None) -> List[Tuple]:
+        return self.db.execute(self._select_fleet_page(user_id, limit, status, changed_since, after)).all()
+
+    def find_seen_since(self, since: datetime) -> List[Tuple]:
+        return self.db.execute(self._select_seen_since(since)).all()
+
+    def find_owners(self, ids: List[str]) -> List[Tuple]:
+        """(id, created_by, server_name) of the servers"""
+        return self.db.execute(self._select_owners(ids)).all()
+
+
+class AsyncServerRepository(ServerQueries, AsyncBaseRepository[Server]):
+    def __init__(self, db: AsyncSession):
+        super().__init__(Server, db)
+
+    async def find_by_ulid(self, ulid: str):
+        result = await self.db.execute(self._select_by_ulid(ulid))
+        return result.scalars().first()
+
+    async def save(self, obj):
+        if not obj.id:
+            obj.id = str(ulid.new())
+        return await super().save(obj)
+
+    async def get_server_health(self, server_ulid: str = None, user_id: str = None):
+        result = await self.db.execute(self._select_server_health(server_ulid, user_id))
+        return result.all()
+
+    async def get_server_health_all(self, user_id: str = None) -> List[Tuple]:
+        """Get health data for all servers, optionally filtered by user"""
+        return await self.get_server_health(user_id=user_id)
+
+    async def get_server_health_by_id(self, server_id: str) -> List[Tuple]:
+        """Get health data for a specific server"""
+        return await self.get_server_health(server_ulid=server_id)
+
+    async def find_by_name(self, server_name: str):
+        result = await self.db.execute(self._select_by_name(server_name))
+        return result.scalars().first()
+
+    async def find_existing_ids(self, ids: List[str]) -> set[str]:
+        """Return the subset of the given ids that belong to registered servers"""
+        if not ids:
+            return set()
+        result = await self.db.execute(self._select_existing_ids(ids))
+        return set(result.scalars().all())
+
+    async def find_ids_by_owner(self, user_id: int) -> List[str]:
+        """Ids of the servers registered by the user"""
+        result = await self.db.execute(self._select_ids_by_owner(user_id))
+        return result.scalars().all()
+
+    async def count_fleet_health(self, user_id: int) -> Tuple[int, int]:
+        """(online, total) servers of the user"""
+        result = await self.db.execute(self._select_fleet_counts(user_id))
+        return tuple(result.one())
+
+    async def find_fleet_health_page(self, user_id: int, limit: int, status: str = None, changed_since: datetime = None,
+                                     after: str = None) -> List[Tuple]:
+        result = await self.db.execute(self._select_fleet_page(user_id, limit, status, changed_since, after))
+        return result.all()
+
+    async def find_seen_since(self, since: datetime) -> List[Tuple]:
+        result = await self.db.execute(self._select_seen_since(since))
+        return result.all()
+
+    async def find_owners(self, ids: List[str]) -> List[Tuple]:
+        """(id, created_by, server_name) of the servers"""
+        result = await self.db.execute(self._select_owners(ids))
+        return result.all()
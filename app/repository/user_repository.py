@@ -1,5 +1,6 @@
+from sqlalchemy import select
 from models.user import User
-from repository.base_repository import BaseRepository
+from repository.base_repository import AsyncBaseRepository, BaseRepository
 
 class UserRepository(BaseRepository[User]):
     def __init__(self, db):
@@ -8,4 +9,12 @@ class UserRepository(BaseRepository[User]):
 
     def find_by_username(self, username: str):
         return self.db.query(User).filter(User.username == username).first()
-    
+
+
+class AsyncUserRepository(AsyncBaseRepository[User]):
+    def __init__(self, db):
+        super().__init__(User, db)
+
+    async def find_by_username(self, username: str):
+        result = await self.db.execute(select(User).where(User.username == username).limit(1))
+        return result.scalars().first()
@@ -2,6 +2,7 @@ from typing import Annotated
 from fastapi import Body, Depends, status, APIRouter
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from dependencies import get_user_service
+from middlewares import ParsedJSONRoute
 from mappers.user_mapper import UserMapper
 from exceptions.custom_exceptions import ConflictException, UnauthorizedException
 from schemas.user_schema import PostUser, UserResponse
@@ -11,6 +12,7 @@ from services.user_service import UserService
 from schemas.error_schema import ConflictError, UnauthorizedError
 from schemas.error_schema import ValidationErrorDetail
 router = APIRouter(
+    route_class=ParsedJSONRoute,
     prefix="/auth",
     tags=["Authentication"],
 
@@ -40,11 +42,11 @@ async def register(
     Registers a new user. Checks if the username is already registered,
     maps the data to the entity and persists it in the database.
     """
-    if user_service.find_by_username(user.username):
+    if await user_service.find_by_username(user.username):
         raise ConflictException("User already exists")
 
     user_entity = UserMapper.from_post_to_entity(user)
-    saved_user = user_service.save(user_entity)
+    saved_user = await user_service.save(user_entity)
     user_response = UserMapper.from_entity_to_response(saved_user)
 
     return user_response
@@ -80,7 +82,7 @@ async def login(
     Performs login by authenticating user credentials and returns
     an access token (JWT) that can be used in protected routes.
     """
-    if not authenticate_user(form_data.username, form_data.password, user_service):
+    if not await authenticate_user(form_data.username, form_data.password, user_service):
         raise UnauthorizedException("Invalid credentials")
 
     access_token = create_access_token(
@@ -0,0 +1,54 @@
+from fastapi import APIRouter, Depends, status
+from core.database import pool_metrics
+from dependencies import get_ingest_buffer, require_internal_token
+from middlewares import ParsedJSONRoute
+from schemas.error_schema import ForbiddenError
+from schemas.internal_schema import IngestBufferMetricsResponse, PoolMetricsResponse
+from services.ingest_buffer import IngestBuffer
+
+# Operational metrics, only for the operators holding INTERNAL_API_TOKEN
+router = APIRouter(
+    route_class=ParsedJSONRoute,
+    prefix="/internal",
+    tags=["Internal"],
+    dependencies=[Depends(require_internal_token)],
+    responses={
+        403: {"model": ForbiddenError, "description": "Missing or invalid X-Internal-Token"},
+    },
+)
+
+@router.get(
+    "/ingest",
+    status_code=status.HTTP_200_OK,
+    summary="Ingest buffer metrics",
+    description="""
+    Returns the state of the write-behind ingest buffer used when INGEST_MODE=buffered:
+    queue depth, accepted and rejected readings, and batch flush latencies.
+
+    Requires the X-Internal-Token header set to INTERNAL_API_TOKEN.
+    """,
+    response_model=IngestBufferMetricsResponse,
+)
+async def get_ingest_metrics(
+    ingest_buffer: IngestBuffer = Depends(get_ingest_buffer)
+):
+    return IngestBufferMetricsResponse.from_buffer(ingest_buffer)
+
+@router.get(
+    "/pool",
+    status_code=status.HTTP_200_OK,
+    summary="Database connection pool metrics",
+    description="""
+    Returns the configuration and usage of the connection pools of this worker
+    (the sync engine used by imports and the async engine used by the routes):
+    connections in use, overflow connections, checkout wait times and timeouts.
+
+    Use it to size DB_POOL_SIZE and DB_MAX_OVERFLOW against the number of workers
+    and the max_connections of PostgreSQL.
+
+    Requires the X-Internal-Token header set to INTERNAL_API_TOKEN.
+    """,
+    response_model=list[PoolMetricsResponse],
+)
+async def get_pool_metrics():
+    return [PoolMetricsResponse.from_metrics(metrics) for metrics in pool_metrics]
@@ -1,13 +1,34 @@
-from fastapi import APIRouter, Depends, status
-from dependencies import get_current_user_dependency, get_reading_service
+import io
+import orjson
+from fastapi import APIRouter, Body, Depends, File, Query, Request, Response, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+from core.enums import ExportFormat, ImportFormat
+from dependencies import get_current_user_dependency, get_reading_service, get_ingest_buffer, get_backfill_service, get_export_service, get_reading_broker
+from middlewares import ParsedJSONRoute
 from services.reading_service import ReadingService
+from services.ingest_buffer import IngestBuffer
+from services.backfill_service import BackfillService
+from services.export_service import ExportService
+from services.reading_broker import ReadingBroker
 from mappers.reading_mapper import ReadingMapper
 from schemas.user_schema import UserResponse
-from schemas.reading_schema import PostReading, GetReadingParams, ReadingResponse
-from schemas.error_schema import NotFoundError, ValidationErrorDetail, UnauthorizedError
+from schemas.reading_schema import PostReading, GetReadingParams, ReadingResponse, BatchReadingResponse, ReadingStreamParams
+from schemas.error_schema import NotFoundError, ValidationErrorDetail, UnauthorizedError, ServiceUnavailableError
 from typing import List, Dict, Any
 
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+EXPORT_MEDIA_TYPES = {
+    ExportFormat.CSV: "text/csv",
+    ExportFormat.NDJSON: "application/x-ndjson",
+    ExportFormat.ARROW: "application/vnd.apache.arrow.stream",
+    ExportFormat.PARQUET: "application/vnd.apache.parquet",
+}
+
 router = APIRouter(
+    route_class=ParsedJSONRoute,
     prefix="/data",
     tags=["Sensor Data"],
 
@@ -28,26 +49,246 @@ router = APIRouter(
     - current: Optional current reading (can be null)
     
     At least one of the sensor readings must be provided.
+
+    When the API runs with INGEST_MODE=buffered the reading is queued, written
+    to the database in the background and the request returns 202.
     """, 
     response_description="The submitted sensor reading data",
     response_model=ReadingResponse,
         responses={
+        202: {"model": ReadingResponse, "description": "Reading queued for writing (buffered ingest mode)"},
         401: {"model": UnauthorizedError, "description": "Authentication required"},
         404: {"model": NotFoundError, "description": "Server ulid not found"},
-        422 :{"model": ValidationErrorDetail, "description": "Validation error"}
+        422 :{"model": ValidationErrorDetail, "description": "Validation error"},
+        503: {"model": ServiceUnavailableError, "description": "Ingest buffer is full"}
     }
 )
 async def submit_reading(
     post_reading: PostReading,
     reading_service: ReadingService = Depends(get_reading_service),
+    ingest_buffer: IngestBuffer = Depends(get_ingest_buffer),
+    reading_broker: ReadingBroker = Depends(get_reading_broker),
     ) -> ReadingResponse:
 
+    if ingest_buffer.enabled:
+        await ingest_buffer.put(post_reading)
+        response_reading = ReadingMapper.from_post_to_response(post_reading)
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content=jsonable_encoder(response_reading)
+        )
+
     reading_entity = ReadingMapper.from_post_to_entity(post_reading)
-    saved_entity = reading_service.save(reading_entity)
+    saved_entity = await reading_service.save(reading_entity)
+    # Buffered readings are published by the buffer once written
+    reading_broker.publish([saved_entity])
     response_reading = ReadingMapper.from_entity_to_response(saved_entity)
     return response_reading
+
+
+@router.post(
+    "/batch",
+    status_code=status.HTTP_201_CREATED,
+    summary="Submit a batch of sensor readings",
+    description="""
+    Submit several sensor readings at once. Each item follows the same rules as a single reading:
+
+    - server_ulid: The unique identifier for the server (the server must exist)
+    - timestamp: The timestamp when the reading was taken (ISO8601 format)
+    - temperature, humidity, voltage, current: Optional sensor values, at least one is required
+
+    Valid items are stored in a single insert, while invalid items are reported
+    by their position in the array without rejecting the rest of the batch.
+    """,
+    response_description="Number of accepted readings and the errors of the rejected ones",
+    response_model=BatchReadingResponse,
+        responses={
+        422 :{"model": ValidationErrorDetail, "description": "Validation error"}
+    }
+)
+async def submit_reading_batch(
+    readings: List[Dict[str, Any]] = Body(
+        ...,
+        description="Array of sensor readings, each one with the same format used by POST /data."
+    ),
+    reading_service: ReadingService = Depends(get_reading_service),
+    reading_broker: ReadingBroker = Depends(get_reading_broker),
+    ) -> BatchReadingResponse:
+
+    saved_entities, errors = await reading_service.save_batch(readings)
+    reading_broker.publish(saved_entities)
+    return ReadingMapper.to_batch_response(saved_entities, errors)
+
+
+@router.post(
+    "/import",
+    status_code=status.HTTP_201_CREATED,
+    summary="Import historical sensor readings",
+    description="""
+    Bulk import historical readings from a CSV or NDJSON file, for example when a
+    site comes back after days offline.
+
+    - format: csv (with a header row using the reading field names) or ndjson (one reading per line)
+    - file: The file with the readings
+
+    Records are validated in chunks with the same rules as POST /data and the valid
+    ones are streamed into the database with COPY. The response reports how many
+    records were accepted and rejected, with the errors of the first rejected records
+    indexed by their position in the file (header excluded).
+    """,
+    response_description="Number of imported readings and the errors of the rejected ones",
+    response_model=BatchReadingResponse,
+        responses={
+        401: {"model": UnauthorizedError, "description": "Authentication required"},
+        422 :{"model": ValidationErrorDetail, "description": "Validation error"}
+    }
+)
+async def import_readings(
+    file: UploadFile = File(..., description="CSV or NDJSON file with the readings"),
+    import_format: ImportFormat = Query(ImportFormat.CSV, alias="format", description="Format of the file"),
+    current_user: UserResponse = Depends(get_current_user_dependency),
+    backfill_service: BackfillService = Depends(get_backfill_service),
+    ) -> BatchReadingResponse:
+
+    lines = io.TextIOWrapper(file.file, encoding="utf-8", newline="")
+    # The import is long running blocking I/O, keep it off the event loop
+    accepted, rejected, errors = await run_in_threadpool(backfill_service.import_lines, lines, import_format)
+    return ReadingMapper.from_import_result_to_response(accepted, rejected, errors)
     
 
+@router.get(
+    "/export",
+    status_code=status.HTTP_200_OK,
+    summary="Export sensor readings",
+    description="""
+    Stream every reading matching the filters, for analytics pulls that are too
+    large for GET /data.
+
+    Filters:
+    - server_ulid: Filter by specific server ULID
+    - sensor_type: Export only this sensor (temperature, humidity, voltage, current)
+    - aggregation: Export the averages by (day, hour, minute) instead of the raw readings
+    - start_time: Filter readings starting from this time (ISO8601 format)
+    - end_time: Filter readings up to this time (ISO8601 format)
+
+    Formats:
+    - ndjson: One reading per line
+    - csv: With a header row
+    - arrow: Arrow IPC stream, one record batch per chunk (pyarrow.ipc.open_stream, polars.read_ipc_stream)
+    - parquet: Parquet file, one row group per chunk (pandas.read_parquet, polars.read_parquet)
+
+    The columns are server_ulid, timestamp, temperature, humidity, voltage and current;
+    aggregated exports have no server_ulid. The columns keep this order with and without
+    aggregation. Readings are ordered by timestamp and read from the database in chunks,
+    so the export is not paginated; limit and cursor are ignored. stats, fill and
+    downsample=lttb can't be exported.
+    """,
+    response_description="The readings in the requested format",
+    response_class=StreamingResponse,
+        responses={
+        200: {"content": {media_type: {} for media_type in EXPORT_MEDIA_TYPES.values()}},
+        401: {"model": UnauthorizedError, "description": "Authentication required"},
+        422 :{"model": ValidationErrorDetail, "description": "Validation error"}
+    }
+)
+async def export_readings(
+    export_format: ExportFormat = Query(ExportFormat.NDJSON, alias="format", description="Format of the export"),
+    current_user: UserResponse = Depends(get_current_user_dependency),
+    filters: GetReadingParams = Depends(),
+    export_service: ExportService = Depends(get_export_service),
+    ) -> StreamingResponse:
+
+    # Checked before streaming, errors can't be reported once the body started
+    export_service.check_filters(filters)
+
+    return StreamingResponse(
+        export_service.stream(filters, export_format),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="readings.{export_format.value}"'}
+    )
+
+
+@router.get(
+    "/stream",
+    status_code=status.HTTP_200_OK,
+    summary="Stream new sensor readings",
+    description="""
+    Server-sent events (text/event-stream) pushed as readings are accepted by
+    POST /data and POST /data/batch, for live dashboards that would otherwise poll
+    GET /data with a sliding start_time.
+
+    Filters:
+    - server_ulid: Stream the readings of a specific server (the server must exist)
+    - server_ulids: Stream the readings of several comma separated servers
+    - sensor_type: Only the readings with this sensor, carrying only its value
+
+    Without servers the stream covers every server registered by the user when it connects,
+    a user without servers gets a 404.
+    Each `reading` event has the reading as returned by GET /data. A client that reads
+    slower than the readings arrive loses the oldest pending ones and gets a `dropped`
+    event with how many before the next reading. Comment lines are sent as keepalives.
+    """,
+    response_description="Stream of new readings",
+    response_class=StreamingResponse,
+        responses={
+        200: {"content": {"text/event-stream": {}}},
+        401: {"model": UnauthorizedError, "description": "Authentication required"},
+        404: {"model": NotFoundError, "description": "Server ulid not found, or the user has no servers"},
+        422 :{"model": ValidationErrorDetail, "description": "Validation error"}
+    }
+)
+async def stream_readings(
+    current_user: UserResponse = Depends(get_current_user_dependency),
+    params: ReadingStreamParams = Depends(),
+    reading_service: ReadingService = Depends(get_reading_service),
+    reading_broker: ReadingBroker = Depends(get_reading_broker),
+    ) -> StreamingResponse:
+
+    server_ulids = await reading_service.find_stream_servers(params, current_user.id)
+
+    return StreamingResponse(
+        reading_broker.stream(server_ulids, params.sensor_type),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get(
+    "/servers",
+    status_code=status.HTTP_200_OK,
+    summary="Query aggregated readings of several servers",
+    description="""
+    Aggregate the readings of several servers in a single query grouped by
+    (server, bucket), for fleet dashboards that would otherwise issue one
+    GET /data per server.
+
+    Filters:
+    - server_ulids: Comma separated server ULIDs (the servers must exist), defaults to every server registered by the user
+    - aggregation (required), sensor_type, start_time, end_time, stats and fill as in GET /data
+
+    The response maps each server ULID to its aggregated readings ordered by timestamp.
+    """,
+    response_description="Aggregated readings keyed by server ULID",
+    response_model=Dict[str, List[ReadingResponse]],
+        responses={
+        401: {"model": UnauthorizedError, "description": "Authentication required"},
+        404: {"model": NotFoundError, "description": "Server ulid not found"},
+        422 :{"model": ValidationErrorDetail, "description": "Validation error"}
+    },
+    response_model_exclude_none=True
+)
+async def query_readings_by_server(
+    current_user: UserResponse = Depends(get_current_user_dependency),
+    filters: GetReadingParams = Depends(),
+    reading_service: ReadingService = Depends(get_reading_service)
+    ):
+
+    readings_by_server = await reading_service.find_readings_by_server(filters, current_user.id)
+
+    content = {server: ReadingMapper.to_items(rows, filters) for server, rows in readings_by_server.items()}
+    return Response(content=orjson.dumps(content), media_type="application/json")
+
+
 @router.get(
     "",
     status_code=status.HTTP_200_OK,
@@ -57,41 +298,67 @@ async def submit_reading(
     
     Filters:
     - server_ulid: Filter by specific server ULID (the server must exist)
+    - server_ulids: Filter by several comma separated server ULIDs
     - sensor_type: Filter by sensor type (temperature, humidity, voltage, current)
-    - aggregation: Aggregate data by (day, hour, minute)
+    - aggregation: Aggregate data by (day, hour, minute) or by an interval such as 5s, 15m or 6h
+    - fill: With aggregation, start_time and end_time, return every bucket of the range,
+      missing ones empty (null) or interpolated from their neighbours (linear)
     - start_time: Filter readings starting from this time (ISO8601 format)
     - end_time: Filter readings up to this time (ISO8601 format)
     
-    If no filters are provided, returns all available readings.
+    Pagination:
+    - limit: Maximum number of readings per page (defaults to READINGS_PAGE_SIZE)
+    - cursor: The X-Next-Cursor header of the previous page
+
+    Readings are ordered by timestamp. When there are more readings the response
+    has an opaque X-Next-Cursor header; pass it as `cursor` to get the next page.
 
     If aggregation is provided, returns aggregated data instead with only one value per sensor type.
 
+    Statistics:
+    - stats: Comma separated statistics of each bucket (avg, min, max, count, stddev, p50, p95, p99),
+      requires aggregation. They are returned in `stats` per sensor, computed in a single query.
+
+    Downsampling, for charts that only need a bounded number of points:
+    - max_points: Picks the aggregation interval that splits the range (start_time is required,
+      end_time defaults to now) into at most about max_points buckets
+    - downsample: avg (default) to average those buckets, or lttb to keep max_points raw readings of
+      each server and sensor with Largest-Triangle-Three-Buckets, which preserves spikes. LTTB results
+      are not paginated and each reading only carries the sensors it was kept for
+
+    Conditional requests:
+    - Responses have an ETag; send it back in If-None-Match to get a 304 when the result didn't change
+    - Ranges that end before the open buckets also have Last-Modified (If-Modified-Since is honored)
+      and a Cache-Control max-age, so clients and reverse proxies can reuse them
+
     Pydantic models are used to validate the query parameters.
     """,
     response_description="List of sensor readings or aggregated data",
     response_model=List[ReadingResponse],
         responses={
+        304: {"description": "The result didn't change since the ETag or date of the request"},
         401: {"model": UnauthorizedError, "description": "Authentication required"},
         422 :{"model": ValidationErrorDetail, "description": "Validation error"}
     },
     response_model_exclude_none=True# Exclude None values from the response
 )
 async def query_readings(
+    request: Request,
     current_user: UserResponse = Depends(get_current_user_dependency),
     filters: GetReadingParams = Depends(),
     reading_service: ReadingService = Depends(get_reading_service)
     ):
 
-    readings = reading_service.find_readings_by_params(filters)
-    
-    if not readings:
-        return []
-    
-    if hasattr(readings[0], '__table__'):  # Check if it's an ORM entity
-        # If readings are entities
-        responses = ReadingMapper.from_entities_to_responses(readings, filters)
-    else:
-        # If readings are tuples from an aggregate query
-        responses = ReadingMapper.from_aggregate_tuples_to_responses(readings, filters)
-    
-    return responses
\ No newline at end of file
+    # Unchanged results are answered before running the query
+    validator = await reading_service.find_validator(filters)
+    headers = validator.headers()
+    if validator.not_modified(request.headers):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    readings, next_cursor = await reading_service.find_readings_by_params(filters)
+
+    if next_cursor:
+        headers[NEXT_CURSOR_HEADER] = next_cursor
+
+    # The rows are encoded straight to JSON, response_model only documents the body
+    return Response(content=ReadingMapper.to_json(readings, filters), media_type="application/json", headers=headers)
@@ -1,13 +1,19 @@
-from fastapi import status, Depends, APIRouter
+from fastapi import status, Depends, APIRouter, Response
+from fastapi.responses import StreamingResponse
 from schemas.error_schema import ConflictError, UnauthorizedError, ValidationErrorDetail, NotFoundError
-from exceptions.custom_exceptions import ConflictException, NotFoundException
-from dependencies import get_current_user_dependency, get_server_service
+from exceptions.custom_exceptions import ConflictException
+from dependencies import get_current_user_dependency, get_server_service, get_health_monitor
+from middlewares import ParsedJSONRoute
 from schemas.user_schema import UserResponse
-from schemas.server_schema import PostServer, ServerStatusResponse, ServerResponse
+from schemas.server_schema import PostServer, ServerStatusResponse, ServerResponse, FleetHealthParams, FleetHealthResponse
 from services.server_service import ServerService
+from services.health_monitor import HealthMonitor
 from mappers.server_mapper import ServerMapper
 
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
 router = APIRouter(
+    route_class=ParsedJSONRoute,
     tags=["Server Management"],
 )
 
@@ -37,11 +43,11 @@ async def create_server(
     server_service: ServerService = Depends(get_server_service)
 ):
 
-    if server_service.find_by_name(server.server_name):
+    if await server_service.find_by_name(server.server_name):
         raise ConflictException("Server already exists")
 
     server_entity = ServerMapper.from_post_to_entity(server, current_user.id)
-    saved_server = server_service.save(server_entity)
+    saved_server = await server_service.save(server_entity)
     server_response = ServerMapper.from_entity_to_response(saved_server)
 
     return server_response
@@ -71,7 +77,7 @@ async def get_all_server_health(
         server_service: ServerService = Depends(get_server_service)
         ):
 
-    all_server_status = server_service.get_server_health_all(user_id=current_user.id)
+    all_server_status = await server_service.get_server_health_all(user_id=current_user.id)
     
     if not all_server_status:
         return []
@@ -80,6 +86,82 @@ async def get_all_server_health(
 
     return server_status_responses
 
+@router.get(
+    "/health/summary",
+    status_code=status.HTTP_200_OK,
+    summary="Get a summary of the health of the fleet",
+    description="""
+    Retrieve the number of online and offline servers of the current user and a
+    page of their servers, for fleets too large to poll with /health/all.
+
+    Filters:
+    - status: Only the online or offline servers
+    - changed_since: Only the servers whose status changed after this time (ISO8601 format),
+      so pollers only fetch the servers that went online or offline since the previous poll
+
+    Pagination:
+    - limit: Maximum number of servers per page (defaults to HEALTH_PAGE_SIZE)
+    - cursor: The X-Next-Cursor header of the previous page
+
+    Servers are ordered by ULID. The counts always cover every server of the user.
+    Each server has the timestamp of its newest reading (last_seen_at) and the time it got
+    its current status (changed_at). A server goes offline 10 seconds after its last reading.
+    """,
+    response_description="Online and offline counts and a page of servers",
+    response_model=FleetHealthResponse,
+    responses={
+        401: {"model": UnauthorizedError, "description": "Authentication required"},
+        422 :{"model": ValidationErrorDetail, "description": "Validation error"}
+    }
+)
+async def get_fleet_health(
+        response: Response,
+        params: FleetHealthParams = Depends(),
+        current_user: UserResponse = Depends(get_current_user_dependency),
+        server_service: ServerService = Depends(get_server_service)
+        ):
+
+    online, total, rows, next_cursor = await server_service.get_fleet_health(params, current_user.id)
+
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+
+    return ServerMapper.from_fleet_health_to_response(online, total, rows)
+
+@router.get(
+    "/health/stream",
+    status_code=status.HTTP_200_OK,
+    summary="Stream the status changes of the servers",
+    description="""
+    Server-sent events (text/event-stream) pushed when a server of the current user
+    goes online or offline, instead of polling /health/all.
+
+    Each `status` event has the server identifier, the server name, the new status
+    (online/offline) and the time it changed (changed_at). A server goes offline
+    10 seconds after its last reading.
+
+    The stream only carries changes: load the current statuses from /health/summary
+    after connecting. Comment lines are sent as keepalives. A client that falls too
+    far behind gets an `overflow` event and the stream ends; reconnect and reload.
+    """,
+    response_description="Stream of server status changes",
+    response_class=StreamingResponse,
+    responses={
+        200: {"content": {"text/event-stream": {}}},
+        401: {"model": UnauthorizedError, "description": "Authentication required"},
+    }
+)
+async def stream_server_health(
+        current_user: UserResponse = Depends(get_current_user_dependency),
+        health_monitor: HealthMonitor = Depends(get_health_monitor)
+        ):
+
+    return StreamingResponse(
+        health_monitor.stream(current_user.id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @router.get(
     "/health/{server_id}", 
     status_code=status.HTTP_200_OK,
@@ -111,18 +193,8 @@ async def get_server_health(
         server_service: ServerService = Depends(get_server_service),
         ):
 
-        # Get the server entity and its health status from the service
-        if not server_service.find_by_id(server_id):
-            raise NotFoundException(f"Server with id {server_id} not found")
-        
-        health_data = server_service.get_server_health_by_id(server_id)
-        
-        # Generate the appropriate response using the mapper
-        if not health_data or health_data is []:
-            # For servers with no readings, create an offline status response
-            server_entity = server_service.find_by_id(server_id)
-            return ServerMapper.create_offline_status_response(server_entity)
-        
-            # For servers with readings, map the health data to a response
-        return ServerMapper.from_aggregate_health_data_to_status_response(health_data[0])
+        # Servers without readings have no last_seen_at and are reported offline
+        health_data = await server_service.get_server_health_by_id(server_id)
+
+        return ServerMapper.from_aggregate_health_data_to_status_response(health_data)
 
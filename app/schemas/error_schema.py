@@ -97,6 +97,18 @@ class UnauthorizedError(ErrorResponse):
     status_code: int = 401
     detail: str = "Unauthorized access"
 
+class ForbiddenError(ErrorResponse):
+    """Schema for forbidden error responses"""
+    type: str = "forbidden_error"
+    status_code: int = 403
+    detail: str = "Access forbidden"
+
+class ServiceUnavailableError(ErrorResponse):
+    """Schema for service unavailable error responses"""
+    type: str = "service_unavailable_error"
+    status_code: int = 503
+    detail: str = "Service temporarily unavailable"
+
 class ValidationErrorDetail(ValidationErrorResponse):
     type: str = "validation_error"
     status_code: int = 422
@@ -0,0 +1,83 @@
+from typing import Optional
+from pydantic import BaseModel
+
+
+class IngestBufferMetricsResponse(BaseModel):
+    """Schema for the state and flush latencies of the write-behind ingest buffer"""
+    enabled: bool  # Whether POST /data enqueues readings instead of writing them
+    running: bool  # Whether the background flusher is running
+    queue_size: int  # Readings waiting to be flushed
+    max_size: int  # Capacity of the queue
+    enqueued: int  # Readings accepted into the queue
+    rejected: int  # Readings refused because the queue was full
+    flushes: int  # Number of batches written
+    flushed_rows: int  # Readings written to the database
+    failed_rows: int  # Readings dropped because the database rejected them
+    last_flush_ms: float  # Duration of the last batch write
+    avg_flush_ms: float  # Average duration of a batch write
+    max_flush_ms: float  # Longest batch write
+    last_wait_ms: float  # Time between enqueue and commit for the oldest reading of the last batch
+    max_wait_ms: float  # Longest time between enqueue and commit
+
+    @classmethod
+    def from_buffer(cls, buffer) -> "IngestBufferMetricsResponse":
+        metrics = buffer.metrics
+        return cls(
+            enabled=buffer.enabled,
+            running=buffer.running,
+            queue_size=buffer.queue_size,
+            max_size=buffer.max_size,
+            enqueued=metrics.enqueued,
+            rejected=metrics.rejected,
+            flushes=metrics.flushes,
+            flushed_rows=metrics.flushed_rows,
+            failed_rows=metrics.failed_rows,
+            last_flush_ms=metrics.last_flush_ms,
+            avg_flush_ms=metrics.avg_flush_ms,
+            max_flush_ms=metrics.max_flush_ms,
+            last_wait_ms=metrics.last_wait_ms,
+            max_wait_ms=metrics.max_wait_ms,
+        )
+
+
+class PoolMetricsResponse(BaseModel):
+    """Schema for the state and counters of a database connection pool"""
+    name: str  # Engine the pool belongs to (sync or async)
+    pool_size: Optional[int] = None  # Configured number of persistent connections
+    max_overflow: Optional[int] = None  # Configured number of extra connections
+    timeout: Optional[float] = None  # Seconds a checkout waits before failing
+    checked_out: int  # Connections currently in use
+    checked_in: Optional[int] = None  # Idle connections kept by the pool
+    overflow: Optional[int] = None  # Connections currently open above pool_size
+    max_in_use: int  # Highest number of connections in use at once
+    checkouts: int  # Connections handed out by the pool
+    connects: int  # New database connections opened
+    overflow_connects: int  # Connections opened above pool_size
+    timeouts: int  # Checkouts that failed after waiting the pool timeout
+    invalidations: int  # Connections discarded after an error
+    last_wait_ms: float  # Time the last checkout waited for a connection
+    avg_wait_ms: float  # Average checkout wait
+    max_wait_ms: float  # Longest checkout wait
+
+    @classmethod
+    def from_metrics(cls, metrics) -> "PoolMetricsResponse":
+        pool = metrics.pool
+        has_queue = pool is not None and hasattr(pool, "size")
+        return cls(
+            name=metrics.name,
+            pool_size=pool.size() if has_queue else None,
+            max_overflow=pool._max_overflow if has_queue else None,
+            timeout=pool.timeout() if has_queue else None,
+            checked_out=metrics.in_use,
+            checked_in=pool.checkedin() if has_queue else None,
+            overflow=max(pool.overflow(), 0) if has_queue else None,
+            max_in_use=metrics.max_in_use,
+            checkouts=metrics.checkouts,
+            connects=metrics.connects,
+            overflow_connects=metrics.overflow_connects,
+            timeouts=metrics.timeouts,
+            invalidations=metrics.invalidations,
+            last_wait_ms=metrics.last_wait_ms,
+            avg_wait_ms=metrics.avg_wait_ms,
+            max_wait_ms=metrics.max_wait_ms,
+        )
@@ -1,18 +1,42 @@
 from pydantic import BaseModel, ConfigDict, field_validator, model_validator
-from typing import Optional
-from core.enums import SensorType, AggregationType
-from datetime import datetime
+from typing import Dict, List, Optional, Union
+from core.enums import SensorType, AggregationType, StatisticType, FillMode, DownsampleMode
+from core.settings import READINGS_PAGE_SIZE, READINGS_MAX_PAGE_SIZE, AGGREGATION_MAX_BUCKETS, READINGS_MAX_SERVERS, READINGS_MAX_POINTS
+from datetime import datetime, timedelta
+from utils.interval_utils import auto_interval, bucket_width, parse_interval
+from utils.pagination_utils import decode_cursor
 import iso8601
 
 class GetReadingParams(BaseModel):
     """Schema for retrieving reading data with optional filters
     This schema is used to structure the query parameters when retrieving reading data."""
     server_ulid: Optional[str] = None  # The unique identifier of the server
+    server_ulids: Optional[str] = None  # Comma separated identifiers of several servers
     sensor_type: Optional[str] = None  # The type of sensor
-    aggregation: Optional[str] = None  # The type of aggregation
+    aggregation: Optional[str] = None  # minute, hour, day or an interval such as 5s, 15m or 6h
     start_time: Optional[datetime] = None  # The start time for the query
     end_time: Optional[datetime] = None  # The end time for the query
+    limit: int = READINGS_PAGE_SIZE  # Maximum number of readings in the page
+    cursor: Optional[str] = None  # The next_cursor of the previous page
+    stats: Optional[str] = None  # Comma separated statistics of each aggregated bucket
+    fill: Optional[str] = None  # Gap fill mode of the aggregated buckets (null or linear)
+    max_points: Optional[int] = None  # Approximate number of points of each series, picks the aggregation
+    downsample: Optional[str] = None  # How max_points is reached (avg buckets or lttb)
     
+    @field_validator("server_ulids", mode="after")
+    @classmethod
+    def validate_server_ulids(cls, value):
+        """Validator for server_ulids field
+        This validator drops repeated servers and bounds their number."""
+        if value is None:
+            return value
+        ulids = list(dict.fromkeys(ulid.strip() for ulid in value.split(",") if ulid.strip()))
+        if not ulids:
+            raise ValueError("server_ulids must name at least one server")
+        if len(ulids) > READINGS_MAX_SERVERS:
+            raise ValueError(f"server_ulids can't have more than {READINGS_MAX_SERVERS} servers")
+        return ",".join(ulids)
+
     @field_validator("sensor_type", mode="after")
     @classmethod
     def validate_sensor_type(cls, value):
@@ -38,9 +62,154 @@ class GetReadingParams(BaseModel):
         try:
             aggregation_value = AggregationType(value)
             return aggregation_value.value
+        except ValueError:
+            pass
+        try:
+            parse_interval(value)
+            return value.strip().lower()
         except ValueError as e:
             raise ValueError(f"Invalid aggregation type: {value}") from e
 
+    @field_validator("start_time", "end_time", mode="after")
+    @classmethod
+    def drop_timezone(cls, value):
+        """Validator for start_time and end_time fields
+        This validator drops the offset, as PostReading does for stored timestamps."""
+        return value.replace(tzinfo=None) if value is not None else value
+
+    @field_validator("limit", mode="after")
+    @classmethod
+    def validate_limit(cls, value):
+        """Validator for limit field
+        This validator keeps the page size between 1 and READINGS_MAX_PAGE_SIZE."""
+        if value < 1 or value > READINGS_MAX_PAGE_SIZE:
+            raise ValueError(f"limit must be between 1 and {READINGS_MAX_PAGE_SIZE}")
+        return value
+
+    @field_validator("cursor", mode="after")
+    @classmethod
+    def validate_cursor(cls, value):
+        """Validator for cursor field
+        This validator ensures that the cursor was produced by a previous page."""
+        if value is not None:
+            decode_cursor(value)
+        return value
+
+    @field_validator("stats", mode="after")
+    @classmethod
+    def validate_stats(cls, value):
+        """Validator for stats field
+        This validator ensures that every statistic is valid and drops repeated ones."""
+        if value is None:
+            return value
+        names = [name.strip().lower() for name in value.split(",") if name.strip()]
+        for name in names:
+            try:
+                StatisticType(name)
+            except ValueError as e:
+                raise ValueError(f"Invalid statistic: {name}") from e
+        if not names:
+            raise ValueError("stats must name at least one statistic")
+        return ",".join(dict.fromkeys(names))
+
+    @field_validator("fill", mode="after")
+    @classmethod
+    def validate_fill(cls, value):
+        """Validator for fill field
+        This validator ensures that the fill mode is valid."""
+        if value is None:
+            return value
+        try:
+            return FillMode(value).value
+        except ValueError as e:
+            raise ValueError(f"Invalid fill mode: {value}") from e
+
+    @field_validator("max_points", mode="after")
+    @classmethod
+    def validate_max_points(cls, value):
+        """Validator for max_points field
+        This validator keeps the number of points between 3 and READINGS_MAX_POINTS."""
+        if value is not None and (value < 3 or value > READINGS_MAX_POINTS):
+            raise ValueError(f"max_points must be between 3 and {READINGS_MAX_POINTS}")
+        return value
+
+    @field_validator("downsample", mode="after")
+    @classmethod
+    def validate_downsample(cls, value):
+        """Validator for downsample field
+        This validator ensures that the downsample mode is valid."""
+        if value is None:
+            return value
+        try:
+            return DownsampleMode(value).value
+        except ValueError as e:
+            raise ValueError(f"Invalid downsample mode: {value}") from e
+
+    @model_validator(mode='after')
+    def resolve_max_points(self):
+        """Validate max_points and replace it by the aggregation whose buckets fit the range.
+
+        With downsample=lttb the raw readings are downsampled instead and no
+        aggregation is set.
+        """
+        if self.max_points is None:
+            if self.downsample is not None:
+                raise ValueError("downsample requires max_points")
+            return self
+        if self.aggregation is not None or self.cursor is not None:
+            raise ValueError("max_points can't be used with aggregation or cursor")
+        if self.start_time is None:
+            raise ValueError("max_points requires start_time")
+        if self.downsample != DownsampleMode.LTTB.value:
+            self.aggregation = auto_interval(self.start_time, self.end_time or datetime.now(), self.max_points)
+        return self
+
+    @property
+    def lttb(self) -> bool:
+        """Whether the raw readings are downsampled with LTTB"""
+        return self.downsample == DownsampleMode.LTTB.value
+
+    @model_validator(mode='after')
+    def validate_buckets(self):
+        """Validate that fill has a bounded aggregation and that the number of buckets is bounded"""
+        if self.fill is not None and (self.aggregation is None or self.start_time is None or self.end_time is None):
+            raise ValueError("fill requires an aggregation, start_time and end_time")
+        if self.aggregation is not None and self.start_time is not None and self.end_time is not None:
+            if (self.end_time - self.start_time) / self.bucket_width > AGGREGATION_MAX_BUCKETS:
+                raise ValueError(f"The time range has more than {AGGREGATION_MAX_BUCKETS} buckets")
+        return self
+
+    @property
+    def bucket_width(self) -> Optional[timedelta]:
+        """Width of the aggregated buckets"""
+        return bucket_width(self.aggregation) if self.aggregation else None
+
+    @model_validator(mode='after')
+    def validate_stats_aggregation(self):
+        """Validate that stats are only requested for aggregated readings"""
+        if self.stats is not None and self.aggregation is None:
+            raise ValueError("stats requires an aggregation")
+        return self
+
+    @model_validator(mode='after')
+    def validate_servers(self):
+        """Validate that a single server and a list of servers are not both given"""
+        if self.server_ulid is not None and self.server_ulids is not None:
+            raise ValueError("server_ulid and server_ulids can't be used together")
+        return self
+
+    @property
+    def server_ids(self) -> tuple[str, ...]:
+        """The servers the readings are restricted to, empty for every server"""
+        if self.server_ulid:
+            return (self.server_ulid,)
+        return tuple(self.server_ulids.split(",")) if self.server_ulids else ()
+
+    @property
+    def statistics(self) -> tuple[str, ...]:
+        """The requested statistics, empty when only the averages are wanted"""
+        return tuple(self.stats.split(",")) if self.stats else ()
+
     @model_validator(mode='after')
     def validate_time_range(self):
         """Validate that start_time is before end_time when both are present"""
@@ -59,14 +228,16 @@ class GetReadingParams(BaseModel):
                 "sensor_type": "temperature",
                 "aggregation": "hour",
                 "start_time": "2023-12-14T15:30:00",
-                "end_time": "2023-12-14T16:30:00"
+                "end_time": "2023-12-14T16:30:00",
+                "limit": 500,
+                "stats": "avg,max,p95"
             },
             "description": "Query parameters for retrieving sensor readings"
         }
     }
 
     def __str__(self):
-        return f"GetReadingParams(server_ulid={self.server_ulid}, sensor_type={self.sensor_type}, aggregation={self.aggregation}, start_time={self.start_time}, end_time={self.end_time})"
+        return f"GetReadingParams(server_ulid={self.server_ulid}, server_ulids={self.server_ulids}, sensor_type={self.sensor_type}, aggregation={self.aggregation}, start_time={self.start_time}, end_time={self.end_time}, limit={self.limit}, cursor={self.cursor}, stats={self.stats}, fill={self.fill}, max_points={self.max_points}, downsample={self.downsample})"
 
 #-----------------------------------------------------------------------
 
@@ -148,6 +319,7 @@ class ReadingResponse(BaseModel):
     current: Optional[float] = None
     voltage: Optional[float] = None
     timestamp: Optional[datetime] = None
+    stats: Optional[Dict[str, Dict[str, Optional[Union[int, float]]]]] = None  # Requested statistics of each sensor
 
     model_config = ConfigDict(
         from_attributes=True,
@@ -211,6 +383,15 @@ class ReadingResponse(BaseModel):
                         "current": 8.3,
                         "timestamp": "2023-12-14T00:00:00"
                     }
+                },
+                {
+                    "summary": "Hourly temperature statistics",
+                    "description": "Statistics requested with stats=avg,max,p95 for a specific hour",
+                    "value": {
+                        "temperature": 24.3,
+                        "timestamp": "2023-12-14T15:00:00",
+                        "stats": {"temperature": {"avg": 24.3, "max": 27.1, "p95": 26.8}}
+                    }
                 }
             ]
         }
@@ -218,3 +399,71 @@ class ReadingResponse(BaseModel):
 
     def __str__(self):
         return f"ReadingResponse(server_ulid={self.server_ulid}, temperature={self.temperature}, humidity={self.humidity}, current={self.current}, voltage={self.voltage}, timestamp={self.timestamp})"
+
+#-----------------------------------------------------------------------
+
+class ReadingStreamParams(BaseModel):
+    """Schema for subscribing to the new readings of servers
+    This schema is used to structure the query parameters of the reading stream."""
+    server_ulid: Optional[str] = None  # The unique identifier of the server
+    server_ulids: Optional[str] = None  # Comma separated identifiers of several servers
+    sensor_type: Optional[str] = None  # Only the readings of this sensor
+
+    @field_validator("server_ulids", mode="after")
+    @classmethod
+    def validate_server_ulids(cls, value):
+        """Validator for server_ulids field
+        This validator applies the same rules as GET /data."""
+        return GetReadingParams.validate_server_ulids(value)
+
+    @field_validator("sensor_type", mode="after")
+    @classmethod
+    def validate_sensor_type(cls, value):
+        """Validator for sensor_type field
+        This validator ensures that the sensor_type value is valid."""
+        return GetReadingParams.validate_sensor_type(value)
+
+    @model_validator(mode='after')
+    def validate_servers(self):
+        """Validate that a single server and a list of servers are not both given"""
+        if self.server_ulid is not None and self.server_ulids is not None:
+            raise ValueError("server_ulid and server_ulids can't be used together")
+        return self
+
+    @property
+    def server_ids(self) -> tuple[str, ...]:
+        """The servers subscribed to, empty for every server of the user"""
+        if self.server_ulid:
+            return (self.server_ulid,)
+        return tuple(self.server_ulids.split(",")) if self.server_ulids else ()
+
+#-----------------------------------------------------------------------
+
+class BatchItemError(BaseModel):
+    """Schema describing why a single item of a batch was rejected"""
+    index: int  # Position of the rejected item in the submitted array
+    detail: str  # Reason why the item was rejected
+
+
+class BatchReadingResponse(BaseModel):
+    """Schema for the result of a batch submission
+    This schema reports how many readings were stored and the errors of the rejected ones."""
+    accepted: int  # Number of readings persisted
+    rejected: int  # Number of readings rejected
+    errors: List[BatchItemError] = []  # Per-item errors, indexed by position in the request
+
+    model_config = {
+        "json_schema_extra": {
+            "example": {
+                "accepted": 2,
+                "rejected": 1,
+                "errors": [
+                    {
+                        "index": 1,
+                        "detail": "Value error, At least one reading value must be provided: "
+                    }
+                ]
+            },
+            "description": "Result of a batch of sensor readings"
+        }
+    }
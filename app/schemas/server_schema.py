@@ -1,4 +1,8 @@
+from datetime import datetime
+from typing import List, Optional
 from pydantic import BaseModel, field_validator
+from core.enums import ServerStatus
+from core.settings import HEALTH_PAGE_SIZE, HEALTH_MAX_PAGE_SIZE
 
 
 class ServerResponse(BaseModel):
@@ -55,4 +59,69 @@ class ServerStatusResponse(BaseModel):
             }
         },
         "from_attributes": True
-    }
\ No newline at end of file
+    }
+#-----------------------------------------------------------------------
+
+class FleetHealthParams(BaseModel):
+    """Schema for the query parameters of the fleet health summary"""
+    status: Optional[str] = None  # Only the servers with this status (online or offline)
+    changed_since: Optional[datetime] = None  # Only the servers whose status changed after this time
+    limit: int = HEALTH_PAGE_SIZE  # Maximum number of servers in the page
+    cursor: Optional[str] = None  # The X-Next-Cursor header of the previous page
+
+    @field_validator("status", mode="after")
+    @classmethod
+    def validate_status(cls, value):
+        """Validator for status field
+        This validator ensures that the status is valid."""
+        if value is None:
+            return value
+        try:
+            return ServerStatus(value).value
+        except ValueError as e:
+            raise ValueError(f"Invalid status: {value}") from e
+
+    @field_validator("changed_since", mode="after")
+    @classmethod
+    def drop_timezone(cls, value):
+        """Validator for changed_since field
+        This validator drops the offset, as the reading timestamps are stored."""
+        return value.replace(tzinfo=None) if value is not None else value
+
+    @field_validator("limit", mode="after")
+    @classmethod
+    def validate_limit(cls, value):
+        """Validator for limit field
+        This validator keeps the page size between 1 and HEALTH_MAX_PAGE_SIZE."""
+        if value < 1 or value > HEALTH_MAX_PAGE_SIZE:
+            raise ValueError(f"limit must be between 1 and {HEALTH_MAX_PAGE_SIZE}")
+        return value
+
+
+class ServerHealthResponse(ServerStatusResponse):
+    last_seen_at: Optional[datetime] = None  # Timestamp of the newest reading of the server
+    changed_at: Optional[datetime] = None  # When the server got its current status, None if it never sent readings
+
+
+class FleetHealthResponse(BaseModel):
+    online: int  # Number of online servers of the user
+    offline: int  # Number of offline servers of the user
+    servers: List[ServerHealthResponse]  # The page of servers matching the filters
+
+    model_config = {
+        "json_schema_extra": {
+            "example": {
+                "online": 1250,
+                "offline": 3,
+                "servers": [
+                    {
+                        "server_ulid": "01HGYX7TBDFRX8HRJC5RF7Z3GY",
+                        "server_name": "production-server-01",
+                        "status": "offline",
+                        "last_seen_at": "2025-10-01T12:00:00",
+                        "changed_at": "2025-10-01T12:00:10"
+                    }
+                ]
+            }
+        }
+    }
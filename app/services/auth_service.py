@@ -30,15 +30,15 @@ def decode_access_token(token: str) -> dict:
     except JWTError:
         raise UnauthorizedException("Could not validate token")
 
-def authenticate_user(username: str, password: str, user_service: UserService) -> bool:
-    saved_user = user_service.find_by_username(username)
+async def authenticate_user(username: str, password: str, user_service: UserService) -> bool:
+    saved_user = await user_service.find_by_username(username)
     if not saved_user or not verify_password(password, saved_user.password):
         return False
     return True
 
-def get_current_user(token: str, user_service: UserService) -> User:
+async def get_current_user(token: str, user_service: UserService) -> User:
     user = decode_access_token(token)["sub"]
-    stored_user = user_service.find_by_username(user)
+    stored_user = await user_service.find_by_username(user)
     if not stored_user:
         return None
     return stored_user
\ No newline at end of file
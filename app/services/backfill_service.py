@@ -0,0 +1,94 @@
+from itertools import islice
+from typing import Any, Iterable, Iterator
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy.orm import Session
+from core.enums import ImportFormat
+from core.settings import BACKFILL_CHUNK_SIZE, BACKFILL_MAX_REPORTED_ERRORS
+from repository.reading_repository import ReadingRepository
+from repository.server_repository import ServerRepository
+from schemas.error_schema import ValidationErrorResponse
+from schemas.reading_schema import PostReading, BatchItemError
+from utils.import_utils import iter_records
+
+post_readings_adapter = TypeAdapter(list[PostReading])
+
+
+class BackfillService:
+    """Imports large amounts of historical readings straight into the reading table"""
+
+    def __init__(self, db: Session, chunk_size: int = BACKFILL_CHUNK_SIZE):
+        self.reading_repository = ReadingRepository(db)
+        self.server_repository = ServerRepository(db)
+        self.chunk_size = chunk_size
+        self._known_servers: set[str] = set()
+
+    def import_lines(self, lines: Iterable[str], import_format: ImportFormat) -> tuple[int, int, list[BatchItemError]]:
+        """Parse CSV or NDJSON lines and import the records they contain"""
+        return self.import_records(iter_records(lines, import_format))
+
+    def import_records(self, records: Iterable[Any]) -> tuple[int, int, list[BatchItemError]]:
+        """Validate records in chunks and bulk load the valid ones.
+
+        Returns the accepted and rejected counts and the errors of the first
+        rejected records, indexed by their position in the input.
+        """
+        accepted = 0
+        rejected = 0
+        errors: list[BatchItemError] = []
+
+        for offset, chunk in self._chunks(records):
+            rows, chunk_errors = self._validate_chunk(offset, chunk)
+
+            accepted += self.reading_repository.copy_rows(rows)
+            rejected += len(chunk_errors)
+            errors.extend(chunk_errors[:BACKFILL_MAX_REPORTED_ERRORS - len(errors)])
+
+        return accepted, rejected, errors
+
+    def _chunks(self, records: Iterable[Any]) -> Iterator[tuple[int, list[Any]]]:
+        iterator = iter(records)
+        offset = 0
+        while chunk := list(islice(iterator, self.chunk_size)):
+            yield offset, chunk
+            offset += len(chunk)
+
+    def _validate_chunk(self, offset: int, chunk: list[Any]) -> tuple[list[dict], list[BatchItemError]]:
+        errors: dict[int, str] = {}
+
+        for index, record in enumerate(chunk):
+            if isinstance(record, Exception):
+                errors[index] = f"Invalid JSON: {str(record)}"
+
+        candidates = [(index, record) for index, record in enumerate(chunk) if index not in errors]
+
+        # The whole chunk is validated in one call; only chunks with errors need a second pass
+        try:
+            posts = post_readings_adapter.validate_python([record for _, record in candidates])
+        except ValidationError as e:
+            failed: dict[int, list] = {}
+            for error in e.errors():
+                position = error["loc"][0]
+                failed.setdefault(position, []).append({**error, "loc": error["loc"][1:]})
+
+            for position, item_errors in failed.items():
+                errors[candidates[position][0]] = ValidationErrorResponse.from_request_validation_error(item_errors).detail
+
+            candidates = [candidate for position, candidate in enumerate(candidates) if position not in failed]
+            posts = post_readings_adapter.validate_python([record for _, record in candidates])
+
+        unknown = {post.server_ulid for post in posts} - self._known_servers
+        if unknown:
+            self._known_servers |= self.server_repository.find_existing_ids(list(unknown))
+
+        rows = []
+        for (index, _), post in zip(candidates, posts):
+            if post.server_ulid not in self._known_servers:
+                errors[index] = f"Server with id {post.server_ulid} not found"
+                continue
+            rows.append(post.model_dump())
+
+        item_errors = [
+            BatchItemError(index=offset + index, detail=detail)
+            for index, detail in sorted(errors.items())
+        ]
+        return rows, item_errors
@@ -0,0 +1,64 @@
+from typing import AsyncIterator
+from sqlalchemy.ext.asyncio import AsyncSession
+from core.enums import ExportFormat
+from core.settings import EXPORT_CHUNK_SIZE
+from repository.reading_repository import AsyncReadingRepository
+from schemas.reading_schema import GetReadingParams
+from utils.export_utils import build_encoder
+
+EXPORT_SENSORS = ("temperature", "humidity", "voltage", "current")
+EXPORT_COLUMNS = ("server_ulid", "timestamp", *EXPORT_SENSORS)
+
+
+class ExportService:
+    """Streams raw or aggregated readings as CSV, NDJSON, Arrow IPC or Parquet in chunks.
+
+    The session comes from the request scoped get_async_db dependency, which
+    keeps it open until the response has been sent, so the server-side cursor
+    lives as long as the stream.
+    """
+
+    chunk_size: int = EXPORT_CHUNK_SIZE
+
+    def __init__(self, db: AsyncSession):
+        self.reading_repository = AsyncReadingRepository(db)
+
+    @staticmethod
+    def check_filters(filters: GetReadingParams):
+        """Refuse the filters of GET /data that exports don't apply"""
+        if filters.stats:
+            raise ValueError("stats can't be exported")
+        if filters.fill:
+            raise ValueError("fill can't be exported")
+        if filters.lttb:
+            raise ValueError("downsample=lttb can't be exported")
+
+    @staticmethod
+    def sensors_for(filters: GetReadingParams) -> tuple[str, ...]:
+        # Raw and aggregated exports share the column order, so their schemas match
+        return (filters.sensor_type,) if filters.sensor_type else EXPORT_SENSORS
+
+    @staticmethod
+    def columns_for(filters: GetReadingParams) -> tuple[str, ...]:
+        sensors = ExportService.sensors_for(filters)
+        if filters.aggregation:
+            # Aggregated rows mix every server matching the filters
+            return ("timestamp", *sensors)
+        return ("server_ulid", "timestamp", *sensors)
+
+    async def stream(self, filters: GetReadingParams, export_format: ExportFormat) -> AsyncIterator[bytes]:
+        encoder = build_encoder(export_format, self.columns_for(filters))
+
+        if header := encoder.begin():
+            yield header
+
+        if filters.aggregation:
+            chunks = self.reading_repository.stream_aggregated(filters, self.sensors_for(filters), self.chunk_size)
+        else:
+            chunks = self.reading_repository.stream_columns(filters, self.columns_for(filters), self.chunk_size)
+
+        async for rows in chunks:
+            yield encoder.encode(rows)
+
+        if footer := encoder.finish():
+            yield footer
@@ -0,0 +1,248 @@
+import asyncio
+import logging
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Callable
+import orjson
+from sqlalchemy.ext.asyncio import AsyncSession
+from core.database import AsyncSessionLocal
+from core.enums import ServerStatus
+from core.settings import (
+    HEALTH_MONITOR_INTERVAL_S,
+    HEALTH_MONITOR_REFRESH_S,
+    HEALTH_STREAM_KEEPALIVE_S,
+    HEALTH_STREAM_QUEUE_SIZE,
+)
+from repository.server_repository import ONLINE_WINDOW, AsyncServerRepository, LastSeenThrottle, last_seen_throttle
+
+logger = logging.getLogger(__name__)
+
+KEEPALIVE_EVENT = b": keepalive\n\n"
+OVERFLOW_EVENT = b"event: overflow\ndata: {}\n\n"
+
+
+@dataclass
+class TrackedServer:
+    """Last-seen time and status of a server as the monitor saw it"""
+    owner: int
+    server_name: str
+    last_seen_at: datetime
+    online_since: datetime | None
+    online: bool = False
+
+
+def encode_transition(server_ulid: str, server: TrackedServer) -> bytes:
+    """Server-sent event of a status change, online servers changed at their
+    online_since and offline ones when the window of their last reading ended"""
+    if server.online:
+        status, changed_at = ServerStatus.ONLINE.value, server.online_since or server.last_seen_at
+    else:
+        status, changed_at = ServerStatus.OFFLINE.value, server.last_seen_at + ONLINE_WINDOW
+    data = orjson.dumps({
+        "server_ulid": server_ulid,
+        "server_name": server.server_name,
+        "status": status,
+        "changed_at": changed_at,
+    })
+    return b"event: status\ndata: " + data + b"\n\n"
+
+
+class HealthSubscription:
+    """Pending events of one stream, None once it fell too far behind"""
+
+    def __init__(self, user_id: int, max_size: int):
+        self.user_id = user_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_size)
+
+    def push(self, event: bytes):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Dropping events would hide transitions, the client reconnects and
+            # reloads the statuses from /health/summary instead
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+
+class HealthMonitor:
+    """Pushes the online/offline transitions of the servers to their owners' streams.
+
+    Every `interval_s` seconds a single task per worker compares the status
+    of each server with the previous one, from the last-seen times it keeps
+    in memory. The readings this worker commits update them as they are
+    written; the database is only read every `refresh_s` seconds, for the
+    readings other workers received, and for the owner of a server seen for
+    the first time. Each transition is encoded once and queued to the streams
+    of the server's owner, so the database and CPU cost doesn't grow with the
+    number of viewers. Nothing is kept while no stream is open; the first
+    evaluation after that only records the statuses.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncSession],
+        interval_s: float = HEALTH_MONITOR_INTERVAL_S,
+        refresh_s: float = HEALTH_MONITOR_REFRESH_S,
+        queue_size: int = HEALTH_STREAM_QUEUE_SIZE,
+        keepalive_s: float = HEALTH_STREAM_KEEPALIVE_S,
+        throttle: LastSeenThrottle = last_seen_throttle,
+    ):
+        self.session_factory = session_factory
+        self.interval_s = interval_s
+        self.refresh = timedelta(seconds=refresh_s)
+        self.queue_size = queue_size
+        self.keepalive_s = keepalive_s
+        self.throttle = throttle
+        self._subscriptions: set[HealthSubscription] = set()
+        self._servers: dict[str, TrackedServer] = {}
+        self._owners: dict[str, tuple[int, str]] = {}
+        # Commits may run in other threads, the times they report wait here for the next evaluation
+        self._observed: dict[str, datetime] = {}
+        self._observed_lock = threading.Lock()
+        self._refreshed_at: datetime | None = None
+        self._seeded = False
+        self._task: asyncio.Task | None = None
+
+    def subscribe(self, user_id: int) -> HealthSubscription:
+        subscription = HealthSubscription(user_id, self.queue_size)
+        if not self._subscriptions and self.observe not in self.throttle.observers:
+            self.throttle.observers.append(self.observe)
+        self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: HealthSubscription):
+        self._subscriptions.discard(subscription)
+        if not self._subscriptions:
+            self._reset()
+
+    def _reset(self):
+        """Forget the statuses, the next evaluation records them again without events"""
+        if self.observe in self.throttle.observers:
+            self.throttle.observers.remove(self.observe)
+        with self._observed_lock:
+            self._observed.clear()
+        self._servers.clear()
+        self._owners.clear()
+        self._refreshed_at = None
+        self._seeded = False
+
+    def observe(self, last_seen: dict[str, datetime]):
+        """Records the last-seen times a commit wrote"""
+        with self._observed_lock:
+            for server_ulid, timestamp in last_seen.items():
+                observed = self._observed.get(server_ulid)
+                if observed is None or timestamp > observed:
+                    self._observed[server_ulid] = timestamp
+
+    async def stream(self, user_id: int) -> AsyncIterator[bytes]:
+        """Server-sent events of the user's servers until the client disconnects.
+
+        The subscription is only made once the response body starts, a client
+        gone before that leaves nothing behind.
+        """
+        subscription = self.subscribe(user_id)
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), self.keepalive_s)
+                except asyncio.TimeoutError:
+                    yield KEEPALIVE_EVENT
+                    continue
+                if event is None:
+                    yield OVERFLOW_EVENT
+                    return
+                yield event
+        finally:
+            self.unsubscribe(subscription)
+
+    async def tick(self, now: datetime | None = None) -> int:
+        """Evaluates the statuses once and queues the transitions, returns how many there were"""
+        now = now or datetime.now()
+        threshold = now - ONLINE_WINDOW
+
+        with self._observed_lock:
+            observed, self._observed = self._observed, {}
+
+        refresh = self._refreshed_at is None or now - self._refreshed_at >= self.refresh
+        unknown = [server_ulid for server_ulid in observed if server_ulid not in self._owners]
+        rows, owners = [], []
+        if refresh or unknown:
+            async with self.session_factory() as db:
+                repository = AsyncServerRepository(db)
+                if refresh:
+                    rows = await repository.find_seen_since(threshold)
+                    self._refreshed_at = now
+                if unknown:
+                    owners = await repository.find_owners(unknown)
+
+        for server_ulid, owner, server_name, last_seen_at, online_since in rows:
+            self._owners[server_ulid] = (owner, server_name)
+            self._track(server_ulid, last_seen_at, online_since)
+        for server_ulid, owner, server_name in owners:
+            self._owners[server_ulid] = (owner, server_name)
+        for server_ulid, last_seen_at in observed.items():
+            # Servers deleted since the reading have no owner and are skipped
+            if server_ulid in self._owners:
+                self._track(server_ulid, last_seen_at, last_seen_at)
+
+        events: dict[int, list[bytes]] = {}
+        for server_ulid, server in list(self._servers.items()):
+            online = server.last_seen_at >= threshold
+            if online != server.online:
+                server.online = online
+                if self._seeded:
+                    events.setdefault(server.owner, []).append(encode_transition(server_ulid, server))
+            if not online:
+                # Servers not tracked are offline, so only online ones are kept
+                del self._servers[server_ulid]
+        self._seeded = True
+
+        if not self._subscriptions:
+            # The last stream closed while the servers were read, this state would go stale
+            self._reset()
+
+        for subscription in list(self._subscriptions):
+            for event in events.get(subscription.user_id, ()):
+                subscription.push(event)
+        return sum(len(owner_events) for owner_events in events.values())
+
+    def _track(self, server_ulid: str, last_seen_at: datetime, online_since: datetime | None):
+        """Moves the last-seen time of the server forward, online_since only counts for servers not tracked yet"""
+        server = self._servers.get(server_ulid)
+        if server is None:
+            owner, server_name = self._owners[server_ulid]
+            self._servers[server_ulid] = TrackedServer(owner, server_name, last_seen_at, online_since)
+        elif last_seen_at > server.last_seen_at:
+            if server.last_seen_at < last_seen_at - ONLINE_WINDOW:
+                server.online_since = online_since
+            server.last_seen_at = last_seen_at
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            if not self._subscriptions:
+                self._reset()
+            else:
+                try:
+                    await self.tick()
+                except Exception:
+                    logger.exception("Health evaluation failed")
+            await asyncio.sleep(self.interval_s)
+
+
+health_monitor = HealthMonitor(AsyncSessionLocal)
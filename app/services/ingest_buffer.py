@@ -0,0 +1,214 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Callable
+from sqlalchemy.exc import IntegrityError, NoReferencedTableError
+from sqlalchemy.ext.asyncio import AsyncSession
+from core.database import AsyncSessionLocal
+from core.settings import (
+    INGEST_MODE,
+    INGEST_BUFFER_MAX_SIZE,
+    INGEST_BUFFER_BATCH_SIZE,
+    INGEST_BUFFER_FLUSH_INTERVAL_MS,
+    INGEST_BUFFER_PUT_TIMEOUT_MS,
+    INGEST_BUFFER_DRAIN_TIMEOUT_S,
+    INGEST_BUFFER_KNOWN_SERVER_TTL_S,
+)
+from exceptions.custom_exceptions import NotFoundException, ServiceUnavailableException
+from mappers.reading_mapper import ReadingMapper
+from repository.reading_repository import AsyncReadingRepository
+from repository.server_repository import AsyncServerRepository
+from schemas.reading_schema import PostReading
+from services.reading_broker import reading_broker
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class IngestBufferMetrics:
+    """Counters and flush latencies collected by the ingest buffer"""
+    enqueued: int = 0
+    rejected: int = 0
+    flushes: int = 0
+    flushed_rows: int = 0
+    failed_rows: int = 0
+    last_flush_ms: float = 0.0
+    max_flush_ms: float = 0.0
+    total_flush_ms: float = 0.0
+    last_wait_ms: float = 0.0  # Time the oldest reading of the last batch waited before being committed
+    max_wait_ms: float = 0.0
+
+    def record_flush(self, rows: int, failed: int, flush_ms: float, wait_ms: float):
+        self.flushes += 1
+        self.flushed_rows += rows
+        self.failed_rows += failed
+        self.last_flush_ms = flush_ms
+        self.max_flush_ms = max(self.max_flush_ms, flush_ms)
+        self.total_flush_ms += flush_ms
+        self.last_wait_ms = wait_ms
+        self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+
+    @property
+    def avg_flush_ms(self) -> float:
+        return self.total_flush_ms / self.flushes if self.flushes else 0.0
+
+
+class IngestBuffer:
+    """Bounded in-process queue that writes readings to the database in micro-batches.
+
+    A background task flushes the queue when it holds `batch_size` readings or
+    when the oldest queued reading has waited `flush_interval_ms`, whichever
+    comes first. When the queue is full, `put` waits up to `put_timeout_ms` and
+    then refuses the reading so clients back off instead of growing memory.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncSession],
+        max_size: int = INGEST_BUFFER_MAX_SIZE,
+        batch_size: int = INGEST_BUFFER_BATCH_SIZE,
+        flush_interval_ms: int = INGEST_BUFFER_FLUSH_INTERVAL_MS,
+        put_timeout_ms: int = INGEST_BUFFER_PUT_TIMEOUT_MS,
+        enabled: bool = False,
+        known_server_ttl_s: float = INGEST_BUFFER_KNOWN_SERVER_TTL_S,
+    ):
+        self.session_factory = session_factory
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.put_timeout = put_timeout_ms / 1000
+        self.enabled = enabled
+        self.metrics = IngestBufferMetrics()
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_size)
+        self._task: asyncio.Task | None = None
+        self._closed = False
+        # Servers found in the database and until when (monotonic) they are trusted. Deletes
+        # through ServerService forget them at once, other workers' deletes after the TTL
+        self.known_server_ttl = known_server_ttl_s
+        self._known_servers: dict[str, float] = {}
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def queue_size(self) -> int:
+        return self._queue.qsize()
+
+    async def start(self):
+        if self.running:
+            return
+        self._closed = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = INGEST_BUFFER_DRAIN_TIMEOUT_S):
+        """Stop accepting readings and wait until the queued ones are written"""
+        self._closed = True
+        if not self.running:
+            return
+
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.error("Ingest buffer drain timed out with %d readings still queued", self._queue.qsize())
+
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def put(self, reading: PostReading):
+        if self._closed:
+            raise ServiceUnavailableException("Ingest buffer is shutting down")
+
+        # Unknown servers are refused here, a single one would fail the multi-row insert of its batch
+        await self._check_server(reading.server_ulid)
+
+        try:
+            await asyncio.wait_for(self._queue.put((time.monotonic(), reading)), timeout=self.put_timeout)
+        except asyncio.TimeoutError:
+            self.metrics.rejected += 1
+            raise ServiceUnavailableException("Ingest buffer is full")
+
+        self.metrics.enqueued += 1
+
+    async def _check_server(self, server_ulid: str):
+        if self._known_servers.get(server_ulid, 0) > time.monotonic():
+            return
+        async with self.session_factory() as db:
+            if not await AsyncServerRepository(db).find_existing_ids([server_ulid]):
+                self._known_servers.pop(server_ulid, None)
+                raise NotFoundException(f"Server with id {server_ulid} not found")
+        self._known_servers[server_ulid] = time.monotonic() + self.known_server_ttl
+
+    def forget_server(self, server_ulid: str):
+        """Look the server up again before accepting its next reading"""
+        self._known_servers.pop(server_ulid, None)
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            try:
+                await self._flush(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _collect(self) -> list[tuple[float, PostReading]]:
+        """Wait for the first reading, then gather more until the batch is full or the interval expires"""
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval
+
+        while len(batch) < self.batch_size:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _flush(self, batch: list[tuple[float, PostReading]]):
+        started = time.monotonic()
+        readings = [reading for _, reading in batch]
+
+        try:
+            saved, failed = await self._write(readings)
+        except Exception:
+            logger.exception("Ingest buffer failed to write %d readings", len(readings))
+            saved, failed = 0, len(readings)
+
+        finished = time.monotonic()
+        self.metrics.record_flush(
+            rows=saved,
+            failed=failed,
+            flush_ms=(finished - started) * 1000,
+            wait_ms=(finished - batch[0][0]) * 1000,
+        )
+
+    async def _write(self, readings: list[PostReading]) -> tuple[int, int]:
+        async with self.session_factory() as db:
+            repository = AsyncReadingRepository(db)
+            try:
+                reading_broker.publish(await repository.save_all(ReadingMapper.from_posts_to_entities(readings)))
+                return len(readings), 0
+            except (NoReferencedTableError, IntegrityError):
+                # Servers are checked by put, but one unexpected bad reading still fails
+                # the whole insert, so fall back to row by row to keep the valid ones.
+                saved = []
+                for reading in readings:
+                    try:
+                        saved.append(await repository.save(ReadingMapper.from_post_to_entity(reading)))
+                    except (NoReferencedTableError, IntegrityError):
+                        logger.warning("Dropping reading rejected by the database: %s", reading)
+                reading_broker.publish(saved)
+                return len(saved), len(readings) - len(saved)
+
+
+ingest_buffer = IngestBuffer(AsyncSessionLocal, enabled=INGEST_MODE == "buffered")
@@ -0,0 +1,340 @@
+import asyncio
+import logging
+import time
+import uuid
+from typing import AsyncIterator, Callable, Iterable, Iterator, Protocol
+import asyncpg
+import orjson
+from core.settings import (
+    DATABASE_URL,
+    READING_STREAM_CHANNEL,
+    READING_STREAM_KEEPALIVE_S,
+    READING_STREAM_NOTIFY_QUEUE_SIZE,
+    READING_STREAM_PRESENCE_S,
+    READING_STREAM_QUEUE_SIZE,
+)
+from mappers.reading_mapper import ReadingMapper
+from models.reading import Reading
+
+logger = logging.getLogger(__name__)
+
+KEEPALIVE_EVENT = b": keepalive\n\n"
+NOTIFY_CHANNEL = "reading_stream"
+PRESENCE_CHANNEL = "reading_stream_presence"
+NOTIFY_MAX_BYTES = 7900  # PostgreSQL refuses NOTIFY payloads of 8000 bytes or more
+RECONNECT_DELAY_S = 5
+
+Deliver = Callable[[list[dict]], None]
+
+
+def encode_reading(item: dict, sensor_type: str | None) -> bytes | None:
+    """Server-sent event of the reading, None when it lacks the sensor of the subscription"""
+    if sensor_type:
+        if sensor_type not in item:
+            return None
+        item = {"server_ulid": item["server_ulid"], sensor_type: item[sensor_type], "timestamp": item["timestamp"]}
+    return b"event: reading\ndata: " + orjson.dumps(item) + b"\n\n"
+
+
+class ReadingSubscription:
+    """Pending readings of one stream.
+
+    The queue is bounded: when the client reads slower than the servers send,
+    the oldest readings are dropped so publishing never waits on it.
+    """
+
+    def __init__(self, server_ulids: tuple[str, ...], sensor_type: str | None, max_size: int):
+        self.server_ulids = server_ulids
+        self.sensor_type = sensor_type
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_size)
+        self.dropped = 0
+
+    def push(self, event: bytes):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+
+class ReadingChannel(Protocol):
+    """Carries the published readings to the brokers that deliver them"""
+
+    # Whether other workers receive the readings, so they are sent without local subscribers
+    shared: bool
+
+    async def start(self, deliver: Deliver): ...
+
+    async def stop(self): ...
+
+    def send(self, items: list[dict]): ...
+
+    def announce(self, listening: bool):
+        """Whether this worker has subscribers"""
+
+    def listened(self) -> bool:
+        """Whether any worker receiving the readings has subscribers"""
+
+
+class LocalChannel:
+    """Delivers the readings to the subscribers of this worker only"""
+
+    shared = False
+
+    def __init__(self):
+        self._deliver: Deliver | None = None
+        self._listening = False
+
+    async def start(self, deliver: Deliver):
+        self._deliver = deliver
+
+    async def stop(self):
+        self._deliver = None
+
+    def send(self, items: list[dict]):
+        if self._deliver:
+            self._deliver(items)
+
+    def announce(self, listening: bool):
+        self._listening = listening
+
+    def listened(self) -> bool:
+        return self._listening
+
+
+class PostgresChannel:
+    """Fans the readings out to every worker with LISTEN/NOTIFY.
+
+    Each worker keeps a connection of its own that listens to the channel and
+    sends the NOTIFYs, so its own readings reach it the same way as the
+    others'. Readings wait in a bounded queue for that connection and are
+    dropped when it is full or down, ingest never waits on the fan-out.
+
+    Readings are only sent while some worker has subscribers: workers with
+    subscribers announce it on a presence channel when they get the first one
+    and every `presence_s` seconds after, and are forgotten when they announce
+    the last one left or miss three announcements. A worker that connects asks
+    the others to announce themselves again.
+    """
+
+    shared = True
+
+    def __init__(
+        self,
+        dsn: str,
+        max_pending: int = READING_STREAM_NOTIFY_QUEUE_SIZE,
+        channel: str = NOTIFY_CHANNEL,
+        presence_s: float = READING_STREAM_PRESENCE_S,
+    ):
+        self.dsn = dsn
+        self.channel = channel
+        self.presence_channel = PRESENCE_CHANNEL if channel == NOTIFY_CHANNEL else f"{channel}_presence"
+        self.presence_s = presence_s
+        self.worker_id = uuid.uuid4().hex
+        self.dropped = 0
+        self._pending: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self._deliver: Deliver | None = None
+        self._listening = False
+        # Monotonic expiry of the announcement of each other worker with subscribers
+        self._listeners: dict[str, float] = {}
+        self._announce = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    async def start(self, deliver: Deliver):
+        self._deliver = deliver
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def send(self, items: list[dict]):
+        for item in items:
+            try:
+                self._pending.put_nowait(item)
+            except asyncio.QueueFull:
+                self.dropped += 1
+
+    def announce(self, listening: bool):
+        if listening != self._listening:
+            self._listening = listening
+            self._announce.set()
+
+    def listened(self) -> bool:
+        if self._listening:
+            return True
+        now = time.monotonic()
+        for worker_id, expires_at in list(self._listeners.items()):
+            if expires_at <= now:
+                del self._listeners[worker_id]
+        return bool(self._listeners)
+
+    async def _run(self):
+        while True:
+            try:
+                connection = await asyncpg.connect(self.dsn)
+                # asyncpg runs one query at a time per connection
+                lock = asyncio.Lock()
+                presence = None
+                try:
+                    await connection.add_listener(self.channel, self._on_notify)
+                    await connection.add_listener(self.presence_channel, self._on_presence)
+                    presence = asyncio.create_task(self._run_presence(connection, lock))
+                    while True:
+                        items = [await self._pending.get()]
+                        while not self._pending.empty():
+                            items.append(self._pending.get_nowait())
+                        for payload in self._payloads(items):
+                            async with lock:
+                                await connection.execute("SELECT pg_notify($1, $2)", self.channel, payload)
+                finally:
+                    if presence is not None:
+                        presence.cancel()
+                    await connection.close()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Reading stream channel failed, reconnecting in %d seconds", RECONNECT_DELAY_S)
+                await asyncio.sleep(RECONNECT_DELAY_S)
+
+    async def _run_presence(self, connection, lock: asyncio.Lock):
+        """Announces whether this worker has subscribers, asking the others first"""
+        probe = True
+        while True:
+            self._announce.clear()
+            if self._listening or probe:
+                message = {"worker": self.worker_id, "listening": self._listening, "probe": probe}
+                async with lock:
+                    await connection.execute("SELECT pg_notify($1, $2)", self.presence_channel, orjson.dumps(message).decode())
+            probe = False
+            try:
+                await asyncio.wait_for(self._announce.wait(), self.presence_s)
+            except asyncio.TimeoutError:
+                pass
+
+    def _on_notify(self, connection, pid: int, channel: str, payload: str):
+        if self._deliver:
+            self._deliver(orjson.loads(payload))
+
+    def _on_presence(self, connection, pid: int, channel: str, payload: str):
+        message = orjson.loads(payload)
+        if message["worker"] == self.worker_id:
+            return
+        if message["listening"]:
+            self._listeners[message["worker"]] = time.monotonic() + 3 * self.presence_s
+        else:
+            self._listeners.pop(message["worker"], None)
+        if message["probe"] and self._listening:
+            self._announce.set()
+
+    @staticmethod
+    def _payloads(items: list[dict]) -> Iterator[str]:
+        """JSON arrays of the items, each one under the NOTIFY payload limit"""
+        chunk, size = [], 2
+        for item in items:
+            encoded = orjson.dumps(item)
+            if chunk and size + len(encoded) + 1 > NOTIFY_MAX_BYTES:
+                yield (b"[" + b",".join(chunk) + b"]").decode()
+                chunk, size = [], 2
+            chunk.append(encoded)
+            size += len(encoded) + 1
+        if chunk:
+            yield (b"[" + b",".join(chunk) + b"]").decode()
+
+
+class ReadingBroker:
+    """Publishes the accepted readings to the streams subscribed to their servers.
+
+    Readings go through the channel, then each worker delivers them to its own
+    subscribers: a reading is encoded once per sensor filter and queued to
+    every matching subscription without waiting, slow streams lose their
+    oldest readings instead of holding back the others or ingest.
+    """
+
+    def __init__(
+        self,
+        channel: ReadingChannel,
+        queue_size: int = READING_STREAM_QUEUE_SIZE,
+        keepalive_s: float = READING_STREAM_KEEPALIVE_S,
+    ):
+        self.channel = channel
+        self.queue_size = queue_size
+        self.keepalive_s = keepalive_s
+        self._subscriptions: dict[str, set[ReadingSubscription]] = {}
+
+    async def start(self):
+        await self.channel.start(self.deliver)
+
+    async def stop(self):
+        await self.channel.stop()
+
+    def subscribe(self, server_ulids: tuple[str, ...], sensor_type: str | None = None) -> ReadingSubscription:
+        subscription = ReadingSubscription(server_ulids, sensor_type, self.queue_size)
+        for server_ulid in server_ulids:
+            self._subscriptions.setdefault(server_ulid, set()).add(subscription)
+        self.channel.announce(bool(self._subscriptions))
+        return subscription
+
+    def unsubscribe(self, subscription: ReadingSubscription):
+        for server_ulid in subscription.server_ulids:
+            subscriptions = self._subscriptions.get(server_ulid)
+            if subscriptions is None:
+                continue
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscriptions[server_ulid]
+        self.channel.announce(bool(self._subscriptions))
+
+    def publish(self, readings: Iterable[Reading]):
+        """Sends the readings to the subscribers of their servers, never blocks"""
+        if not self.channel.listened():
+            return
+        if not self.channel.shared:
+            readings = [reading for reading in readings if reading.server_ulid in self._subscriptions]
+        items = [ReadingMapper.from_entity_to_item(reading) for reading in readings]
+        if items:
+            self.channel.send(items)
+
+    def deliver(self, items: list[dict]):
+        for item in items:
+            subscriptions = self._subscriptions.get(item["server_ulid"])
+            if not subscriptions:
+                continue
+            events: dict[str | None, bytes | None] = {}
+            for subscription in list(subscriptions):
+                if subscription.sensor_type not in events:
+                    events[subscription.sensor_type] = encode_reading(item, subscription.sensor_type)
+                event = events[subscription.sensor_type]
+                if event is not None:
+                    subscription.push(event)
+
+    async def stream(self, server_ulids: tuple[str, ...], sensor_type: str | None = None) -> AsyncIterator[bytes]:
+        """Server-sent events of the readings of the servers until the client disconnects.
+
+        The subscription is only made once the response body starts, a client
+        gone before that leaves nothing behind.
+        """
+        subscription = self.subscribe(server_ulids, sensor_type)
+        reported = 0
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), self.keepalive_s)
+                except asyncio.TimeoutError:
+                    yield KEEPALIVE_EVENT
+                    continue
+                if subscription.dropped > reported:
+                    yield b"event: dropped\ndata: " + orjson.dumps({"count": subscription.dropped - reported}) + b"\n\n"
+                    reported = subscription.dropped
+                yield event
+        finally:
+            self.unsubscribe(subscription)
+
+
+reading_broker = ReadingBroker(PostgresChannel(DATABASE_URL) if READING_STREAM_CHANNEL == "postgres" else LocalChannel())
@@ -1,45 +1,275 @@
-from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from typing import Any
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+import numpy as np
+from core.settings import DOWNSAMPLE_CHUNK_SIZE, DOWNSAMPLE_MAX_ROWS, HTTP_CACHE_MAX_AGE_S, MAX_BATCH_SIZE
+from mappers.reading_mapper import ReadingMapper
 from models.reading import Reading
-from repository.reading_repository import ReadingRepository
-from schemas.reading_schema import GetReadingParams
+from repository.reading_repository import AGGREGATED_SENSORS, AsyncReadingRepository
+from repository.cache_generation_repository import AsyncCacheGenerationRepository
+from repository.rollup_repository import AsyncReadingRollupRepository
+from repository.server_repository import AsyncServerRepository
+from schemas.error_schema import ValidationErrorResponse
+from schemas.reading_schema import GetReadingParams, PostReading, BatchItemError, ReadingStreamParams
+from exceptions.custom_exceptions import NotFoundException
+from core import query_cache, retention
+from core.enums import FillMode
+from utils.downsample_utils import downsample_columns, to_columns
+from utils.http_cache_utils import ResultValidator, compute_etag
+from utils.interval_utils import fill_gaps
+from utils.pagination_utils import RAW_RESOLUTION, decode_cursor, encode_cursor
 
 
 class ReadingService:
-    def __init__(self, db: Session):
-        self.reading_repository = ReadingRepository(db)
+    def __init__(self, db: AsyncSession):
+        self.reading_repository = AsyncReadingRepository(db)
+        self.server_repository = AsyncServerRepository(db)
+        self.rollup_repository = AsyncReadingRollupRepository(db)
+        self.generation_repository = AsyncCacheGenerationRepository(db)
         
-    def save(self, data: Reading) -> Reading:
+    async def save(self, data: Reading) -> Reading:
         if not data:
             raise ValueError("No data provided")
         
-        return self.reading_repository.save(data)
+        return await self.reading_repository.save(data)
+
+    async def save_batch(self, items: list[Any]) -> tuple[list[Reading], list[BatchItemError]]:
+        """Validate a batch of raw readings and persist the valid ones at once.
+
+        Invalid items and items pointing to unknown servers are reported by
+        their index instead of failing the whole batch.
+        """
+        if not items:
+            raise ValueError("No data provided")
+
+        if len(items) > MAX_BATCH_SIZE:
+            raise ValueError(f"Batch size cannot be greater than {MAX_BATCH_SIZE}")
+
+        errors: list[BatchItemError] = []
+        valid: list[tuple[int, PostReading]] = []
+
+        for index, item in enumerate(items):
+            try:
+                valid.append((index, PostReading.model_validate(item)))
+            except ValidationError as e:
+                detail = ValidationErrorResponse.from_request_validation_error(e.errors()).detail
+                errors.append(BatchItemError(index=index, detail=detail))
+
+        known_servers = await self.server_repository.find_existing_ids([post.server_ulid for _, post in valid])
+
+        posts: list[PostReading] = []
+        for index, post in valid:
+            if post.server_ulid not in known_servers:
+                errors.append(BatchItemError(index=index, detail=f"Server with id {post.server_ulid} not found"))
+                continue
+            posts.append(post)
+
+        errors.sort(key=lambda error: error.index)
+
+        entities = ReadingMapper.from_posts_to_entities(posts)
+        return await self.reading_repository.save_all(entities), errors
         
 
-    def delete_by_id(self, id: int) -> None:
-        entity = self.reading_repository.find_by_id(id)
+    async def delete_by_id(self, id: int) -> None:
+        entity = await self.reading_repository.find_by_id(id)
         if not entity:
             raise ValueError(f"Reading with ID {id} not found")
         
-        self.reading_repository.delete(entity)
+        await self.reading_repository.delete(id)
+        # Min and max can't be subtracted, so the day of the reading is recomputed
+        await self.rollup_repository.rebuild(entity.timestamp, entity.timestamp, entity.server_ulid)
                 
     
-    def find_all(self) -> list[Reading]:
+    async def find_all(self) -> list[Reading]:
         
-        return self.reading_repository.find_all()
+        return await self.reading_repository.find_all()
         
 
-    def find_readings_by_params(self, filters: GetReadingParams) -> list[Reading] | None:
-        
-        if not filters:
-            return self.find_all()
+    async def find_readings_by_params(self, filters: GetReadingParams) -> tuple[list, str | None]:
+        """Return a page of readings and the cursor of the next page, if there is one.
 
+        Aggregated results are not paginated and never have a next cursor. With
+        stats, each aggregated row is a dict of timestamp and <sensor>_<stat>. With
+        fill, every bucket between start_time and end_time has a row. With
+        downsample=lttb, the rows are the dicts kept by LTTB, never paginated either.
+        """
         if filters.aggregation:
-            entities = self.reading_repository.find_aggregated_readings(filters)
-            return entities if entities else []
+            return (await self._find_aggregated(filters))[None], None
 
-        entities = self.reading_repository.find_by_criteria(filters)
-        return entities if entities else []
+        if filters.lttb:
+            return await self._find_downsampled(filters), None
+
+        after_timestamp, after_key, after_resolution = decode_cursor(filters.cursor) if filters.cursor else (None, None, None)
+
+        # Ranges whose raw readings expired are served from the finest rollup kept
+        rows: list[tuple[str, Any]] = []
+        for resolution, lower, upper in retention.retention_policy.tiers(RAW_RESOLUTION, filters.start_time, filters.end_time):
+            if after_timestamp is not None and upper is not None and upper <= after_timestamp:
+                continue
+
+            after = None
+            if after_timestamp is not None:
+                # The key of the cursor only orders rows of its own resolution
+                after = (after_timestamp, after_key if resolution == after_resolution else None)
+
+            # One extra row tells whether there is a next page
+            page = await self.reading_repository.find_page(filters, filters.limit + 1 - len(rows), resolution, lower, upper, after)
+            rows.extend((resolution, row) for row in page)
+            if len(rows) > filters.limit:
+                break
+
+        if len(rows) <= filters.limit:
+            return [row for _, row in rows], None
+
+        rows = rows[:filters.limit]
+        resolution, last = rows[-1]
+        key = last.id if resolution == RAW_RESOLUTION else last.server_ulid
+        return [row for _, row in rows], encode_cursor(last.timestamp, key, resolution)
     
-    def find_by_server_ulid(self, server_ulid: str) -> list[Reading]:
+    async def find_validator(self, filters: GetReadingParams) -> ResultValidator:
+        """ETag of the result of the filters, computed without running the query.
+
+        Readings landing before the closed buckets bump the cache generations
+        of their servers, so the result is identified by those generations and
+        the newest reading id of the still open buckets. Ranges that end before
+        the open buckets also get a Last-Modified and a max-age.
+        """
+        width = filters.bucket_width if filters.aggregation else timedelta(seconds=1)
+        closed_until = query_cache.aggregation_cache.closed_until(width)
+        historical = filters.end_time is not None and filters.end_time < closed_until
+
+        generations = await self.generation_repository.find_generations(filters.server_ids)
+        newest_id = None if historical else await self.reading_repository.find_newest_id(filters, closed_until)
+
+        etag = compute_etag({
+            "filters": filters.model_dump(mode="json"),
+            "generations": sorted(generations.items()),
+            "newest_id": newest_id,
+        })
+        if not historical:
+            return ResultValidator(etag)
+
+        # Readings of the range were written before it closed, or bumped a generation later on
+        written_until = min(filters.end_time + timedelta(seconds=query_cache.aggregation_cache.grace_s), datetime.now())
+        last_bump = await self.generation_repository.find_last_bump(filters.server_ids)
+        return ResultValidator(etag, max(written_until, last_bump or written_until), HTTP_CACHE_MAX_AGE_S)
+
+    async def _find_downsampled(self, filters: GetReadingParams) -> list[dict]:
+        """Raw readings of the range downsampled with LTTB to max_points per server and sensor.
+
+        The rows are streamed into column arrays chunk by chunk, so only the
+        columns of the requested sensors are held in memory.
+        """
+        sensors = (filters.sensor_type,) if filters.sensor_type else AGGREGATED_SENSORS
+        chunks, loaded = [], 0
+        async for rows in self.reading_repository.stream_columns(filters, ("server_ulid", "timestamp", *sensors), DOWNSAMPLE_CHUNK_SIZE):
+            loaded += len(rows)
+            if loaded > DOWNSAMPLE_MAX_ROWS:
+                raise ValueError(f"The time range has more than {DOWNSAMPLE_MAX_ROWS} readings, use downsample=avg")
+            chunks.append(to_columns(rows, sensors))
+
+        if not chunks:
+            return []
+        servers = np.concatenate([chunk[0] for chunk in chunks])
+        timestamps = np.concatenate([chunk[1] for chunk in chunks])
+        values = {sensor: np.concatenate([chunk[2][sensor] for chunk in chunks]) for sensor in sensors}
+        return downsample_columns(servers, timestamps, values, filters.max_points)
+
+    async def find_readings_by_server(self, filters: GetReadingParams, user_id: int) -> dict[str, list]:
+        """Aggregated rows of each server of the filters, or of every server of the user when
+        the filters name none, computed in one query grouped by (bucket, server_ulid)"""
+        if not filters.aggregation:
+            raise ValueError("aggregation is required to group readings by server")
+
+        if not filters.server_ids:
+            owned = await self.server_repository.find_ids_by_owner(user_id)
+            if not owned:
+                return {}
+            filters = filters.model_copy(update={"server_ulids": ",".join(owned)})
+        else:
+            await self._check_servers(filters.server_ids)
+
+        return await self._find_aggregated(filters, by_server=True)
+
+    async def find_stream_servers(self, params: ReadingStreamParams, user_id: int) -> tuple[str, ...]:
+        """Servers a reading stream subscribes to, every server of the user when the params name none"""
+        if not params.server_ids:
+            owned = await self.server_repository.find_ids_by_owner(user_id)
+            if not owned:
+                # The stream would only ever send keepalives
+                raise NotFoundException("The user has no servers to stream")
+            return tuple(owned)
+
+        await self._check_servers(params.server_ids)
+        return params.server_ids
+
+    async def _check_servers(self, server_ids: tuple[str, ...]):
+        existing = await self.server_repository.find_existing_ids(list(server_ids))
+        for server_ulid in server_ids:
+            if server_ulid not in existing:
+                raise NotFoundException(f"Server with id {server_ulid} not found")
+
+    async def _find_aggregated(self, filters: GetReadingParams, by_server: bool = False) -> dict[str | None, list]:
+        """Aggregated rows by server (a single None key unless by_server), gap filled if asked.
+
+        Rows are (timestamp, *averages) tuples, or with stats dicts of timestamp
+        and <sensor>_<stat>.
+        """
+        sensors = (filters.sensor_type,) if filters.sensor_type else AGGREGATED_SENSORS
+        if filters.statistics:
+            keys = ["timestamp"] + [f"{sensor}_{stat}" for sensor in sensors for stat in filters.statistics]
+        else:
+            # Only the requested sensors are averaged, the others keep their position as None
+            keys = ["timestamp", *AGGREGATED_SENSORS]
+        rows = await self._find_aggregated_rows(filters, sensors, by_server)
+
+        grouped: dict[str | None, list] = {server: [] for server in filters.server_ids} if by_server else {None: []}
+        for row in rows:
+            grouped.setdefault(row["server_ulid"] if by_server else None, []).append(tuple(row.get(key) for key in keys))
+
+        if filters.fill:
+            mode = FillMode(filters.fill)
+            grouped = {
+                server: fill_gaps(server_rows, filters.bucket_width, filters.start_time, filters.end_time, mode, len(keys))
+                for server, server_rows in grouped.items()
+            }
+
+        if filters.statistics:
+            return {server: [dict(zip(keys, row)) for row in server_rows] for server, server_rows in grouped.items()}
+        return grouped
+
+    async def _find_aggregated_rows(self, filters: GetReadingParams, sensors: tuple[str, ...], by_server: bool) -> list[dict]:
+        """Aggregated rows as dicts, the closed buckets read from the cache and the open ones computed"""
+        cache = query_cache.aggregation_cache
+        if not cache.enabled:
+            return await self._query_aggregated_rows(filters, sensors, by_server)
+
+        closed_until = cache.closed_until(filters.bucket_width)
+        if filters.start_time and filters.start_time >= closed_until:
+            return await self._query_aggregated_rows(filters, sensors, by_server)
+
+        only_closed = filters.end_time is not None and filters.end_time < closed_until
+        closed = filters if only_closed else filters.model_copy(update={"end_time": closed_until - timedelta(microseconds=1)})
+
+        # Read before the rows, so a late reading committed meanwhile changes the key of the next request
+        generations = await self.generation_repository.find_generations(filters.server_ids)
+        key = cache.key(closed, sensors, by_server, generations)
+        rows = await cache.get(key)
+        if rows is None:
+            rows = await self._query_aggregated_rows(closed, sensors, by_server)
+            await cache.set(key, rows)
+
+        if only_closed:
+            return rows
+        fresh = filters.model_copy(update={"start_time": closed_until})
+        return rows + await self._query_aggregated_rows(fresh, sensors, by_server)
+
+    async def _query_aggregated_rows(self, filters: GetReadingParams, sensors: tuple[str, ...], by_server: bool) -> list[dict]:
+        if filters.statistics:
+            return await self.reading_repository.find_aggregated_statistics(filters, sensors, by_server)
+        return [dict(row._mapping) for row in await self.reading_repository.find_aggregated_readings(filters, by_server)]
+
+    async def find_by_server_ulid(self, server_ulid: str) -> list[Reading]:
 
-        return self.reading_repository.find_by_server_ulid(server_ulid)
\ No newline at end of file
+        return await self.reading_repository.find_by_server_ulid(server_ulid)
\ No newline at end of file
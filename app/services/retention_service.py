@@ -0,0 +1,153 @@
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Callable
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from core.database import SessionLocal
+from core.enums import AggregationType
+from core.partitioning import IS_PARTITIONED_SQL, drop_partition, find_partitions
+from core.retention import RAW_RESOLUTION, RetentionPolicy, retention_policy
+from core.settings import RETENTION_CHECK_INTERVAL_S
+from repository.base_repository import is_sqlite_session
+from repository.reading_repository import ReadingRepository
+from repository.rollup_repository import ReadingRollupRepository
+from utils.rollup_utils import truncate
+
+logger = logging.getLogger(__name__)
+
+RETENTION_LOCK_KEY = 7_240_513
+
+
+@dataclass
+class RetentionReport:
+    """What a retention run removed"""
+    dropped_partitions: list[str] = field(default_factory=list)
+    deleted_readings: int = 0
+    deleted_buckets: dict[str, int] = field(default_factory=dict)
+
+
+class RetentionService:
+    """Downsamples and removes the readings past the retention policy.
+
+    Raw readings are only removed after the rollups of their range were
+    recomputed from them, so the expired range is still served by the minute
+    (or coarser) rollups. Whole reading partitions are detached and dropped;
+    the remaining expired readings are deleted one day per transaction.
+    """
+
+    def __init__(self, db: Session, policy: RetentionPolicy = retention_policy):
+        self.db = db
+        self.policy = policy
+        self.reading_repository = ReadingRepository(db)
+        self.rollup_repository = ReadingRollupRepository(db)
+
+    def apply(self, now: datetime | None = None) -> RetentionReport:
+        report = RetentionReport()
+        try:
+            cutoff = self.policy.cutoff(RAW_RESOLUTION, now)
+            if cutoff:
+                report.dropped_partitions = self._drop_partitions(cutoff)
+                report.deleted_readings = self._delete_readings(cutoff)
+
+            for aggregation in (AggregationType.MINUTE, AggregationType.HOUR):
+                cutoff = self.policy.cutoff(aggregation.value, now)
+                if cutoff:
+                    report.deleted_buckets[aggregation.value] = self.rollup_repository.delete_before(aggregation, cutoff)
+                    self.db.commit()
+        except Exception as e:
+            self.db.rollback()
+            raise e
+        return report
+
+    def _drop_partitions(self, cutoff: datetime) -> list[str]:
+        if is_sqlite_session(self.db) or not self.db.execute(IS_PARTITIONED_SQL).scalar():
+            return []
+
+        dropped = []
+        for name, start, end in find_partitions(self.db.connection()):
+            if end > cutoff:
+                break
+            self.rollup_repository.rebuild_window(start, end)
+            drop_partition(self.db.connection(), name)
+            self.db.commit()
+            dropped.append(name)
+        return dropped
+
+    def _delete_readings(self, cutoff: datetime) -> int:
+        deleted = 0
+        oldest = self.reading_repository.find_oldest_timestamp()
+        while oldest is not None and oldest < cutoff:
+            start = truncate(oldest, AggregationType.DAY)
+            end = min(start + timedelta(days=1), cutoff)
+            self.rollup_repository.rebuild_window(start, end)
+            deleted += self.reading_repository.delete_range(start, end)
+            self.db.commit()
+            oldest = self.reading_repository.find_oldest_timestamp()
+        return deleted
+
+
+class RetentionJob:
+    """Applies the retention policy every `interval_s` seconds.
+
+    On PostgreSQL an advisory lock keeps several workers from running it at
+    the same time; a worker that doesn't get the lock skips the run.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        policy: RetentionPolicy = retention_policy,
+        interval_s: int = RETENTION_CHECK_INTERVAL_S,
+    ):
+        self.session_factory = session_factory
+        self.policy = policy
+        self.interval_s = interval_s
+        self._task: asyncio.Task | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.policy.enabled
+
+    def run_once(self, now: datetime | None = None) -> RetentionReport | None:
+        with self.session_factory() as db:
+            if is_sqlite_session(db):
+                return RetentionService(db, self.policy).apply(now)
+
+            # Session level lock on a connection of its own, the service commits as it goes
+            with db.get_bind().connect() as lock_connection:
+                if not lock_connection.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": RETENTION_LOCK_KEY}).scalar():
+                    return None
+                try:
+                    return RetentionService(db, self.policy).apply(now)
+                finally:
+                    lock_connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": RETENTION_LOCK_KEY})
+
+    async def start(self):
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                # Long deletes run on the sync engine, off the event loop
+                report = await asyncio.to_thread(self.run_once)
+                if report and (report.dropped_partitions or report.deleted_readings or any(report.deleted_buckets.values())):
+                    logger.info("Retention removed %s", report)
+            except Exception:
+                logger.exception("Retention run failed")
+            await asyncio.sleep(self.interval_s)
+
+
+retention_job = RetentionJob(SessionLocal)
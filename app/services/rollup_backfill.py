@@ -0,0 +1,78 @@
+import asyncio
+import logging
+from typing import Callable
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from core.database import SessionLocal
+from repository.base_repository import is_sqlite_session
+from repository.rollup_repository import ReadingRollupRepository
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_BACKFILL_LOCK_KEY = 7_240_514
+
+
+class RollupBackfillJob:
+    """Fills the rollups with the readings written before they existed, once at startup.
+
+    Ingest only maintains the rollups of new readings, so on a database
+    upgraded with readings the aggregated queries, retention and exports
+    would read partial rollups until they are rebuilt. The backfill runs in
+    the background; on PostgreSQL an advisory lock keeps several workers
+    from running it at the same time.
+    """
+
+    def __init__(self, session_factory: Callable[[], Session]):
+        self.session_factory = session_factory
+        self._task: asyncio.Task | None = None
+
+    def run_once(self) -> int | None:
+        """Days rebuilt, None when another worker holds the lock"""
+        with self.session_factory() as db:
+            if is_sqlite_session(db):
+                return self._backfill(db)
+
+            with db.get_bind().connect() as lock_connection:
+                if not lock_connection.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": ROLLUP_BACKFILL_LOCK_KEY}).scalar():
+                    return None
+                try:
+                    return self._backfill(db)
+                finally:
+                    lock_connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": ROLLUP_BACKFILL_LOCK_KEY})
+
+    @staticmethod
+    def _backfill(db: Session) -> int:
+        repository = ReadingRollupRepository(db)
+        backfill_range = repository.find_backfill_range()
+        if backfill_range is None:
+            return 0
+
+        start, end = backfill_range
+        logger.warning("Rollups miss the readings from %s to %s, aggregations are partial until they are rebuilt", start, end)
+        return repository.backfill()
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        try:
+            # Rebuilding runs on the sync engine, off the event loop
+            days = await asyncio.to_thread(self.run_once)
+            if days:
+                logger.info("Rollup backfill rebuilt %d days", days)
+        except Exception:
+            logger.exception("Rollup backfill failed")
+
+
+rollup_backfill_job = RollupBackfillJob(SessionLocal)
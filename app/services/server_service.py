@@ -1,68 +1,76 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from exceptions.custom_exceptions import NotFoundException
-from repository.server_repository import ServerRepository
+from repository.server_repository import AsyncServerRepository
+from schemas.server_schema import FleetHealthParams
+from services.ingest_buffer import ingest_buffer
 from models.server import Server
 
 
 class ServerService:
 
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession):
         """Initialize the service with a repository."""
-        self.repository = ServerRepository(db)
+        self.repository = AsyncServerRepository(db)
         
-    def save(self, server: Server) -> Server:
+    async def save(self, server: Server) -> Server:
         if not server:
             raise ValueError("Server cannot be None")
         
-        return self.repository.save(server)
+        return await self.repository.save(server)
 
-    def find_by_name(self, server_name: str) -> Server:
+    async def find_by_name(self, server_name: str) -> Server:
         if not server_name:
             raise ValueError("Server name cannot be None")
         
-        return self.repository.find_by_name(server_name)
+        return await self.repository.find_by_name(server_name)
 
-    def find_all(self) -> list:
-        entities= self.repository.find_all()
+    async def find_all(self) -> list:
+        entities= await self.repository.find_all()
         return entities if entities else []
     
-    def find_by_id(self, id: int) -> Server:
+    async def find_by_id(self, id: int) -> Server:
         if not id:
             raise ValueError("Id cannot be None")
         
-        return self.repository.find_by_id(id)
+        return await self.repository.find_by_id(id)
 
     
-    def delete_by_id(self, id: int) -> bool:
+    async def delete_by_id(self, id: int) -> bool:
         if not id:
             raise ValueError("Id cannot be None")
-        
-        return self.repository.delete(id)
+
+        deleted = await self.repository.delete(id)
+        # Readings of the deleted server must not be queued anymore
+        ingest_buffer.forget_server(id)
+        return deleted
     
     
-    def _get_server_health(self, server_id: int= None, user_id :int =None) -> Server:
-        if server_id is None and user_id is not None:
-            return self.repository.get_server_health(user_id=user_id)
-
-        
-        entity = self.repository.find_by_id(server_id)
-        if entity is None:
-            raise NotFoundException(f"Entity with id: {server_id} not found")
-        
-        return self.repository.get_server_health(server_ulid=entity.id)
-        
-
-    def get_server_health_all(self, user_id: str) -> list:
+    async def get_server_health_all(self, user_id: str) -> list:
         """Get health data for all servers created by the specified user"""
-        return self.repository.get_server_health_all(user_id=user_id)
+        return await self.repository.get_server_health_all(user_id=user_id)
     
-    def get_server_health_by_id(self, server_id: str) -> list:
-        """Get health data for a specific server by ID"""
+    async def get_server_health_by_id(self, server_id: str) -> tuple:
+        """Get health data for a specific server by ID, in a single query"""
         if not server_id:
             raise ValueError("Server ID cannot be None")
         
-        entity = self.find_by_id(server_id)
-        if entity is None:
-            raise NotFoundException(f"Server with id: {server_id} not found")
+        health_data = await self.repository.get_server_health_by_id(server_id)
+        if not health_data:
+            raise NotFoundException(f"Server with id {server_id} not found")
         
-        return self.repository.get_server_health_by_id(server_id)
\ No newline at end of file
+        return health_data[0]
+
+    async def get_fleet_health(self, params: FleetHealthParams, user_id: int) -> tuple[int, int, list, str | None]:
+        """Online and total counts of the user's servers, a page of the servers matching
+        the filters and the cursor of the next page, if there is one"""
+        online, total = await self.repository.count_fleet_health(user_id)
+
+        # One extra row tells whether there is a next page
+        rows = await self.repository.find_fleet_health_page(
+            user_id, params.limit + 1, params.status, params.changed_since, params.cursor
+        )
+        if len(rows) <= params.limit:
+            return online, total, rows, None
+
+        rows = rows[:params.limit]
+        return online, total, rows, rows[-1][0]
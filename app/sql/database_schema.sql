@@ -11,7 +11,9 @@ CREATE TABLE "user" (
 -- Create server table
 CREATE TABLE server (
     id CHAR(26) NOT NULL PRIMARY KEY, -- The server ULID creation should be handled by the backend
-    server_name VARCHAR(255) NOT NULL
+    server_name VARCHAR(255) NOT NULL,
+    last_seen_at TIMESTAMP, -- Newest reading timestamp, maintained by ingest
+    online_since TIMESTAMP -- First reading after the last time the server went offline
 );
 
 -- Create reading table
@@ -34,3 +36,30 @@ ALTER TABLE reading
         (voltage IS NOT NULL AND voltage >= 0) OR
         ("current" IS NOT NULL AND "current" >= 0)
     );
+
+-- Indexes used by the keyset pagination of GET /data
+CREATE INDEX ix_reading_server_ulid_timestamp_id ON reading (server_ulid, timestamp, id);
+CREATE INDEX ix_reading_timestamp_id ON reading (timestamp, id);
+
+-- Rollups of the readings per server and bucket, maintained at ingest time
+-- (rebuild them from the raw readings with `python -m cli.rollup`)
+CREATE TABLE reading_rollup_minute (
+    server_ulid VARCHAR(26) NOT NULL,
+    bucket TIMESTAMP NOT NULL,
+    temperature_sum FLOAT NOT NULL, temperature_count INTEGER NOT NULL, temperature_min FLOAT, temperature_max FLOAT,
+    humidity_sum FLOAT NOT NULL, humidity_count INTEGER NOT NULL, humidity_min FLOAT, humidity_max FLOAT,
+    voltage_sum FLOAT NOT NULL, voltage_count INTEGER NOT NULL, voltage_min FLOAT, voltage_max FLOAT,
+    "current_sum" FLOAT NOT NULL, "current_count" INTEGER NOT NULL, "current_min" FLOAT, "current_max" FLOAT,
+    PRIMARY KEY (server_ulid, bucket)
+);
+CREATE INDEX ix_reading_rollup_minute_bucket ON reading_rollup_minute (bucket);
+
+CREATE TABLE reading_rollup_hour (LIKE reading_rollup_minute INCLUDING ALL);
+CREATE TABLE reading_rollup_day (LIKE reading_rollup_minute INCLUDING ALL);
+
+-- Bumped when readings change in buckets the aggregation cache may hold ('*' for every server)
+CREATE TABLE cache_generation (
+    server_ulid VARCHAR(26) PRIMARY KEY,
+    generation INTEGER NOT NULL DEFAULT 0,
+    bumped_at TIMESTAMP
+);
@@ -0,0 +1,52 @@
+-- Move an existing plain reading table to a table partitioned by day
+-- (READING_PARTITION_INTERVAL=day). Start the API once with the setting enabled
+-- after running it so the upcoming partitions are created.
+-- Writes must be stopped while this runs.
+
+BEGIN;
+
+ALTER TABLE reading RENAME TO reading_old;
+ALTER SEQUENCE reading_id_seq RENAME TO reading_old_id_seq;
+
+CREATE TABLE reading (
+    id SERIAL NOT NULL,
+    server_ulid VARCHAR(26) NOT NULL REFERENCES server (id),
+    "timestamp" TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    temperature FLOAT,
+    humidity FLOAT,
+    voltage FLOAT,
+    "current" FLOAT,
+    PRIMARY KEY (id, "timestamp"),
+    CONSTRAINT has_any_reading CHECK (
+        (humidity IS NOT NULL AND humidity > 0 AND humidity <= 100) OR
+        (temperature IS NOT NULL) OR
+        (voltage IS NOT NULL AND voltage >= 0) OR
+        ("current" IS NOT NULL AND "current" >= 0)
+    )
+) PARTITION BY RANGE ("timestamp");
+
+CREATE TABLE reading_default PARTITION OF reading DEFAULT;
+
+-- One partition per day holding readings, created before the data is copied
+DO $$
+DECLARE
+    day DATE;
+BEGIN
+    FOR day IN SELECT DISTINCT "timestamp"::date FROM reading_old LOOP
+        EXECUTE format(
+            'CREATE TABLE reading_p%s PARTITION OF reading FOR VALUES FROM (%L) TO (%L)',
+            to_char(day, 'YYYYMMDD'), day, day + 1
+        );
+    END LOOP;
+END $$;
+
+INSERT INTO reading SELECT * FROM reading_old;
+SELECT setval('reading_id_seq', (SELECT COALESCE(MAX(id), 1) FROM reading));
+
+-- The old indexes go with the old table, the new ones are created on every partition
+DROP TABLE reading_old;
+
+CREATE INDEX ix_reading_server_ulid_timestamp_id ON reading (server_ulid, "timestamp", id);
+CREATE INDEX ix_reading_timestamp_id ON reading ("timestamp", id);
+
+COMMIT;
@@ -0,0 +1,18 @@
+-- Add server.last_seen_at and online_since to an existing database and fill them from the readings.
+-- Health checks read this column instead of scanning the reading table, and
+-- ingest keeps it up to date from then on. Run it once when upgrading.
+
+BEGIN;
+
+ALTER TABLE server ADD COLUMN IF NOT EXISTS last_seen_at TIMESTAMP;
+ALTER TABLE server ADD COLUMN IF NOT EXISTS online_since TIMESTAMP;
+CREATE INDEX IF NOT EXISTS ix_server_created_by_id ON server (created_by, id);
+CREATE INDEX IF NOT EXISTS ix_server_last_seen_at ON server (last_seen_at);
+
+UPDATE server SET last_seen_at = (
+    SELECT max(reading."timestamp") FROM reading WHERE reading.server_ulid = server.id
+);
+-- When the servers came online before the upgrade is unknown, their last reading is used
+UPDATE server SET online_since = last_seen_at;
+
+COMMIT;
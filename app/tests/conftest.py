@@ -1,9 +1,13 @@
 import pytest
+import pytest_asyncio
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from main import app
-from core.database import get_db
+from core.database import get_db, get_async_db
+from core.query_cache import aggregation_cache
+from repository.server_repository import last_seen_throttle
 from models.base_model import Base
 import os
 
@@ -13,6 +17,12 @@ engine = create_engine(TEST_DATABASE_URL, connect_args={"check_same_thread": Fal
 
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+ASYNC_TEST_DATABASE_URL = "sqlite+aiosqlite:///test.db"
+
+async_engine = create_async_engine(ASYNC_TEST_DATABASE_URL, connect_args={"check_same_thread": False})
+
+AsyncTestingSessionLocal = async_sessionmaker(bind=async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 
 def get_local_db():
     db = TestingSessionLocal()
@@ -21,14 +31,33 @@ def get_local_db():
     finally:
         db.close()
 
+async def get_local_async_db():
+    async with AsyncTestingSessionLocal() as db:
+        yield db
+
+@pytest.fixture(autouse=True)
+def clear_query_cache():
+    # Every test starts from new tables, whose cache generations start over
+    aggregation_cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def clear_last_seen_throttle():
+    # Servers of a previous test must not throttle the writes of this one
+    last_seen_throttle.clear()
+
+
 @pytest.fixture(scope="function")
 def client():
     app.dependency_overrides[get_db] = get_local_db
+    app.dependency_overrides[get_async_db] = get_local_async_db
     Base.metadata.create_all(bind=engine)
 
 
     with TestClient(app) as client:
         yield client
+        # The pooled aiosqlite connections belong to this client's event loop
+        client.portal.call(async_engine.dispose)
 
     Base.metadata.drop_all(bind=engine)
     
@@ -64,6 +93,13 @@ def db():
     finally:
         db.close()
 
+@pytest_asyncio.fixture(scope="function")
+async def async_db():
+    async with AsyncTestingSessionLocal() as db:
+        yield db
+    # The pooled aiosqlite connections belong to this test's event loop
+    await async_engine.dispose()
+
 @pytest.fixture(scope="session", autouse=True)
 def set_test_env():
     """Set environment variables for testing."""
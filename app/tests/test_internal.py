@@ -0,0 +1,72 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+import dependencies
+from core.pool_metrics import PoolMetrics, instrument_engine, instrumented_pool_class
+
+
+INTERNAL_TOKEN = "internal-test-token"
+
+
+@pytest.fixture
+def internal_token(monkeypatch):
+    monkeypatch.setattr(dependencies, "INTERNAL_API_TOKEN", INTERNAL_TOKEN)
+    return {"X-Internal-Token": INTERNAL_TOKEN}
+
+
+def test_get_pool_metrics(client, internal_token):
+    response = client.get("/internal/pool", headers=internal_token)
+
+    assert response.status_code == 200
+    assert [pool["name"] for pool in response.json()] == ["sync", "async"]
+
+
+def test_internal_routes_require_the_token(authenticated_client, monkeypatch):
+    # Logged in users aren't enough, and the routes stay closed without a configured token
+    assert authenticated_client.get("/internal/pool").status_code == 403
+
+    monkeypatch.setattr(dependencies, "INTERNAL_API_TOKEN", INTERNAL_TOKEN)
+    assert authenticated_client.get("/internal/ingest").status_code == 403
+    assert authenticated_client.get("/internal/ingest", headers={"X-Internal-Token": "wrong"}).status_code == 403
+
+
+def test_get_ingest_metrics(client, internal_token):
+    response = client.get("/internal/ingest", headers=internal_token)
+
+    assert response.status_code == 200
+    assert response.json()["enabled"] is False
+
+
+def test_pool_metrics_track_checkouts_and_timeouts(tmp_path):
+    metrics = PoolMetrics("test")
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}",
+        poolclass=instrumented_pool_class(QueuePool, metrics),
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=0.05,
+    )
+    instrument_engine(engine, metrics)
+
+    connection = engine.connect()
+    assert metrics.checkouts == 1
+    assert metrics.in_use == 1
+    assert metrics.connects == 1
+
+    # The only connection is taken, so the next checkout waits and times out
+    with pytest.raises(PoolTimeoutError):
+        engine.connect()
+
+    assert metrics.timeouts == 1
+    assert metrics.max_wait_ms >= 50
+
+    connection.close()
+    assert metrics.in_use == 0
+    assert metrics.max_in_use == 1
+
+    engine.dispose()
+    # The recreated pool keeps reporting to the same metrics
+    with engine.connect():
+        assert metrics.checkouts == 2
+    assert metrics.pool is engine.pool
@@ -0,0 +1,100 @@
+import json
+from datetime import datetime
+import pytest
+from fastapi import FastAPI, status
+from fastapi.testclient import TestClient
+from core import rate_limiter
+from core.rate_limiter import LocalRateLimitBackend, RateLimit, RateLimiter, parse_overrides
+from middlewares import RateLimitMiddleware
+
+
+def test_post_invalid_json(authenticated_client):
+    response = authenticated_client.post(
+        "/servers",
+        content="{\"server_name\": ",
+        headers={"Content-Type": "application/json"}
+    )
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.json()["type"] == "json_decode_error"
+    assert response.json()["detail"].startswith("Invalid JSON")
+
+
+def test_json_body_parsed_once(authenticated_client, monkeypatch):
+    response = authenticated_client.post("/servers", json={"server_name": "Dolly 1"})
+    server_ulid = response.json()["server_ulid"]
+
+    calls = []
+    original_loads = json.loads
+
+    def counting_loads(*args, **kwargs):
+        calls.append(args)
+        return original_loads(*args, **kwargs)
+
+    monkeypatch.setattr(json, "loads", counting_loads)
+
+    response = authenticated_client.post("/data", json={
+        "server_ulid": server_ulid,
+        "temperature": 25.5,
+        "timestamp": datetime.now().isoformat()
+    })
+
+    assert response.status_code == status.HTTP_201_CREATED
+    assert len(calls) == 1
+
+
+def _rate_limited_app(limiter):
+    app = FastAPI()
+    app.add_middleware(RateLimitMiddleware, limiter=limiter)
+
+    @app.get("/ping")
+    def ping():
+        return {"ok": True}
+
+    return TestClient(app)
+
+
+def test_rate_limit_allows_burst_then_rejects(monkeypatch):
+    monkeypatch.setenv("DISABLE_RATE_LIMIT", "false")
+    limiter = RateLimiter(LocalRateLimitBackend(), device_limit=RateLimit(1, 3), client_limit=RateLimit(1, 1))
+    client = _rate_limited_app(limiter)
+
+    statuses = [client.get("/ping", headers={"X-Device-ID": "dev-1"}).status_code for _ in range(4)]
+
+    assert statuses == [200, 200, 200, status.HTTP_429_TOO_MANY_REQUESTS]
+    response = client.get("/ping", headers={"X-Device-ID": "dev-1"})
+    assert response.json()["type"] == "rate_limit_exceeded"
+    assert int(response.headers["Retry-After"]) >= 1
+
+    # Other keys keep their own cells
+    assert client.get("/ping", headers={"X-Device-ID": "dev-2"}).status_code == 200
+
+
+def test_rate_limit_overrides_and_client_limit():
+    limiter = RateLimiter(
+        LocalRateLimitBackend(),
+        device_limit=RateLimit(12, 12),
+        client_limit=RateLimit(5, 5),
+        overrides=parse_overrides("device:fast=50/100, ip:10.0.0.5=100"),
+    )
+
+    assert limiter.limit_for("device:fast") == RateLimit(50, 100)
+    assert limiter.limit_for("device:other") == RateLimit(12, 12)
+    assert limiter.limit_for("ip:10.0.0.5") == RateLimit(100, 100)
+    assert limiter.limit_for("ip:10.0.0.6") == RateLimit(5, 5)
+
+
+@pytest.mark.asyncio
+async def test_local_backend_evicts_idle_keys(monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr(rate_limiter.time, "monotonic", lambda: now)
+    backend = LocalRateLimitBackend(max_keys=2)
+    limit = RateLimit(10, 10)
+
+    for key in ("a", "b", "c"):
+        assert (await backend.hit(key, limit)).allowed
+    assert len(backend) == 2  # "a" was the least recently used
+
+    now += 1  # Every cell is back to full capacity
+    await backend.hit("d", limit)
+    assert len(backend) == 1
@@ -0,0 +1,31 @@
+from datetime import date
+from sqlalchemy import create_engine
+from core.partitioning import ReadingPartitionManager, partition_ranges
+
+
+def test_daily_partition_ranges():
+    ranges = partition_ranges(date(2025, 10, 1), "day", ahead=2)
+
+    assert ranges == [
+        ("reading_p20251001", date(2025, 10, 1), date(2025, 10, 2)),
+        ("reading_p20251002", date(2025, 10, 2), date(2025, 10, 3)),
+        ("reading_p20251003", date(2025, 10, 3), date(2025, 10, 4)),
+    ]
+
+
+def test_weekly_partition_ranges_start_on_monday():
+    # 2025-10-01 is a Wednesday
+    ranges = partition_ranges(date(2025, 10, 1), "week", ahead=1)
+
+    assert ranges == [
+        ("reading_p20250929", date(2025, 9, 29), date(2025, 10, 6)),
+        ("reading_p20251006", date(2025, 10, 6), date(2025, 10, 13)),
+    ]
+
+
+def test_partitioning_disabled_on_sqlite(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'partitions.db'}")
+    manager = ReadingPartitionManager(engine, interval="day")
+
+    assert not manager.enabled
+    assert manager.ensure_partitions() == []
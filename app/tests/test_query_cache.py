@@ -0,0 +1,105 @@
+import asyncio
+import datetime
+from sqlalchemy import insert
+from core.query_cache import LocalCacheBackend
+from models.cache_generation import CacheGeneration
+from models.reading import Reading
+
+
+def _hourly_temperatures(client, server_ulid):
+    response = client.get("/data", params={"server_ulid": server_ulid, "aggregation": "hour", "sensor_type": "temperature"})
+    return [(row["timestamp"][:13], row["temperature"]) for row in response.json()]
+
+
+def test_closed_buckets_are_cached_until_late_readings(authenticated_client, db):
+    response = authenticated_client.post("/servers", json={"server_name": "Dolly 1"})
+    server_ulid = response.json()["server_ulid"]
+    authenticated_client.post("/data", json={"server_ulid": server_ulid, "temperature": 20.0, "timestamp": "2025-10-01T12:00:00Z"})
+
+    assert _hourly_temperatures(authenticated_client, server_ulid) == [("2025-10-01T12", 20.0)]
+
+    # A write that skips the rollups and the cache generations shows the cached result is used
+    db.execute(insert(Reading.__table__).values(server_ulid=server_ulid, temperature=40.0, timestamp=datetime.datetime(2025, 10, 1, 12, 30)))
+    db.commit()
+    assert _hourly_temperatures(authenticated_client, server_ulid) == [("2025-10-01T12", 20.0)]
+
+    # A late reading through the API bumps the generation of the server
+    generation = db.get(CacheGeneration, server_ulid).generation
+    authenticated_client.post("/data", json={"server_ulid": server_ulid, "temperature": 30.0, "timestamp": "2025-10-01T12:45:00Z"})
+    db.expire_all()
+    assert db.get(CacheGeneration, server_ulid).generation == generation + 1
+    assert _hourly_temperatures(authenticated_client, server_ulid) == [("2025-10-01T12", 25.0)]
+
+
+def test_open_bucket_is_always_fresh(authenticated_client, db):
+    response = authenticated_client.post("/servers", json={"server_name": "Dolly 1"})
+    server_ulid = response.json()["server_ulid"]
+    authenticated_client.post("/data", json={"server_ulid": server_ulid, "temperature": 20.0, "timestamp": "2025-10-01T12:00:00Z"})
+    assert _hourly_temperatures(authenticated_client, server_ulid) == [("2025-10-01T12", 20.0)]
+    generation = db.get(CacheGeneration, server_ulid).generation
+
+    now = datetime.datetime.now().replace(microsecond=0)
+    authenticated_client.post("/data", json={"server_ulid": server_ulid, "temperature": 50.0, "timestamp": now.isoformat()})
+
+    # Current readings don't invalidate anything, the newest bucket is computed on every request
+    db.expire_all()
+    assert db.get(CacheGeneration, server_ulid).generation == generation
+    assert _hourly_temperatures(authenticated_client, server_ulid) == [("2025-10-01T12", 20.0), (f"{now:%Y-%m-%dT%H}", 50.0)]
+
+
+def test_local_cache_backend_evicts_least_recently_used():
+    async def scenario():
+        backend = LocalCacheBackend(max_entries=2)
+        await backend.set("a", [{"value": 1}], ttl_s=60)
+        await backend.set("b", [{"value": 2}], ttl_s=60)
+        await backend.get("a")
+        await backend.set("c", [{"value": 3}], ttl_s=60)
+        kept = [await backend.get(key) for key in ("a", "b", "c")]
+        await backend.set("expired", [{"value": 4}], ttl_s=-1)
+        return kept, await backend.get("expired")
+
+    assert asyncio.run(scenario()) == ([[{"value": 1}], None, [{"value": 3}]], None)
+
+
+def test_unchanged_results_are_not_modified(authenticated_client):
+    response = authenticated_client.post("/servers", json={"server_name": "Dolly 1"})
+    server_ulid = response.json()["server_ulid"]
+    authenticated_client.post("/data", json={"server_ulid": server_ulid, "temperature": 20.0, "timestamp": "2025-10-01T12:00:00Z"})
+    params = {"server_ulid": server_ulid, "aggregation": "hour", "end_time": "2025-10-02T00:00:00"}
+
+    response = authenticated_client.get("/data", params=params)
+    etag = response.headers["ETag"]
+    assert response.headers["Cache-Control"] == "max-age=300, s-maxage=300"
+    assert response.headers["Last-Modified"]
+
+    response = authenticated_client.get("/data", params=params, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    response = authenticated_client.get("/data", params=params, headers={"If-Modified-Since": response.headers["Last-Modified"]})
+    assert response.status_code == 304
+
+    # A late reading in the range changes the validator
+    authenticated_client.post("/data", json={"server_ulid": server_ulid, "temperature": 30.0, "timestamp": "2025-10-01T12:30:00Z"})
+    response = authenticated_client.get("/data", params=params, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.json()[0]["temperature"] == 25.0
+
+
+def test_open_ranges_are_revalidated(authenticated_client):
+    response = authenticated_client.post("/servers", json={"server_name": "Dolly 1"})
+    server_ulid = response.json()["server_ulid"]
+    now = datetime.datetime.now().replace(microsecond=0)
+    authenticated_client.post("/data", json={"server_ulid": server_ulid, "temperature": 20.0, "timestamp": now.isoformat()})
+
+    response = authenticated_client.get("/data", params={"server_ulid": server_ulid})
+    etag = response.headers["ETag"]
+    assert response.headers["Cache-Control"] == "no-cache"
+    assert "Last-Modified" not in response.headers
+    assert authenticated_client.get("/data", params={"server_ulid": server_ulid}, headers={"If-None-Match": etag}).status_code == 304
+
+    # A current reading is newer than the ones the ETag was computed from
+    authenticated_client.post("/data", json={"server_ulid": server_ulid, "temperature": 30.0, "timestamp": now.isoformat()})
+    response = authenticated_client.get("/data", params={"server_ulid": server_ulid}, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert len(response.json()) == 2
@@ -1,10 +1,24 @@
+import asyncio
+import io
+import json
 import pytest
+import pyarrow as pa
+import pyarrow.parquet as pq
 from fastapi import status
+from main import app
+from dependencies import get_ingest_buffer
+from exceptions.custom_exceptions import NotFoundException, ServiceUnavailableException
+from services import server_service
+from services.ingest_buffer import IngestBuffer
+from services.export_service import ExportService
+from services.reading_broker import NOTIFY_MAX_BYTES, LocalChannel, PostgresChannel, ReadingBroker, reading_broker
+from models.reading import Reading
+from repository.reading_repository import ReadingRepository
 from app.mappers.reading_mapper import ReadingMapper
 from app.schemas.reading_schema import PostReading, GetReadingParams
 from app.services.reading_service import ReadingService
 import datetime
-from .conftest import _create_test_data_for_aggregations
+from .conftest import _create_test_data_for_aggregations, AsyncTestingSessionLocal
 
 def test_post_invalid_reading(authenticated_client, db):
     response = authenticated_client.post("/servers", json={"server_name": "Dolly 1"})
@@ -44,23 +58,24 @@ def test_post_reading(authenticated_client, db):
     server_ulid = response.json()["server_ulid"]
     assert server_ulid is not None
   
-def test_save_reading(authenticated_client, db):
+@pytest.mark.asyncio
+async def test_save_reading(authenticated_client, async_db):
     response = authenticated_client.post("/servers", json={"server_name": "Dolly 1"})
     server_ulid = response.json()["server_ulid"]
 
-    reading_service = ReadingService(db)
+    reading_service = ReadingService(async_db)
 
     post_reading = PostReading(server_ulid=server_ulid, temperature=25.5, timestamp="2025-10-01T12:00:00Z")
 
     reading_entity = ReadingMapper.from_post_to_entity(post_reading)
     
-    response = reading_service.save(reading_entity)
+    response = await reading_service.save(reading_entity)
 
     assert response.server_ulid == server_ulid
     assert response.temperature == 25.5
     assert response.timestamp == datetime.datetime(2025, 10, 1, 12, 0)
 
-    readings = reading_service.find_all()
+    readings = await reading_service.find_all()
     assert len(readings) == 1
 
 
@@ -240,3 +255,580 @@ def test_get_aggregated_values_by_minute(authenticated_client, db):
     assert len(minute_entries) == 1
     assert minute_entries[0]["temperature"] == 28.0
     
+
+def test_get_aggregated_statistics(authenticated_client, db):
+    response = authenticated_client.post("/servers", json={"server_name": "Dolly 1"})
+    server_ulid = response.json()["server_ulid"]
+    authenticated_client.post("/data/batch", json=[
+        {"server_ulid": server_ulid, "temperature": temperature, "timestamp": f"2025-10-01T12:0{i}:00Z"}
+        for i, temperature in enumerate([20.0, 30.0, 25.0, 10.0, 15.0])
+    ])
+
+    response = authenticated_client.get("/data", params={
+        "server_ulid": server_ulid, "aggregation": "hour", "sensor_type": "temperature",
+        "stats": "avg,min,max,count,stddev,p50,p95"
+    })
+
+    assert response.status_code == status.HTTP_200_OK
+    [hour] = response.json()
+    stats = hour["stats"]["temperature"]
+    assert hour["temperature"] == stats["avg"] == 20.0
+    assert (stats["min"], stats["max"], stats["count"], stats["p50"]) == (10.0, 30.0, 5, 20.0)
+    assert round(stats["stddev"], 4) == 7.9057
+    assert stats["p95"] == 29.0  # Interpolated between 25.0 and 30.0 like percentile_cont
+
+    # Statistics the rollups answer give the same values through them
+    response = authenticated_client.get("/data", params={
+        "server_ulid": server_ulid, "aggregation": "minute", "stats": "max,count",
+        "start_time": "2025-10-01T12:00:30", "end_time": "2025-10-01T12:04:00"
+    })
+    assert [minute["stats"]["temperature"] for minute in response.json()] == [
+        {"max": 30.0, "count": 1}, {"max": 25.0, "count": 1}, {"max": 10.0, "count": 1}, {"max": 15.0, "count": 1}
+    ]
+    assert "stats" not in authenticated_client.get("/data", params={"server_ulid": server_ulid, "aggregation": "hour"}).json()[0]
+
+
+def test_get_aggregated_by_interval(authenticated_client, db):
+    response = authenticated_client.post("/servers", json={"server_name": "Dolly 1"})
+    server_ulid = response.json()["server_ulid"]
+    authenticated_client.post("/data/batch", json=[
+        {"server_ulid": server_ulid, "temperature": temperature, "timestamp": timestamp}
+        for temperature, timestamp in [
+            (10.0, "2025-10-01T12:00:05Z"), (20.0, "2025-10-01T12:00:14Z"), (30.0, "2025-10-01T12:00:50Z"),
+            (40.0, "2025-10-01T12:16:00Z"), (50.0, "2025-10-01T12:44:00Z"),
+        ]
+    ])
+
+    response = authenticated_client.get("/data", params={"server_ulid": server_ulid, "aggregation": "15s", "end_time": "2025-10-01T12:01:00"})
+    assert [(row["timestamp"], row["temperature"]) for row in response.json()] == [
+        ("2025-10-01T12:00:00", 15.0), ("2025-10-01T12:00:45", 30.0)
+    ]
+
+    # 15m buckets read from the minute rollups, the partial ones from the raw readings
+    response = authenticated_client.get("/data", params={
+        "server_ulid": server_ulid, "aggregation": "15m", "start_time": "2025-10-01T12:00:10", "end_time": "2025-10-01T12:50:00"
+    })
+    assert [(row["timestamp"], row["temperature"]) for row in response.json()] == [
+        ("2025-10-01T12:00:00", 25.0), ("2025-10-01T12:15:00", 40.0), ("2025-10-01T12:30:00", 50.0)
+    ]
+
+    params = {"server_ulid": server_ulid, "aggregation": "15m", "start_time": "2025-10-01T11:50:00", "end_time": "2025-10-01T12:59:59"}
+    response = authenticated_client.get("/data", params={**params, "fill": "null"})
+    assert [row["timestamp"] for row in response.json()] == [
+        "2025-10-01T11:45:00", "2025-10-01T12:00:00", "2025-10-01T12:15:00", "2025-10-01T12:30:00", "2025-10-01T12:45:00"
+    ]
+    assert [row.get("temperature") for row in response.json()] == [None, 20.0, 40.0, 50.0, None]
+
+    response = authenticated_client.get("/data", params={**params, "aggregation": "5m", "fill": "linear", "stats": "max"})
+    maxima = [row["stats"]["temperature"]["max"] for row in response.json()]
+    # 12:05 and 12:10 are interpolated between 12:00 and 12:15, nothing before the first bucket with readings
+    assert [round(value, 2) if value is not None else None for value in maxima[:6]] == [None, None, 30.0, 33.33, 36.67, 40.0]
+
+
+def test_get_aggregated_by_server(authenticated_client, db):
+    servers = [authenticated_client.post("/servers", json={"server_name": f"Dolly {i}"}).json()["server_ulid"] for i in range(3)]
+    authenticated_client.post("/data/batch", json=[
+        {"server_ulid": servers[0], "temperature": 20.0, "timestamp": "2025-10-01T12:00:00Z"},
+        {"server_ulid": servers[0], "temperature": 30.0, "timestamp": "2025-10-01T12:30:00Z"},
+        {"server_ulid": servers[1], "temperature": 10.0, "timestamp": "2025-10-01T12:10:00Z"},
+        {"server_ulid": servers[1], "temperature": 12.0, "timestamp": "2025-10-01T13:10:00Z"},
+    ])
+
+    # Every server of the user, the ones without readings too
+    response = authenticated_client.get("/data/servers", params={"aggregation": "hour", "sensor_type": "temperature"})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {
+        servers[0]: [{"timestamp": "2025-10-01T12:00:00", "temperature": 25.0}],
+        servers[1]: [{"timestamp": "2025-10-01T12:00:00", "temperature": 10.0}, {"timestamp": "2025-10-01T13:00:00", "temperature": 12.0}],
+        servers[2]: [],
+    }
+
+    response = authenticated_client.get("/data/servers", params={
+        "server_ulids": f"{servers[1]},{servers[0]}", "aggregation": "day", "stats": "max,count"
+    })
+    assert {server: rows[0]["stats"]["temperature"] for server, rows in response.json().items()} == {
+        servers[0]: {"max": 30.0, "count": 2}, servers[1]: {"max": 12.0, "count": 2}
+    }
+
+    response = authenticated_client.get("/data", params={"server_ulids": f"{servers[1]},{servers[2]}"})
+    assert [reading["temperature"] for reading in response.json()] == [10.0, 12.0]
+
+    assert authenticated_client.get("/data/servers").status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    assert authenticated_client.get("/data", params={"server_ulid": servers[0], "server_ulids": servers[1]}).status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+@pytest.mark.parametrize("params", [
+    {"aggregation": "15x"},
+    {"aggregation": "1s", "start_time": "2025-10-01T00:00:00", "end_time": "2025-10-02T00:00:00"},
+    {"aggregation": "hour", "fill": "null"},
+    {"aggregation": "hour", "fill": "spline", "start_time": "2025-10-01T00:00:00", "end_time": "2025-10-02T00:00:00"},
+])
+def test_get_aggregated_by_interval_invalid(authenticated_client, db, params):
+    response = authenticated_client.get("/data", params=params)
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+@pytest.mark.parametrize("params", [
+    {"aggregation": "hour", "stats": "avg,p42"},
+    {"stats": "max"},
+])
+def test_get_aggregated_statistics_invalid(authenticated_client, db, params):
+    response = authenticated_client.get("/data", params=params)
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+
+def test_get_readings_paginated(authenticated_client, db):
+    response = authenticated_client.post("/servers", json={"server_name": "Dolly 1"})
+    server_ulid = response.json()["server_ulid"]
+
+    # Two readings share a timestamp, so the id breaks the tie between pages
+    timestamps = ["2025-10-01T12:00:03Z", "2025-10-01T12:00:01Z", "2025-10-01T12:00:02Z", "2025-10-01T12:00:02Z", "2025-10-01T12:00:00Z"]
+    authenticated_client.post("/data/batch", json=[
+        {"server_ulid": server_ulid, "temperature": float(index), "timestamp": timestamp}
+        for index, timestamp in enumerate(timestamps)
+    ])
+
+    pages = []
+    params = {"server_ulid": server_ulid, "limit": 2}
+    while True:
+        response = authenticated_client.get("/data", params=params)
+        assert response.status_code == status.HTTP_200_OK
+        pages.append(response.json())
+        if "X-Next-Cursor" not in response.headers:
+            break
+        params["cursor"] = response.headers["X-Next-Cursor"]
+
+    assert [len(page) for page in pages] == [2, 2, 1]
+    readings = [reading for page in pages for reading in page]
+    assert [reading["temperature"] for reading in readings] == [4.0, 1.0, 2.0, 3.0, 0.0]
+
+
+def test_get_readings_invalid_pagination(authenticated_client, db):
+    response = authenticated_client.get("/data", params={"cursor": "not-a-cursor"})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    response = authenticated_client.get("/data", params={"limit": 0})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+def test_post_reading_batch(authenticated_client, db):
+    response = authenticated_client.post("/servers", json={"server_name": "Dolly 1"})
+    server_ulid = response.json()["server_ulid"]
+
+    response = authenticated_client.post("/data/batch", json=[
+        {"server_ulid": server_ulid, "temperature": 25.5, "timestamp": "2025-10-01T12:00:00Z"},
+        {"server_ulid": server_ulid, "timestamp": "2025-10-01T12:00:01Z"},
+        {"server_ulid": "01HGYX7TBDFRX8HRJC5RF7Z3GY", "humidity": 50.0, "timestamp": "2025-10-01T12:00:02Z"},
+        {"server_ulid": server_ulid, "voltage": 220.0, "timestamp": "2025-10-01T12:00:03Z"}
+    ])
+
+    assert response.status_code == status.HTTP_201_CREATED
+    assert response.json()["accepted"] == 2
+    assert response.json()["rejected"] == 2
+    # Errors are reported by the position of the item in the request
+    assert [error["index"] for error in response.json()["errors"]] == [1, 2]
+    assert "not found" in response.json()["errors"][1]["detail"]
+
+    response = authenticated_client.get("/data", params={"server_ulid": server_ulid})
+    assert len(response.json()) == 2
+
+
+def test_post_reading_batch_too_large(authenticated_client, db, monkeypatch):
+    monkeypatch.setattr("services.reading_service.MAX_BATCH_SIZE", 1)
+
+    response = authenticated_client.post("/data/batch", json=[
+        {"server_ulid": "01HGYX7TBDFRX8HRJC5RF7Z3GY", "temperature": 25.5, "timestamp": "2025-10-01T12:00:00Z"},
+        {"server_ulid": "01HGYX7TBDFRX8HRJC5RF7Z3GY", "temperature": 25.6, "timestamp": "2025-10-01T12:00:01Z"}
+    ])
+
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    assert "Batch size cannot be greater than 1" in response.json()["detail"]
+
+
+def test_post_reading_buffered(authenticated_client, db):
+    response = authenticated_client.post("/servers", json={"server_name": "Dolly 1"})
+    server_ulid = response.json()["server_ulid"]
+
+    buffer = IngestBuffer(AsyncTestingSessionLocal, batch_size=2, flush_interval_ms=50, enabled=True)
+    app.dependency_overrides[get_ingest_buffer] = lambda: buffer
+    authenticated_client.portal.call(buffer.start)
+
+    try:
+        for second in range(3):
+            response = authenticated_client.post("/data", json={
+                "server_ulid": server_ulid,
+                "temperature": 25.5,
+                "timestamp": f"2025-10-01T12:00:0{second}Z"
+            })
+            assert response.status_code == status.HTTP_202_ACCEPTED
+            assert response.json()["server_ulid"] == server_ulid
+
+        # Unknown servers are refused before they reach the queue
+        response = authenticated_client.post("/data", json={
+            "server_ulid": "01HGYX7TBDFRX8HRJC5RF7Z3GY",
+            "temperature": 25.5,
+            "timestamp": "2025-10-01T12:00:03Z"
+        })
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+        # Stopping drains the queue before returning
+        authenticated_client.portal.call(buffer.stop)
+    finally:
+        app.dependency_overrides.pop(get_ingest_buffer)
+
+    response = authenticated_client.get("/data", params={"server_ulid": server_ulid})
+    assert len(response.json()) == 3
+
+    assert buffer.metrics.flushed_rows == 3
+    assert buffer.metrics.failed_rows == 0
+    assert buffer.metrics.enqueued == 3
+    assert buffer.metrics.flushes >= 2
+
+
+def test_ingest_buffer_backpressure(authenticated_client, db):
+    server_ulid = authenticated_client.post("/servers", json={"server_name": "Dolly 1"}).json()["server_ulid"]
+    buffer = IngestBuffer(AsyncTestingSessionLocal, max_size=1, put_timeout_ms=10, enabled=True)
+    reading = PostReading(server_ulid=server_ulid, temperature=25.5, timestamp="2025-10-01T12:00:00Z")
+
+    async def scenario():
+        # Nothing is flushing, so the second reading finds the queue full
+        await buffer.put(reading)
+        with pytest.raises(ServiceUnavailableException):
+            await buffer.put(reading)
+
+    # The server lookup runs on the loop of the client's database connections
+    authenticated_client.portal.call(scenario)
+
+    assert buffer.metrics.enqueued == 1
+    assert buffer.metrics.rejected == 1
+
+
+
+def test_ingest_buffer_forgets_deleted_servers(authenticated_client, db, monkeypatch):
+    server_ulid = authenticated_client.post("/servers", json={"server_name": "Dolly 1"}).json()["server_ulid"]
+    buffer = IngestBuffer(AsyncTestingSessionLocal, enabled=True)
+    monkeypatch.setattr(server_service, "ingest_buffer", buffer)
+    reading = PostReading(server_ulid=server_ulid, temperature=25.5, timestamp="2025-10-01T12:00:00Z")
+
+    async def scenario():
+        await buffer.put(reading)
+        async with AsyncTestingSessionLocal() as session:
+            assert await server_service.ServerService(session).delete_by_id(server_ulid)
+        # The deleted server isn't trusted anymore, so its readings are refused
+        with pytest.raises(NotFoundException):
+            await buffer.put(reading)
+
+    authenticated_client.portal.call(scenario)
+
+    assert buffer.metrics.enqueued == 1
+
+def test_import_readings_csv(authenticated_client, db):
+    response = authenticated_client.post("/servers", json={"server_name": "Dolly 1"})
+    server_ulid = response.json()["server_ulid"]
+
+    content = "\n".join([
+        "server_ulid,timestamp,temperature,humidity,voltage,current",
+        f"{server_ulid},2025-10-01T12:00:00Z,25.5,70.0,,",
+        f"{server_ulid},2025-10-01T12:00:01Z,,,,",
+        f"{server_ulid},2025-10-01T12:00:02Z,26.0,,220.0,1.0",
+        f"{server_ulid},2025-10-01T12:00:03Z,26.5,150.0,,",
+        "01HGYX7TBDFRX8HRJC5RF7Z3GY,2025-10-01T12:00:04Z,27.0,,,",
+    ])
+
+    response = authenticated_client.post(
+        "/data/import",
+        params={"format": "csv"},
+        files={"file": ("readings.csv", content, "text/csv")}
+    )
+
+    assert response.status_code == status.HTTP_201_CREATED
+    assert response.json()["accepted"] == 2
+    assert response.json()["rejected"] == 3
+    assert [error["index"] for error in response.json()["errors"]] == [1, 3, 4]
+
+    response = authenticated_client.get("/data", params={"server_ulid": server_ulid})
+    assert len(response.json()) == 2
+    assert response.json()[1]["voltage"] == 220.0
+
+
+def test_import_readings_ndjson(authenticated_client, db):
+    response = authenticated_client.post("/servers", json={"server_name": "Dolly 1"})
+    server_ulid = response.json()["server_ulid"]
+
+    content = "\n".join([
+        f'{{"server_ulid": "{server_ulid}", "timestamp": "2025-10-01T12:00:00Z", "temperature": 25.5}}',
+        "{not json",
+        "",
+        f'{{"server_ulid": "{server_ulid}", "timestamp": "2025-10-01T12:00:01Z", "current": 1.5}}',
+    ])
+
+    response = authenticated_client.post(
+        "/data/import",
+        params={"format": "ndjson"},
+        files={"file": ("readings.ndjson", content, "application/x-ndjson")}
+    )
+
+    assert response.status_code == status.HTTP_201_CREATED
+    assert response.json()["accepted"] == 2
+    assert response.json()["rejected"] == 1
+    assert "Invalid JSON" in response.json()["errors"][0]["detail"]
+
+
+def _export(authenticated_client, params):
+    # Small chunks, so the exports span several of them
+    chunk_size, ExportService.chunk_size = ExportService.chunk_size, 2
+    try:
+        return authenticated_client.get("/data/export", params=params)
+    finally:
+        ExportService.chunk_size = chunk_size
+
+
+def test_export_readings_ndjson(authenticated_client, db):
+    response = authenticated_client.post("/servers", json={"server_name": "Dolly 1"})
+    server_ulid = response.json()["server_ulid"]
+
+    authenticated_client.post("/data/batch", json=[
+        {"server_ulid": server_ulid, "temperature": 20.0 + second, "timestamp": f"2025-10-01T12:00:0{second}Z"}
+        for second in (4, 2, 0, 3, 1)
+    ])
+
+    response = _export(authenticated_client, {"server_ulid": server_ulid, "format": "ndjson"})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    # Rows of several chunks, still in timestamp order
+    assert [line["temperature"] for line in lines] == [20.0, 21.0, 22.0, 23.0, 24.0]
+    assert lines[0] == {
+        "server_ulid": server_ulid, "timestamp": "2025-10-01T12:00:00",
+        "temperature": 20.0, "humidity": None, "voltage": None, "current": None
+    }
+
+
+def test_export_readings_csv_sensor(authenticated_client, db):
+    response = authenticated_client.post("/servers", json={"server_name": "Dolly 1"})
+    server_ulid = response.json()["server_ulid"]
+
+    authenticated_client.post("/data", json={
+        "server_ulid": server_ulid, "temperature": 25.5, "humidity": 40.0, "timestamp": "2025-10-01T12:00:00Z"
+    })
+
+    response = _export(authenticated_client, {"sensor_type": "humidity", "format": "csv"})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("text/csv")
+    assert response.text.splitlines() == [
+        "server_ulid,timestamp,humidity",
+        f"{server_ulid},2025-10-01T12:00:00,40.0",
+    ]
+
+
+def test_export_readings_arrow(authenticated_client, db):
+    response = authenticated_client.post("/servers", json={"server_name": "Dolly 1"})
+    server_ulid = response.json()["server_ulid"]
+
+    authenticated_client.post("/data/batch", json=[
+        {"server_ulid": server_ulid, "temperature": 20.0 + second, "timestamp": f"2025-10-01T12:00:0{second}Z"}
+        for second in range(5)
+    ])
+
+    response = _export(authenticated_client, {"server_ulid": server_ulid, "format": "arrow"})
+
+    assert response.status_code == status.HTTP_200_OK
+    table = pa.ipc.open_stream(response.content).read_all()
+    assert table.column_names == ["server_ulid", "timestamp", "temperature", "humidity", "voltage", "current"]
+    assert table.column("temperature").to_pylist() == [20.0, 21.0, 22.0, 23.0, 24.0]
+    assert table.column("timestamp")[0].as_py() == datetime.datetime(2025, 10, 1, 12, 0)
+
+
+def test_export_aggregated_readings_parquet(authenticated_client, db):
+    server_ulid = _create_test_data_for_aggregations(authenticated_client)
+
+    response = _export(authenticated_client, {"server_ulid": server_ulid, "aggregation": "day", "format": "parquet"})
+
+    assert response.status_code == status.HTTP_200_OK
+    table = pq.read_table(io.BytesIO(response.content))
+    # Same sensor order as the raw exports
+    assert table.column_names == ["timestamp", "temperature", "humidity", "voltage", "current"]
+    assert table.column("timestamp").to_pylist() == [datetime.datetime(2025, 10, day) for day in (1, 2)]
+
+    for params in ({"aggregation": "day", "stats": "avg"}, {"start_time": "2025-10-01T00:00:00", "max_points": 10, "downsample": "lttb"}):
+        response = _export(authenticated_client, {"server_ulid": server_ulid, "format": "parquet", **params})
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+def test_max_points_picks_the_aggregation(authenticated_client, db):
+    response = authenticated_client.post("/servers", json={"server_name": "Dolly 1"})
+    server_ulid = response.json()["server_ulid"]
+    authenticated_client.post("/data/batch", json=[
+        {"server_ulid": server_ulid, "temperature": float(minute), "timestamp": f"2025-10-01T12:{minute:02d}:00Z"}
+        for minute in range(60)
+    ])
+
+    response = authenticated_client.get("/data", params={
+        "server_ulid": server_ulid, "sensor_type": "temperature", "max_points": 6,
+        "start_time": "2025-10-01T12:00:00", "end_time": "2025-10-01T12:59:59"
+    })
+
+    # One hour in at most 6 points gives 10 minute buckets
+    assert response.status_code == status.HTTP_200_OK
+    assert [reading["temperature"] for reading in response.json()] == [4.5, 14.5, 24.5, 34.5, 44.5, 54.5]
+
+    response = authenticated_client.get("/data", params={"server_ulid": server_ulid, "max_points": 6, "aggregation": "hour", "start_time": "2025-10-01T12:00:00"})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+def test_lttb_downsampling_keeps_spikes(authenticated_client, db):
+    response = authenticated_client.post("/servers", json={"server_name": "Dolly 1"})
+    server_ulid = response.json()["server_ulid"]
+    readings = [
+        {"server_ulid": server_ulid, "temperature": 80.0 if second == 37 else 20.0, "humidity": 50.0,
+         "timestamp": f"2025-10-01T12:{second // 60:02d}:{second % 60:02d}Z"}
+        for second in range(100)
+    ]
+    authenticated_client.post("/data/batch", json=readings)
+
+    response = authenticated_client.get("/data", params={
+        "server_ulid": server_ulid, "max_points": 10, "downsample": "lttb",
+        "start_time": "2025-10-01T12:00:00", "end_time": "2025-10-01T13:00:00"
+    })
+
+    assert response.status_code == status.HTTP_200_OK
+    temperatures = [reading for reading in response.json() if "temperature" in reading]
+    assert len(temperatures) == 10
+    assert max(reading["temperature"] for reading in temperatures) == 80.0
+    assert temperatures[0]["timestamp"] == "2025-10-01T12:00:00"
+    assert temperatures[-1]["timestamp"] == "2025-10-01T12:01:39"
+    assert len([reading for reading in response.json() if "humidity" in reading]) == 10
+
+
+def test_reading_json_matches_response_models():
+    from cli.benchmark_serialization import run
+
+    # The benchmark fails when the direct encoding differs from the response models
+    assert set(run(rows=200, repeat=1)) == {"raw", "raw sensor_type", "aggregated", "stats"}
+
+
+def test_query_readings_schema_is_documented():
+    schema = app.openapi()["paths"]["/data"]["get"]["responses"]["200"]["content"]["application/json"]["schema"]
+    assert schema == {"type": "array", "items": {"$ref": "#/components/schemas/ReadingResponse"}, "title": "Response Query Readings Data Get"}
+
+
+def test_sensor_type_projects_the_query(authenticated_client, db):
+    response = authenticated_client.post("/servers", json={"server_name": "Dolly 1"})
+    server_ulid = response.json()["server_ulid"]
+    authenticated_client.post("/data/batch", json=[
+        {"server_ulid": server_ulid, "temperature": 20.0, "humidity": 40.0, "timestamp": "2025-10-01T12:00:00Z"},
+        {"server_ulid": server_ulid, "temperature": 21.0, "timestamp": "2025-10-01T12:00:10Z"},
+        {"server_ulid": server_ulid, "voltage": 220.0, "timestamp": "2025-10-01T13:00:00Z"},
+    ])
+
+    query = ReadingRepository(db)._select_by_criteria(GetReadingParams(sensor_type="humidity"))
+    assert [column.name for column in query.selected_columns] == ["id", "server_ulid", "timestamp", "humidity"]
+
+    # Readings without the sensor are left out instead of returned empty
+    response = authenticated_client.get("/data", params={"server_ulid": server_ulid, "sensor_type": "humidity"})
+    assert response.json() == [{"server_ulid": server_ulid, "humidity": 40.0, "timestamp": "2025-10-01T12:00:00"}]
+
+    response = authenticated_client.get("/data", params={"server_ulid": server_ulid, "sensor_type": "temperature", "aggregation": "hour"})
+    assert response.json() == [{"temperature": 20.5, "timestamp": "2025-10-01T12:00:00"}]
+
+
+@pytest.mark.asyncio
+async def test_reading_broker_filters_and_drops():
+    broker = ReadingBroker(LocalChannel(), queue_size=2)
+    await broker.start()
+    timestamp = datetime.datetime(2025, 10, 1, 12, 0)
+    temperature = broker.subscribe(("A",), "temperature")
+    events = broker.stream(("A", "B"))
+    # The stream subscribes once its body starts
+    assert "B" not in broker._subscriptions
+    pending = asyncio.ensure_future(anext(events))
+    await asyncio.sleep(0)
+    [everything] = broker._subscriptions["B"]
+
+    broker.publish([
+        Reading(server_ulid="A", timestamp=timestamp, temperature=20.0, humidity=50.0),
+        Reading(server_ulid="A", timestamp=timestamp, humidity=51.0),
+        Reading(server_ulid="C", timestamp=timestamp, humidity=52.0),
+    ])
+    assert temperature.queue.get_nowait() == (
+        b'event: reading\ndata: {"server_ulid":"A","temperature":20.0,"timestamp":"2025-10-01T12:00:00"}\n\n'
+    )
+    assert temperature.queue.empty()
+    assert everything.queue.qsize() == 2
+
+    # The full queue drops its oldest reading instead of blocking the publisher
+    broker.publish([Reading(server_ulid="B", timestamp=timestamp, voltage=220.0)])
+    assert await pending == b'event: dropped\ndata: {"count":1}\n\n'
+    assert b'"humidity":51.0' in await anext(events)
+    assert b'"voltage":220.0' in await anext(events)
+
+    await events.aclose()
+    broker.unsubscribe(temperature)
+    assert not broker._subscriptions
+    await broker.stop()
+
+
+def test_submitted_readings_are_published(authenticated_client, db):
+    server_ulid = authenticated_client.post("/servers", json={"server_name": "Dolly 1"}).json()["server_ulid"]
+    subscription = reading_broker.subscribe((server_ulid,), "temperature")
+    try:
+        authenticated_client.post("/data", json={"server_ulid": server_ulid, "temperature": 20.0, "timestamp": "2025-10-01T12:00:00"})
+        authenticated_client.post("/data/batch", json=[
+            {"server_ulid": server_ulid, "humidity": 50.0, "timestamp": "2025-10-01T12:00:01"},
+            {"server_ulid": server_ulid, "temperature": 21.0, "timestamp": "2025-10-01T12:00:02"},
+        ])
+        temperatures = []
+        while not subscription.queue.empty():
+            temperatures.append(json.loads(subscription.queue.get_nowait().split(b"data: ")[1])["temperature"])
+        assert temperatures == [20.0, 21.0]
+    finally:
+        reading_broker.unsubscribe(subscription)
+
+    response = authenticated_client.get("/data/stream", params={"server_ulid": "01HGYX7TBDFRX8HRJC5RF7Z3GY"})
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    response = authenticated_client.get("/data/servers", params={"server_ulids": "01HGYX7TBDFRX8HRJC5RF7Z3GY", "aggregation": "hour"})
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_stream_without_servers_is_not_found(authenticated_client, db):
+    # Nothing would ever be sent on it
+    assert authenticated_client.get("/data/stream").status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_postgres_channel_notifies_only_while_listened():
+    channel = PostgresChannel("postgresql://unused", presence_s=10)
+    broker = ReadingBroker(channel)
+    timestamp = datetime.datetime(2025, 10, 1, 12, 0)
+
+    broker.publish([Reading(server_ulid="A", timestamp=timestamp, temperature=20.0)])
+    assert channel._pending.empty()
+
+    # Another worker has subscribers
+    channel._on_presence(None, 0, channel.presence_channel, json.dumps({"worker": "other", "listening": True, "probe": False}))
+    broker.publish([Reading(server_ulid="A", timestamp=timestamp, temperature=20.0)])
+    assert channel._pending.qsize() == 1
+
+    channel._on_presence(None, 0, channel.presence_channel, json.dumps({"worker": "other", "listening": False, "probe": False}))
+    broker.publish([Reading(server_ulid="A", timestamp=timestamp, temperature=20.0)])
+    assert channel._pending.qsize() == 1
+
+    # This worker's own subscribers
+    subscription = broker.subscribe(("B",))
+    broker.publish([Reading(server_ulid="A", timestamp=timestamp, temperature=20.0)])
+    assert channel._pending.qsize() == 2
+    broker.unsubscribe(subscription)
+    assert not channel.listened()
+
+
+def test_notify_payloads_stay_under_the_limit():
+    items = [{"server_ulid": "01HGYX7TBDFRX8HRJC5RF7Z3GY", "temperature": float(i), "timestamp": "2025-10-01T12:00:00"}
+             for i in range(500)]
+
+    payloads = list(PostgresChannel._payloads(items))
+
+    assert len(payloads) > 1
+    assert all(len(payload.encode()) < NOTIFY_MAX_BYTES for payload in payloads)
+    assert [item for payload in payloads for item in json.loads(payload)] == items
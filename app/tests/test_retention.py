@@ -0,0 +1,60 @@
+import datetime
+from sqlalchemy import func, select
+from core import retention
+from core.retention import RetentionPolicy
+from models.reading import Reading
+from models.reading_rollup import ReadingRollupMinute
+from services.retention_service import RetentionService
+
+
+def _post_readings(client):
+    response = client.post("/servers", json={"server_name": "Dolly 1"})
+    server_ulid = response.json()["server_ulid"]
+    client.post("/data/batch", json=[
+        {"server_ulid": server_ulid, "temperature": 20.0, "timestamp": "2025-10-01T12:00:10Z"},
+        {"server_ulid": server_ulid, "temperature": 30.0, "timestamp": "2025-10-01T12:00:40Z"},
+        {"server_ulid": server_ulid, "temperature": 25.0, "timestamp": "2025-10-01T12:05:00Z"},
+        {"server_ulid": server_ulid, "temperature": 21.0, "timestamp": "2025-10-10T09:00:00Z"},
+    ])
+    return server_ulid
+
+
+def test_retention_downsamples_expired_readings(authenticated_client, db):
+    server_ulid = _post_readings(authenticated_client)
+    now = datetime.datetime(2025, 10, 12, 15, 0)
+
+    report = RetentionService(db, RetentionPolicy(raw_days=5)).apply(now)
+
+    assert report.deleted_readings == 3
+    assert db.execute(select(func.count(Reading.id))).scalar() == 1
+    # The expired readings live on in the rollups
+    minute = db.get(ReadingRollupMinute, (server_ulid, datetime.datetime(2025, 10, 1, 12, 0)))
+    assert (minute.temperature_sum, minute.temperature_count) == (50.0, 2)
+
+    report = RetentionService(db, RetentionPolicy(raw_days=5, minute_days=5)).apply(now)
+
+    assert report.deleted_buckets["minute"] == 2
+    assert db.execute(select(func.min(ReadingRollupMinute.bucket))).scalar() == datetime.datetime(2025, 10, 10, 9, 0)
+
+
+def test_expired_range_served_from_rollups(authenticated_client, db, monkeypatch):
+    server_ulid = _post_readings(authenticated_client)
+    cutoff = datetime.datetime(2025, 10, 7)
+    monkeypatch.setattr(retention, "retention_policy", RetentionPolicy(raw_days=(datetime.datetime.now() - cutoff).days))
+    RetentionService(db, retention.retention_policy).apply()
+
+    # The first page ends inside the minute rollups, the second one crosses into the raw readings
+    response = authenticated_client.get("/data", params={"server_ulid": server_ulid, "limit": 1})
+    assert response.json() == [{"server_ulid": server_ulid, "timestamp": "2025-10-01T12:00:00", "temperature": 25.0}]
+
+    response = authenticated_client.get(
+        "/data", params={"server_ulid": server_ulid, "limit": 2, "cursor": response.headers["X-Next-Cursor"]}
+    )
+    assert [reading["temperature"] for reading in response.json()] == [25.0, 21.0]
+    assert [reading["timestamp"] for reading in response.json()] == ["2025-10-01T12:05:00", "2025-10-10T09:00:00"]
+    assert "X-Next-Cursor" not in response.headers
+
+    response = authenticated_client.get(
+        "/data", params={"server_ulid": server_ulid, "aggregation": "hour", "start_time": "2025-10-01T00:00:00"}
+    )
+    assert [reading["temperature"] for reading in response.json()] == [25.0, 21.0]
@@ -0,0 +1,124 @@
+import datetime
+from fastapi import status
+from sqlalchemy import delete, select
+from models.reading_rollup import ReadingRollupMinute, ReadingRollupHour, ReadingRollupDay
+from core.enums import AggregationType
+from repository.rollup_repository import ReadingRollupRepository
+from services.rollup_backfill import RollupBackfillJob
+from utils.rollup_utils import rollup_rows
+
+from .conftest import TestingSessionLocal
+
+
+def _rollup_rows(db, model):
+    return [
+        tuple(row) for row in db.execute(
+            select(*model.__table__.columns).order_by(model.server_ulid, model.bucket)
+        ).all()
+    ]
+
+
+def test_rollups_match_rebuild(authenticated_client, db):
+    response = authenticated_client.post("/servers", json={"server_name": "Dolly 1"})
+    server_ulid = response.json()["server_ulid"]
+
+    # Out of order readings through the ORM (single and batch) and through the bulk import
+    authenticated_client.post("/data", json={"server_ulid": server_ulid, "temperature": 30.0, "timestamp": "2025-10-02T08:00:00Z"})
+    authenticated_client.post("/data/batch", json=[
+        {"server_ulid": server_ulid, "temperature": 20.0, "humidity": 50.0, "timestamp": "2025-10-01T12:00:10Z"},
+        {"server_ulid": server_ulid, "temperature": 22.0, "timestamp": "2025-10-01T12:00:40Z"},
+    ])
+    authenticated_client.post(
+        "/data/import",
+        params={"format": "csv"},
+        files={"file": ("readings.csv", "\n".join([
+            "server_ulid,timestamp,temperature,humidity,voltage,current",
+            f"{server_ulid},2025-10-01T12:00:50Z,18.0,,220.0,",
+            f"{server_ulid},2025-10-01T13:30:00Z,25.0,,,",
+        ]), "text/csv")}
+    )
+
+    minute = db.get(ReadingRollupMinute, (server_ulid, datetime.datetime(2025, 10, 1, 12, 0)))
+    assert (minute.temperature_sum, minute.temperature_count) == (60.0, 3)
+    assert (minute.temperature_min, minute.temperature_max) == (18.0, 22.0)
+    assert (minute.humidity_count, minute.voltage_count, minute.current_count) == (1, 1, 0)
+    assert minute.current_min is None
+
+    day = db.get(ReadingRollupDay, (server_ulid, datetime.datetime(2025, 10, 1)))
+    assert day.temperature_count == 4
+
+    models = (ReadingRollupMinute, ReadingRollupHour, ReadingRollupDay)
+    maintained = {model: _rollup_rows(db, model) for model in models}
+
+    days = ReadingRollupRepository(db).rebuild(datetime.datetime(2025, 10, 1), datetime.datetime(2025, 10, 2, 8))
+
+    assert days == 2
+    for model in models:
+        assert _rollup_rows(db, model) == maintained[model]
+
+
+def test_aggregation_with_partial_buckets(authenticated_client, db):
+    response = authenticated_client.post("/servers", json={"server_name": "Dolly 1"})
+    server_ulid = response.json()["server_ulid"]
+
+    authenticated_client.post("/data/batch", json=[
+        {"server_ulid": server_ulid, "temperature": temperature, "timestamp": f"2025-10-01T12:{time}Z"}
+        for time, temperature in [("00:05", 100.0), ("00:30", 10.0), ("01:10", 20.0), ("01:50", 30.0), ("02:20", 40.0), ("02:40", 100.0)]
+    ])
+
+    # 12:00 and 12:02 are only partially inside the range, 12:01 comes from the rollup
+    response = authenticated_client.get("/data", params={
+        "server_ulid": server_ulid,
+        "aggregation": "minute",
+        "start_time": "2025-10-01T12:00:15Z",
+        "end_time": "2025-10-01T12:02:30Z",
+    })
+
+    assert response.status_code == status.HTTP_200_OK
+    assert [(entry["timestamp"], entry["temperature"]) for entry in response.json()] == [
+        ("2025-10-01T12:00:00", 10.0),
+        ("2025-10-01T12:01:00", 25.0),
+        ("2025-10-01T12:02:00", 40.0),
+    ]
+
+
+def test_rollup_rows_are_sorted_by_server_and_bucket():
+    timestamp = datetime.datetime(2025, 10, 1, 12, 0)
+    readings = [
+        {"server_ulid": server_ulid, "timestamp": timestamp + datetime.timedelta(minutes=minutes),
+         "temperature": 20.0, "humidity": None, "voltage": None, "current": None}
+        for server_ulid, minutes in (("B", 1), ("A", 2), ("B", 0), ("A", 0))
+    ]
+
+    rows = rollup_rows(readings, AggregationType.MINUTE)
+
+    assert [(row["server_ulid"], row["bucket"].minute) for row in rows] == [("A", 0), ("A", 2), ("B", 0), ("B", 1)]
+
+
+def test_backfill_fills_rollups_missing_readings(authenticated_client, db):
+    response = authenticated_client.post("/servers", json={"server_name": "Dolly 1"})
+    server_ulid = response.json()["server_ulid"]
+    authenticated_client.post("/data/batch", json=[
+        {"server_ulid": server_ulid, "temperature": 20.0, "timestamp": "2025-10-01T12:00:10Z"},
+        {"server_ulid": server_ulid, "temperature": 22.0, "timestamp": "2025-10-02T08:00:00Z"},
+        {"server_ulid": server_ulid, "temperature": 24.0, "timestamp": "2025-10-03T08:00:00Z"},
+    ])
+    models = (ReadingRollupMinute, ReadingRollupHour, ReadingRollupDay)
+    maintained = {model: _rollup_rows(db, model) for model in models}
+    job = RollupBackfillJob(TestingSessionLocal)
+
+    assert job.run_once() == 0
+
+    # Readings written before the rollups existed, then an interrupted backfill that only did the newest day
+    for model in models:
+        db.execute(delete(model).where(model.bucket < datetime.datetime(2025, 10, 3)))
+    db.commit()
+    assert ReadingRollupRepository(db).find_backfill_range() == (
+        datetime.datetime(2025, 10, 1, 12, 0, 10), datetime.datetime(2025, 10, 3)
+    )
+
+    assert job.run_once() == 3
+    db.expire_all()
+    for model in models:
+        assert _rollup_rows(db, model) == maintained[model]
+    assert ReadingRollupRepository(db).find_backfill_range() is None
@@ -1,8 +1,13 @@
-from datetime import datetime
+import asyncio
+from datetime import datetime, timedelta
+import orjson
 import pytest
+from models.server import Server
+from repository.server_repository import build_last_seen_statement
+from services.health_monitor import HealthMonitor
 from services.server_service import ServerService
 
-from .conftest import _create_test_data_for_aggregations
+from .conftest import AsyncTestingSessionLocal, _create_test_data_for_aggregations
 
 
 def test_post_empty_server_name(authenticated_client, db):
@@ -58,16 +63,17 @@ def test_get_health_all_not_logged_in(authenticated_client, db):
     response = authenticated_client.get("/health/all")
     assert response.status_code == 401
 
-def test_find_server_by_ulid(authenticated_client, db):
+@pytest.mark.asyncio
+async def test_find_server_by_ulid(authenticated_client, async_db):
     response = authenticated_client.post("/servers", json={
         "server_name": "Dolly 1"
     })
     
     server_ulid = response.json()["server_ulid"]
     
-    server_service = ServerService(db)
+    server_service = ServerService(async_db)
 
-    server = server_service.find_by_id(server_ulid)
+    server = await server_service.find_by_id(server_ulid)
     
     assert server.server_name == "Dolly 1"
     assert server.id == server_ulid
@@ -129,4 +135,136 @@ def test_offline_server_after_ten_seconds(authenticated_client, db):
     response = authenticated_client.get(f"/health/{server_ulid}")
     
     assert response.status_code == 200
-    assert response.json()["status"] == "offline"
\ No newline at end of file
+    assert response.json()["status"] == "offline"
+
+def test_last_seen_is_monotonic_and_throttled(authenticated_client, db):
+    response = authenticated_client.post("/servers", json={"server_name": "Dolly 1"})
+    server_ulid = response.json()["server_ulid"]
+
+    def post(timestamp):
+        authenticated_client.post("/data", json={"server_ulid": server_ulid, "temperature": 20.0, "timestamp": timestamp})
+        db.expire_all()
+        return db.get(Server, server_ulid).last_seen_at
+
+    assert post("2025-10-01T12:00:00Z") == datetime(2025, 10, 1, 12, 0)
+    # A late reading doesn't move it back, a reading within the throttle interval isn't written
+    assert post("2025-10-01T11:00:00Z") == datetime(2025, 10, 1, 12, 0)
+    assert post("2025-10-01T12:00:00.500000Z") == datetime(2025, 10, 1, 12, 0)
+    assert post("2025-10-01T12:00:02Z") == datetime(2025, 10, 1, 12, 0, 2)
+
+
+
+def test_rolled_back_last_seen_does_not_throttle(authenticated_client, db):
+    response = authenticated_client.post("/servers", json={"server_name": "Dolly 1"})
+    server_ulid = response.json()["server_ulid"]
+    readings = [{"server_ulid": server_ulid, "timestamp": datetime(2025, 10, 1, 12, 0)}]
+
+    db.execute(build_last_seen_statement(readings, db))
+    db.rollback()
+    # Nothing reached the database, so the same reading is written again
+    db.execute(build_last_seen_statement(readings, db))
+    db.commit()
+
+    assert db.get(Server, server_ulid).last_seen_at == datetime(2025, 10, 1, 12, 0)
+    assert build_last_seen_statement(readings, db) is None
+
+def test_get_health_by_id_without_readings(authenticated_client, db):
+    response = authenticated_client.post("/servers", json={"server_name": "Dolly 1"})
+    server_ulid = response.json()["server_ulid"]
+
+    response = authenticated_client.get(f"/health/{server_ulid}")
+    assert response.json()["status"] == "offline"
+
+    response = authenticated_client.get("/health/01HGYX7TBDFRX8HRJC5RF7Z3GY")
+    assert response.status_code == 404
+
+
+def test_fleet_health_summary(authenticated_client, db):
+    now = datetime.now().replace(microsecond=0)
+    ulids = []
+    for index in range(3):
+        response = authenticated_client.post("/servers", json={"server_name": f"Dolly {index}"})
+        ulids.append(response.json()["server_ulid"])
+    ulids.sort()
+    authenticated_client.post("/data", json={"server_ulid": ulids[0], "temperature": 20.0, "timestamp": now.isoformat()})
+    authenticated_client.post("/data", json={"server_ulid": ulids[1], "temperature": 20.0, "timestamp": "2025-10-01T12:00:00"})
+
+    response = authenticated_client.get("/health/summary", params={"limit": 2})
+    body = response.json()
+    assert (body["online"], body["offline"]) == (1, 2)
+    assert [server["server_ulid"] for server in body["servers"]] == ulids[:2]
+    assert body["servers"][0]["changed_at"] == now.isoformat()
+    assert body["servers"][1]["changed_at"] == "2025-10-01T12:00:10"
+
+    response = authenticated_client.get("/health/summary", params={"limit": 2, "cursor": response.headers["X-Next-Cursor"]})
+    assert [server["server_ulid"] for server in response.json()["servers"]] == ulids[2:]
+    assert response.json()["servers"][0]["changed_at"] is None
+    assert "X-Next-Cursor" not in response.headers
+
+    response = authenticated_client.get("/health/summary", params={"status": "offline", "changed_since": "2025-10-01T00:00:00"})
+    assert [server["server_ulid"] for server in response.json()["servers"]] == [ulids[1]]
+
+    assert authenticated_client.get("/health/summary", params={"status": "idle"}).status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_health_monitor_pushes_transitions(authenticated_client, db):
+    now = datetime.now().replace(microsecond=0)
+    server_ulid = authenticated_client.post("/servers", json={"server_name": "Dolly 1"}).json()["server_ulid"]
+    user_id = db.get(Server, server_ulid).created_by
+    authenticated_client.post("/data", json={"server_ulid": server_ulid, "temperature": 20.0, "timestamp": now.isoformat()})
+
+    # The database is only read by the first evaluation, later readings come from the commits
+    monitor = HealthMonitor(AsyncTestingSessionLocal, refresh_s=3600)
+    events = monitor.stream(user_id)
+    # A stream whose body never started holds no subscription
+    assert not monitor._subscriptions
+    pending = asyncio.ensure_future(anext(events))
+    await asyncio.sleep(0)
+    other_subscription = monitor.subscribe(user_id + 1)
+
+    # The first evaluation only records the statuses
+    assert await monitor.tick(now) == 0
+    assert await monitor.tick(now + timedelta(seconds=5)) == 0
+
+    assert await monitor.tick(now + timedelta(seconds=11)) == 1
+    event = await pending
+    assert event.startswith(b"event: status\ndata: ")
+    assert orjson.loads(event[len(b"event: status\ndata: "):]) == {
+        "server_ulid": server_ulid,
+        "server_name": "Dolly 1",
+        "status": "offline",
+        "changed_at": (now + timedelta(seconds=10)).isoformat(),
+    }
+
+    later = now + timedelta(seconds=30)
+    authenticated_client.post("/data", json={"server_ulid": server_ulid, "temperature": 20.0, "timestamp": later.isoformat()})
+    assert await monitor.tick(later + timedelta(seconds=1)) == 1
+    assert orjson.loads((await anext(events)).split(b"data: ")[1])["status"] == "online"
+    assert other_subscription.queue.empty()
+
+    await events.aclose()
+    monitor.unsubscribe(other_subscription)
+    assert not monitor._servers
+    assert monitor.observe not in monitor.throttle.observers
+
+
+@pytest.mark.asyncio
+async def test_health_monitor_reseeds_after_idle(authenticated_client, db):
+    now = datetime.now().replace(microsecond=0)
+    server_ulid = authenticated_client.post("/servers", json={"server_name": "Dolly 1"}).json()["server_ulid"]
+    user_id = db.get(Server, server_ulid).created_by
+    authenticated_client.post("/data", json={"server_ulid": server_ulid, "temperature": 20.0, "timestamp": now.isoformat()})
+
+    monitor = HealthMonitor(AsyncTestingSessionLocal)
+    subscription = monitor.subscribe(user_id)
+    assert await monitor.tick(now) == 0
+    # An evaluation still running when the last stream closes doesn't keep its statuses
+    monitor.unsubscribe(subscription)
+    assert await monitor.tick(now) == 0
+    assert not monitor._servers
+
+    # The server went offline while nobody watched, the new stream isn't sent that stale change
+    subscription = monitor.subscribe(user_id)
+    assert await monitor.tick(now + timedelta(minutes=5)) == 0
+    assert subscription.queue.empty()
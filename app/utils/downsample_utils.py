@@ -0,0 +1,71 @@
+from typing import Sequence
+import numpy as np
+"""
+This module downsamples series of readings with Largest-Triangle-Three-Buckets
+(LTTB): of each bucket it keeps the point forming the largest triangle with the
+point kept before it and the average of the next bucket, so spikes survive
+while the number of points is bounded
+"""
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Indices of the points kept from the (x, y) series ordered by x, the first and last included"""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # threshold - 2 buckets between the first and the last point, each with at least one point
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    starts, ends = edges[:-1], edges[1:]
+
+    # Averages of every bucket at once from the cumulative sums
+    cumulative_x = np.concatenate(([0.0], np.cumsum(x)))
+    cumulative_y = np.concatenate(([0.0], np.cumsum(y)))
+    sizes = ends - starts
+    next_x = np.append(((cumulative_x[ends] - cumulative_x[starts]) / sizes)[1:], x[-1])
+    next_y = np.append(((cumulative_y[ends] - cumulative_y[starts]) / sizes)[1:], y[-1])
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    # Each choice depends on the previous one, only the buckets are walked in Python
+    for bucket, (start, end) in enumerate(zip(starts, ends)):
+        areas = np.abs(
+            (x[a] - next_x[bucket]) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (next_y[bucket] - y[a])
+        )
+        a = start + int(np.argmax(areas))
+        selected[bucket + 1] = a
+    return selected
+
+
+def downsample_columns(servers: np.ndarray, timestamps: np.ndarray, values: dict[str, np.ndarray],
+                       max_points: int) -> list[dict]:
+    """Rows kept by LTTB in each (server, sensor) series, as dicts of server_ulid, timestamp and sensors.
+
+    The columns are non empty and ordered by timestamp, None sensor values being NaN. A row
+    kept for some sensors only carries the values of those sensors.
+    """
+    x = (timestamps - timestamps[0]).astype(np.float64)
+    kept = {sensor: np.zeros(len(timestamps), dtype=bool) for sensor in values}
+
+    for server in np.unique(servers):
+        rows = np.flatnonzero(servers == server)
+        for sensor, column in values.items():
+            series = rows[~np.isnan(column[rows])]
+            kept[sensor][series[lttb_indices(x[series], column[series], max_points)]] = True
+
+    result = []
+    for index in np.flatnonzero(np.logical_or.reduce(list(kept.values()))):
+        row = {"server_ulid": servers[index], "timestamp": timestamps[index].astype(object)}
+        for sensor, column in values.items():
+            row[sensor] = float(column[index]) if kept[sensor][index] else None
+        result.append(row)
+    return result
+
+
+def to_columns(rows: Sequence[Sequence], sensors: Sequence[str]) -> tuple[np.ndarray, np.ndarray, dict[str, np.ndarray]]:
+    """(server_ulid, timestamp, *sensors) rows as column arrays, None values as NaN"""
+    servers = np.array([row[0] for row in rows], dtype=object)
+    timestamps = np.array([row[1] for row in rows], dtype="datetime64[us]")
+    values = {sensor: np.array([row[2 + i] for row in rows], dtype=np.float64) for i, sensor in enumerate(sensors)}
+    return servers, timestamps, values
@@ -0,0 +1,140 @@
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Any, Sequence
+import pyarrow as pa
+import pyarrow.parquet as pq
+from core.enums import ExportFormat
+"""
+This module encodes plain result rows of an export, a whole chunk of rows
+becomes a single block of bytes so no per-row objects are built
+"""
+
+ARROW_TYPES = {
+    "server_ulid": pa.string(),
+    "timestamp": pa.timestamp("us"),
+}
+
+def _json_default(value: Any):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class ExportEncoder:
+    """Turns chunks of rows into bytes: `begin` once, `encode` per chunk and `finish` once"""
+
+    def __init__(self, columns: Sequence[str]):
+        self.columns = tuple(columns)
+
+    def begin(self) -> bytes:
+        return b""
+
+    def encode(self, rows: Sequence[Sequence[Any]]) -> bytes:
+        raise NotImplementedError
+
+    def finish(self) -> bytes:
+        return b""
+
+
+class CSVEncoder(ExportEncoder):
+    def begin(self) -> bytes:
+        return self._write([self.columns])
+
+    def encode(self, rows: Sequence[Sequence[Any]]) -> bytes:
+        return self._write(
+            [value.isoformat() if isinstance(value, datetime) else value for value in row]
+            for row in rows
+        )
+
+    @staticmethod
+    def _write(rows) -> bytes:
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator="\n").writerows(rows)
+        return buffer.getvalue().encode()
+
+
+class NDJSONEncoder(ExportEncoder):
+    def encode(self, rows: Sequence[Sequence[Any]]) -> bytes:
+        return "".join(
+            json.dumps(dict(zip(self.columns, row)), default=_json_default, separators=(",", ":")) + "\n"
+            for row in rows
+        ).encode()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands over what was written since the last drain.
+
+    The position keeps growing across drains, Parquet relies on it for the
+    offsets written in the footer.
+    """
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class ArrowEncoder(ExportEncoder):
+    """Arrow IPC stream, one record batch per chunk"""
+
+    def __init__(self, columns: Sequence[str]):
+        super().__init__(columns)
+        self.schema = pa.schema([(column, ARROW_TYPES.get(column, pa.float64())) for column in self.columns])
+        self._sink = _ChunkSink()
+        self._writer = None
+
+    def _open_writer(self):
+        return pa.ipc.new_stream(self._sink, self.schema)
+
+    def begin(self) -> bytes:
+        self._writer = self._open_writer()
+        return self._sink.drain()
+
+    def encode(self, rows: Sequence[Sequence[Any]]) -> bytes:
+        # Transpose the chunk once and build each column straight from the values
+        values = list(zip(*rows))
+        batch = pa.record_batch(
+            [pa.array(column, type=field.type) for column, field in zip(values, self.schema)],
+            schema=self.schema
+        )
+        self._writer.write_batch(batch)
+        return self._sink.drain()
+
+    def finish(self) -> bytes:
+        self._writer.close()
+        return self._sink.drain()
+
+
+class ParquetEncoder(ArrowEncoder):
+    """Parquet file, one row group per chunk and the footer at the end"""
+
+    def _open_writer(self):
+        return pq.ParquetWriter(self._sink, self.schema)
+
+
+ENCODERS = {
+    ExportFormat.CSV: CSVEncoder,
+    ExportFormat.NDJSON: NDJSONEncoder,
+    ExportFormat.ARROW: ArrowEncoder,
+    ExportFormat.PARQUET: ParquetEncoder,
+}
+
+def build_encoder(export_format: ExportFormat, columns: Sequence[str]) -> ExportEncoder:
+    return ENCODERS[export_format](columns)
@@ -0,0 +1,69 @@
+import hashlib
+import json
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Mapping
+"""
+This module builds the validators of conditional GET requests (ETag and
+Last-Modified) and evaluates If-None-Match and If-Modified-Since against them.
+Naive datetimes are taken as UTC, like everywhere else in the API
+"""
+
+def compute_etag(payload: Any) -> str:
+    """Strong entity tag of a JSON serializable description of the result"""
+    digest = hashlib.sha256(json.dumps(payload, separators=(",", ":"), default=str).encode()).hexdigest()
+    return f'"{digest[:32]}"'
+
+def format_http_date(value: datetime) -> str:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+def parse_http_date(value: str) -> datetime | None:
+    """Naive UTC datetime of an HTTP date, None when it can't be parsed"""
+    try:
+        parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison of If-None-Match, as RFC 9110 requires for GET"""
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (candidate.strip() for candidate in if_none_match.split(","))
+    return etag.removeprefix("W/") in (candidate.removeprefix("W/") for candidate in candidates)
+
+
+@dataclass(frozen=True)
+class ResultValidator:
+    """Validators and caching hints of a query result"""
+    etag: str
+    last_modified: datetime | None = None
+    max_age: int | None = None  # Only set for results that can no longer change
+
+    def headers(self) -> dict[str, str]:
+        headers = {"ETag": self.etag, "Vary": "Authorization"}
+        if self.last_modified is not None:
+            headers["Last-Modified"] = format_http_date(self.last_modified)
+        if self.max_age is not None:
+            headers["Cache-Control"] = f"max-age={self.max_age}, s-maxage={self.max_age}"
+        else:
+            headers["Cache-Control"] = "no-cache"
+        return headers
+
+    def not_modified(self, request_headers: Mapping[str, str]) -> bool:
+        """Whether the client copy is current, If-Modified-Since is ignored when If-None-Match is sent"""
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match is not None:
+            return etag_matches(if_none_match, self.etag)
+
+        if_modified_since = request_headers.get("if-modified-since")
+        if if_modified_since is None or self.last_modified is None:
+            return False
+        since = parse_http_date(if_modified_since)
+        # HTTP dates have a resolution of one second
+        return since is not None and self.last_modified.replace(microsecond=0) <= since
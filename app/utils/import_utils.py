@@ -0,0 +1,31 @@
+import csv
+import json
+from typing import Any, Iterable, Iterator
+from core.enums import ImportFormat
+"""
+This module turns the text of a historical import into plain dictionaries,
+the validation of each record is left to the PostReading schema
+"""
+
+def iter_csv_records(lines: Iterable[str]) -> Iterator[dict]:
+    """Yield one dictionary per CSV row, using the header as keys and None for empty cells"""
+    for row in csv.DictReader(lines):
+        yield {
+            key.strip(): (value.strip() or None) if isinstance(value, str) else value
+            for key, value in row.items() if key is not None
+        }
+
+def iter_ndjson_records(lines: Iterable[str]) -> Iterator[Any]:
+    """Yield one object per non-empty line, or the decode error of an invalid line"""
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            yield e
+
+def iter_records(lines: Iterable[str], import_format: ImportFormat) -> Iterator[Any]:
+    if import_format == ImportFormat.CSV:
+        return iter_csv_records(lines)
+    return iter_ndjson_records(lines)
@@ -0,0 +1,91 @@
+import math
+import re
+from datetime import datetime, timedelta
+from typing import Any, Sequence
+from core.enums import AggregationType, FillMode
+from utils.rollup_utils import BUCKET_SIZES
+"""
+This module handles the bucket widths of aggregations, the named ones (minute,
+hour, day) and arbitrary intervals such as 5s, 15m or 6h. Buckets are aligned
+on the Unix epoch, like date_bin with a 1970-01-01 origin
+"""
+
+EPOCH = datetime(1970, 1, 1)
+
+INTERVAL_PATTERN = re.compile(r"^(\d+)([smhd])$")
+
+INTERVAL_UNITS = {"s": "seconds", "m": "minutes", "h": "hours", "d": "days"}
+
+# Bucket widths picked for max_points, the ones a chart axis reads naturally
+NICE_INTERVALS = ("1s", "2s", "5s", "10s", "15s", "30s", "1m", "2m", "5m", "10m", "15m", "30m",
+                  "1h", "2h", "3h", "6h", "12h", "1d")
+
+def parse_interval(value: str) -> timedelta:
+    """Width of an interval such as 15s, 5m, 6h or 2d"""
+    match = INTERVAL_PATTERN.match(value.strip().lower())
+    if not match or int(match.group(1)) == 0:
+        raise ValueError(f"Invalid interval: {value}")
+    return timedelta(**{INTERVAL_UNITS[match.group(2)]: int(match.group(1))})
+
+def auto_interval(start: datetime, end: datetime, max_points: int) -> str:
+    """Narrowest nice interval splitting [start, end] in at most about max_points buckets"""
+    target = (end - start) / max_points
+    for interval in NICE_INTERVALS:
+        if parse_interval(interval) >= target:
+            return interval
+    return f"{math.ceil(target / timedelta(days=1))}d"
+
+def is_named(aggregation: str) -> bool:
+    return aggregation in {aggregation_type.value for aggregation_type in AggregationType}
+
+def bucket_width(aggregation: str) -> timedelta:
+    """Width of the buckets of a named aggregation or of an interval"""
+    if is_named(aggregation):
+        return BUCKET_SIZES[AggregationType(aggregation)]
+    return parse_interval(aggregation)
+
+def rollup_for(aggregation: str) -> AggregationType | None:
+    """Coarsest rollup whose buckets fit whole in the buckets of the aggregation, if any"""
+    if is_named(aggregation):
+        return AggregationType(aggregation)
+    width = parse_interval(aggregation)
+    for rollup in (AggregationType.DAY, AggregationType.HOUR, AggregationType.MINUTE):
+        if width % BUCKET_SIZES[rollup] == timedelta(0):
+            return rollup
+    return None
+
+def bin_start(timestamp: datetime, width: timedelta) -> datetime:
+    """Start of the bucket that contains the timestamp"""
+    return EPOCH + (timestamp - EPOCH) // width * width
+
+def bin_ceil(timestamp: datetime, width: timedelta) -> datetime:
+    """Start of the first bucket that begins at or after the timestamp"""
+    start = bin_start(timestamp, width)
+    return start if start == timestamp else start + width
+
+def fill_gaps(rows: Sequence[Sequence[Any]], width: timedelta, start: datetime, end: datetime,
+              mode: FillMode, columns: int) -> list[tuple]:
+    """Rows of every bucket between start and end, each row being (timestamp, *values).
+
+    Missing buckets get None values, or with the linear mode values interpolated
+    between the closest buckets before and after them (buckets before the first
+    or after the last row stay None).
+    """
+    by_bucket = {row[0]: tuple(row) for row in rows}
+    buckets = []
+    bucket = bin_start(start, width)
+    while bucket <= end:
+        buckets.append(by_bucket.get(bucket, (bucket,) + (None,) * (columns - 1)))
+        bucket += width
+
+    if mode is not FillMode.LINEAR:
+        return buckets
+
+    filled = [list(row) for row in buckets]
+    for column in range(1, columns):
+        known = [index for index, row in enumerate(buckets) if row[column] is not None]
+        for before, after in zip(known, known[1:]):
+            for index in range(before + 1, after):
+                fraction = (index - before) / (after - before)
+                filled[index][column] = buckets[before][column] + (buckets[after][column] - buckets[before][column]) * fraction
+    return [tuple(row) for row in filled]
@@ -0,0 +1,28 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+"""
+This module encodes the keyset cursors of paginated readings, the clients
+only pass them back and should not rely on their content
+"""
+
+RAW_RESOLUTION = "raw"
+
+def encode_cursor(timestamp: datetime, key: int | str, resolution: str = RAW_RESOLUTION) -> str:
+    """Cursor after the row with this timestamp and key (the reading id, or the
+    server ulid for rows served from a rollup resolution)"""
+    values = [timestamp.isoformat(), key] if resolution == RAW_RESOLUTION else [timestamp.isoformat(), key, resolution]
+    payload = json.dumps(values, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> tuple[datetime, int | str, str]:
+    """Return the (timestamp, key, resolution) of the last row of the previous page"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, key, *resolution = json.loads(base64.urlsafe_b64decode(padded))
+        resolution = resolution[0] if resolution else RAW_RESOLUTION
+        key = int(key) if resolution == RAW_RESOLUTION else str(key)
+        return datetime.fromisoformat(timestamp), key, resolution
+    except (binascii.Error, ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta
+from typing import Any, Iterable, Mapping
+from core.enums import AggregationType
+"""
+This module groups readings into rollup buckets in Python, it must produce
+the same buckets as the date truncation done by the database
+"""
+
+ROLLUP_SENSORS = ("temperature", "humidity", "voltage", "current")
+
+BUCKET_SIZES = {
+    AggregationType.MINUTE: timedelta(minutes=1),
+    AggregationType.HOUR: timedelta(hours=1),
+    AggregationType.DAY: timedelta(days=1),
+}
+
+def truncate(timestamp: datetime, aggregation: AggregationType) -> datetime:
+    """Start of the bucket that contains the timestamp"""
+    timestamp = timestamp.replace(second=0, microsecond=0)
+    if aggregation in (AggregationType.HOUR, AggregationType.DAY):
+        timestamp = timestamp.replace(minute=0)
+    if aggregation == AggregationType.DAY:
+        timestamp = timestamp.replace(hour=0)
+    return timestamp
+
+def ceil(timestamp: datetime, aggregation: AggregationType) -> datetime:
+    """Start of the first bucket that begins at or after the timestamp"""
+    start = truncate(timestamp, aggregation)
+    return start if start == timestamp else start + BUCKET_SIZES[aggregation]
+
+def rollup_rows(readings: Iterable[Mapping[str, Any]], aggregation: AggregationType) -> list[dict]:
+    """Sum, count, min and max of each sensor per (server_ulid, bucket), ready to be upserted.
+
+    Rows are sorted by (server_ulid, bucket) so concurrent upserts lock the
+    rollup rows in the same order and can't deadlock each other.
+    """
+    buckets: dict[tuple[str, datetime], dict] = {}
+
+    for reading in readings:
+        key = (reading["server_ulid"], truncate(reading["timestamp"], aggregation))
+        row = buckets.get(key)
+        if row is None:
+            row = buckets[key] = {"server_ulid": key[0], "bucket": key[1]}
+            for sensor in ROLLUP_SENSORS:
+                row.update({f"{sensor}_sum": 0.0, f"{sensor}_count": 0, f"{sensor}_min": None, f"{sensor}_max": None})
+
+        for sensor in ROLLUP_SENSORS:
+            value = reading[sensor]
+            if value is None:
+                continue
+            row[f"{sensor}_sum"] += value
+            row[f"{sensor}_count"] += 1
+            minimum, maximum = row[f"{sensor}_min"], row[f"{sensor}_max"]
+            row[f"{sensor}_min"] = value if minimum is None else min(minimum, value)
+            row[f"{sensor}_max"] = value if maximum is None else max(maximum, value)
+
+    return [buckets[key] for key in sorted(buckets)]
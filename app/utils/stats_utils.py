@@ -0,0 +1,24 @@
+import math
+import statistics
+from typing import Sequence
+"""
+This module computes the statistics SQLite has no aggregate for, with the same
+semantics as the PostgreSQL ones
+"""
+
+def parse_values(concatenated: str | None) -> list[float]:
+    """Values of a bucket joined by group_concat"""
+    return sorted(float(value) for value in concatenated.split(",")) if concatenated else []
+
+def percentile_cont(values: Sequence[float], fraction: float) -> float | None:
+    """Linear interpolation between the closest ranks of the sorted values, like percentile_cont"""
+    if not values:
+        return None
+    position = fraction * (len(values) - 1)
+    lower = math.floor(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+def stddev_samp(values: Sequence[float]) -> float | None:
+    """Sample standard deviation, None below two values like stddev_samp"""
+    return statistics.stdev(values) if len(values) > 1 else None